@@ -1,6 +1,5 @@
 from config import Config
 from flask import Flask, request, abort
-from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_marshmallow import Marshmallow
 from flask_httpauth import HTTPBasicAuth, HTTPTokenAuth, MultiAuth
@@ -8,12 +7,28 @@ from apispec import APISpec
 from apispec.ext.marshmallow import MarshmallowPlugin
 from flask_apispec.extension import FlaskApiSpec
 from flask_babel import Babel
+from utility.serializer import jsonify
+from utility.metrics import metrics
+from utility.sqlite import SQLAlchemy, report_settings
+import time
 
-app = Flask(__name__, static_folder=Config.UPLOAD_FOLDER)
+# /upload/<filename> обслуживает download_file (utility/downloads.py), а не static маршрут Flask
+app = Flask(__name__, static_folder=None)
 app.config.from_object(Config)
+# ответы marshal_with кодируются orjson, если он установлен
+app.config["APISPEC_FORMAT_RESPONSE"] = jsonify
+metrics.init_app(app)
 babel = Babel(app)
 
 db = SQLAlchemy(app)
+
+
+@app.before_first_request
+def check_database():
+    # каждый процесс gunicorn пишет в лог фактические настройки SQLite
+    if db.engine.url.drivername.startswith("sqlite"):
+        report_settings(app, db.engine)
+
 migrate = Migrate(app, db)
 ma = Marshmallow(app)
 docs = FlaskApiSpec(app)
@@ -28,18 +43,41 @@ with app.app_context():
 
 @basic_auth.verify_password
 def verify_password(username, password):
-    from api.models.user import UserModel
+    started = time.perf_counter()
+    identity, path = check_password(username, password)
+    metrics.observe("auth_duration_seconds", time.perf_counter() - started, method="basic", path=path)
+    return identity
+
+
+def check_password(username, password):
+    """
+    Returns (UserIdentity or False, path): path is "cached", "hash" or "failed".
+    """
+    from api.models.user import UserModel, UserIdentity
+    from utility.auth_cache import credential_cache, user_cache, users_generation
+    users_generation.check()
+    # повторные запросы с теми же логином/паролем не пересчитывают хеш пароля
+    user_id = credential_cache.get_user_id(username, password)
+    if user_id is not None:
+        identity = UserModel.get_identity(user_id)
+        if identity is not None:
+            return identity, "cached"
     user = UserModel.query.filter_by(username=username).first()
     if not user or not user.verify_password(password):
-        return False
-    return user
+        return False, "failed"
+    credential_cache.add(username, password, user.id)
+    identity = UserIdentity.from_model(user)
+    user_cache.set(user.id, identity)
+    return identity, "hash"
 
 
 @token_auth.verify_token
 def verify_token(token):
     from api.models.user import UserModel
+    started = time.perf_counter()
     user = UserModel.verify_auth_token(token)
-    print(f"{user=}")
+    metrics.observe("auth_duration_seconds", time.perf_counter() - started,
+                    method="token", path="failed" if user is None else "valid")
     return user
 
 
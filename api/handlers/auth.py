@@ -1,4 +1,6 @@
 from api import app, multi_auth
+from api.models.user import UserModel
+from utility.helpers import get_object_or_404
 
 
 @app.route('/auth/token')
@@ -7,3 +9,13 @@ def get_auth_token():
     user = multi_auth.current_user()
     token = user.generate_auth_token()
     return {'token': token}
+
+
+@app.route('/auth/token', methods=["DELETE"])
+@multi_auth.login_required
+def revoke_auth_tokens():
+    # все ранее выданные токены пользователя становятся недействительными
+    user = get_object_or_404(UserModel, multi_auth.current_user().id)
+    user.revoke_tokens()
+    user.save()
+    return '', 204
@@ -1,22 +1,127 @@
-import os
-from api import app
+from api import app, multi_auth, abort, request
 from flask_apispec import doc, use_kwargs
 from api.schemas.file import FileSchema
-from config import Config
-from flask import send_from_directory
+from flask import url_for
+from utility.downloads import send_upload
+from utility.image_variants import image_variants
+from utility.storage import storage
+from utility.uploads import upload_sessions, UploadOffsetMismatch, UploadSizeExceeded, UploadIncomplete
+from webargs import fields, validate
+
+def current_user_id():
+   # загрузка доступна и без авторизации, но освободить потом можно только свою загрузку
+   user = multi_auth.current_user()
+   return user.id if user else None
+
 
 @app.route('/files/upload', methods=["PUT"])
+@multi_auth.login_required(optional=True)
 @doc(tags=['Files'])
 @use_kwargs(FileSchema, location="files")
 def upload_file(**kwargs):
    uploaded_file = kwargs["image"]
-   target = Config.UPLOAD_FOLDER / uploaded_file.filename
-   uploaded_file.save(target)
+   # файл хранится под хешем содержимого: одинаковые загрузки не дублируются и не перезаписывают друг друга
+   name, size = storage.save(uploaded_file.stream, uploaded_file.filename, current_user_id())
+   # уменьшенные копии изображений создаются в фоне
+   image_variants.schedule(name)
    return {"msg": "uploaded image successfully",
-           "url": os.path.join(Config.UPLOAD_FOLDER_NAME, uploaded_file.filename)}, 200
+           "url": storage.url(name),
+           "name": name,
+           "size": size}, 200
+
+
+@app.route('/files/<name>', methods=["DELETE"])
+@multi_auth.login_required
+@doc(summary="Release uploaded file", description='Release one of your uploads of the file, '
+                                                  'the file is deleted with the last upload', tags=['Files'])
+@doc(responses={"401": {"description": "Unauthorized"}})
+@doc(responses={"404": {"description": "Not found"}})
+@doc(security=[{"basicAuth": []}])
+def delete_file(name):
+   if not storage.release(name, multi_auth.current_user().id):
+      abort(404, description=f"File {name} not found")
+   return "", 204
 
 
 @app.route('/upload/<path:filename>')
-@doc(tags=['Files'])
-def download_file(filename):
-   return send_from_directory(app.config['UPLOAD_FOLDER'], filename, as_attachment=True)
\ No newline at end of file
+@doc(summary="Download file", description='Supports Range requests and conditional requests '
+                                          '(If-None-Match, If-Modified-Since). variant - reduced copy of '
+                                          'an image, the original is sent until it is ready', tags=['Files'])
+@doc(responses={"206": {"description": "Partial content"}})
+@doc(responses={"304": {"description": "Not modified"}})
+@doc(responses={"404": {"description": "Not found"}})
+@use_kwargs({"variant": fields.Str(validate=validate.OneOf(list(app.config["IMAGE_VARIANTS"])))}, location="query")
+def download_file(filename, variant=None):
+   return send_upload(filename, variant)
+
+
+def upload_status(info, code=200):
+   return {"id": info["id"], "filename": info["filename"], "size": info["size"], "offset": info["offset"],
+           "url": url_for("upload_session", upload_id=info["id"])}, code, {"Upload-Offset": str(info["offset"])}
+
+
+@app.route('/files/uploads', methods=["POST"])
+@multi_auth.login_required(optional=True)
+@doc(summary="Start resumable upload", description='Creates an upload session, the file is sent '
+                                                   'by PATCH requests to the returned url', tags=['Files'])
+@use_kwargs({"filename": fields.Str(required=True), "size": fields.Int(validate=validate.Range(min=0))},
+            location="json")
+def create_upload(filename, size=None):
+   return upload_status(upload_sessions.create(filename, size, current_user_id()), 201)
+
+
+@app.route('/files/uploads/<upload_id>', methods=["GET"])
+@doc(summary="Resumable upload progress", description='Number of received bytes (offset)', tags=['Files'])
+@doc(responses={"404": {"description": "Not found"}})
+def upload_session(upload_id):
+   info = upload_sessions.status(upload_id)
+   if info is None:
+      abort(404, description=f"Upload {upload_id} not found")
+   return upload_status(info)
+
+
+@app.route('/files/uploads/<upload_id>', methods=["PATCH"])
+@doc(summary="Upload file chunk", description='Appends the request body at the offset given by the '
+                                              'Upload-Offset header', tags=['Files'])
+@doc(responses={"404": {"description": "Not found"}})
+@doc(responses={"409": {"description": "Offset does not match the received bytes"}})
+def upload_chunk(upload_id):
+   offset = request.headers.get("Upload-Offset", type=int)
+   if offset is None:
+      abort(400, description="Upload-Offset header is required")
+   try:
+      # тело запроса пишется в файл частями, без чтения целиком в память
+      offset = upload_sessions.append(upload_id, offset, request.stream)
+   except UploadOffsetMismatch as e:
+      return {"message": str(e), "offset": e.offset}, 409, {"Upload-Offset": str(e.offset)}
+   except UploadSizeExceeded as e:
+      abort(413, description=str(e))
+   if offset is None:
+      abort(404, description=f"Upload {upload_id} not found")
+   return "", 204, {"Upload-Offset": str(offset)}
+
+
+@app.route('/files/uploads/<upload_id>/complete', methods=["POST"])
+@doc(summary="Finish resumable upload", description='Stores the received file, same result as /files/upload',
+     tags=['Files'])
+@doc(responses={"404": {"description": "Not found"}})
+@doc(responses={"409": {"description": "Not all bytes were received"}})
+def complete_upload(upload_id):
+   try:
+      result = upload_sessions.complete(upload_id)
+   except UploadIncomplete as e:
+      abort(409, description=str(e))
+   if result is None:
+      abort(404, description=f"Upload {upload_id} not found")
+   name, size = result
+   image_variants.schedule(name)
+   return {"msg": "uploaded image successfully", "url": storage.url(name), "name": name, "size": size}, 200
+
+
+@app.route('/files/uploads/<upload_id>', methods=["DELETE"])
+@doc(summary="Cancel resumable upload", tags=['Files'])
+@doc(responses={"404": {"description": "Not found"}})
+def cancel_upload(upload_id):
+   if not upload_sessions.abort(upload_id):
+      abort(404, description=f"Upload {upload_id} not found")
+   return "", 204
@@ -0,0 +1,23 @@
+from api import app, multi_auth, abort
+from api.models.job import JobModel
+from api.schemas.job import JobSchema
+from utility.helpers import get_object_or_404
+from flask_apispec import doc, marshal_with
+
+
+@app.route("/jobs/<int:job_id>")
+@multi_auth.login_required
+@doc(summary="Background job status", description='Status (queued, running, done, failed) and progress '
+                                                  'of a job started by a 202 response of current auth User', tags=['Jobs'])
+@marshal_with(JobSchema, code=200)
+@doc(responses={"401": {"description": "Unauthorized"}})
+@doc(responses={"403": {"description": "Forbidden"}})
+@doc(responses={"404": {"description": "Not found"}})
+@doc(security=[{"basicAuth": []}])
+def get_job(job_id):
+    # статус и текст ошибки задачи видит только пользователь, который ее запустил
+    user = multi_auth.current_user()
+    job = get_object_or_404(JobModel, job_id)
+    if job.owner_id != user.id:
+        abort(403, description="Forbidden")
+    return job, 200
@@ -0,0 +1,10 @@
+from api import app
+from flask import Response
+from flask_apispec import doc
+from utility.metrics import metrics, CONTENT_TYPE
+
+
+@app.route('/metrics')
+@doc(summary="Metrics", description='Request, SQL, auth and cache metrics in Prometheus text format', tags=['Monitoring'])
+def get_metrics():
+    return Response(metrics.render(), content_type=CONTENT_TYPE)
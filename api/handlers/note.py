@@ -1,11 +1,23 @@
-from api import app, multi_auth, request, abort
-from api.models.note import NoteModel
+from api import app, multi_auth, request, abort, db
+from api.models.note import NoteModel, add_tags, remove_tags, with_author_and_tags, fts_query
 from api.models.user import UserModel
 from api.models.tag import TagModel
-from api.schemas.note import NoteSchema, NoteRequestSchema
-from utility.helpers import get_object_or_404
+from api.schemas.note import (NoteSchema, NoteRequestSchema, NotePageSchema, NoteSearchResultSchema,
+                              NoteBatchUpdateSchema, NoteBatchResultSchema)
+from utility.helpers import get_object_or_404, batch_result, batch_size
+from utility.pagination import page_args
+from utility.streaming import wants_ndjson
+from utility.tag_index import tag_index
+from utility.conditional import note_etag, conditional_notes, conditional_note_ids, not_modified, with_etag
+from utility.response_cache import response_cache, track_mappings
+from utility.visibility import (readable_by, writable_by, readable_notes, public_notes,
+                                get_note_for_read, get_note_for_write, check_notes_for_write)
 from flask_apispec import doc, marshal_with, use_kwargs
 from webargs import fields
+from marshmallow import validate
+from config import Config
+from flask_babel import _
+from sqlalchemy import false
 
 
 @app.route("/notes/<int:note_id>", methods=["GET"])
@@ -20,11 +32,9 @@ def get_note_by_id(note_id):
     #  авторизованный пользователь может получить только свою заметку или публичную заметку других пользователей
     #  Попытка получить чужую приватную заметку, возвращает ответ с кодом 403
     user = multi_auth.current_user()
-    note = get_object_or_404(NoteModel, note_id)
-    notes = NoteModel.query.join(NoteModel.author).filter((UserModel.id==user.id) | (NoteModel.private==False))
-    if note in notes:
-        return note, 200
-    return '', 403
+    note = get_note_for_read(note_id, user)
+    etag = note_etag(note, user)
+    return not_modified(etag) or with_etag(note, etag)
 
 @app.route("/notes/<int:note_id>/importance", methods=["PUT"])
 @multi_auth.login_required
@@ -37,25 +47,26 @@ def change_note_importance(note_id):
     #  авторизованный пользователь может получить только свою заметку или публичную заметку других пользователей
     #  Попытка получить чужую приватную заметку, возвращает ответ с кодом 403
     user = multi_auth.current_user()
-    note = get_object_or_404(NoteModel, note_id)
-    if note.author_id == user.id:
-        note.importance %= 3
-        note.importance += 1
-        note.save()
-        return '', 204
-    return '', 403
+    note = get_note_for_write(note_id, user)
+    note.importance %= 3
+    note.importance += 1
+    note.save()
+    return '', 204
 
 @app.route("/notes", methods=["GET", "OPTIONS"])
 @multi_auth.login_required
-@doc(summary="Get notes", description='Get notes for current auth User or other public notes', tags=['Notes'])
-@marshal_with(NoteSchema(many=True), code=200)
+@doc(summary="Get notes", description='Get notes for current auth User or other public notes, ordered by importance. '
+                                          'Pass next_cursor from the response as cursor to get the next page', tags=['Notes'])
+@marshal_with(NotePageSchema, code=200)
+@use_kwargs(page_args, location='query')
 @doc(responses={"401": {"description": "Unauthorized"}})
+@doc(responses={"400": {"description": "Invalid cursor"}})
 @doc(security=[{"basicAuth": []}])
-def get_notes():
+def get_notes(**kwargs):
     # авторизованный пользователь получает только свои заметки и публичные заметки других пользователей
     user = multi_auth.current_user()
-    notes = NoteModel.query.join(NoteModel.author).filter(((UserModel.id==user.id) | (NoteModel.private==False)) & (NoteModel.deleted==False))
-    return notes, 200
+    parts = [with_author_and_tags(part) for part in readable_notes(user)]
+    return conditional_notes(parts, (NoteModel.importance, NoteModel.id), user, descending=True, **kwargs)
 
 @app.route("/notes", methods=["POST"])
 @multi_auth.login_required
@@ -84,13 +95,11 @@ def edit_note(note_id, **kwargs):
     #  Пользователь может редактировать ТОЛЬКО свои заметки.
     #  Попытка редактировать чужую заметку, возвращает ответ с кодом 403
     user = multi_auth.current_user()
-    note = get_object_or_404(NoteModel, note_id)
-    if note.author_id == user.id:
-        for key in kwargs:
-            setattr(note, key, kwargs[key])
-            note.save()
-            return note, 200
-    abort(403, description=f"Forbidden")
+    note = get_note_for_write(note_id, user)
+    for key in kwargs:
+        setattr(note, key, kwargs[key])
+    note.save()
+    return note, 200
 
 @app.route("/notes/<int:note_id>", methods=["DELETE"])
 @multi_auth.login_required
@@ -102,12 +111,10 @@ def edit_note(note_id, **kwargs):
 def archive_note(note_id):
     #  Пользователь может архивировать ТОЛЬКО свои заметки.
     user = multi_auth.current_user()
-    note = get_object_or_404(NoteModel, note_id)
-    if note.author_id == user.id:
-        note.deleted = True
-        note.save()
-        return '', 204
-    abort(403, description=f"Forbidden")
+    note = get_note_for_write(note_id, user)
+    note.deleted = True
+    note.save()
+    return '', 204
 
 
 @app.route("/notes/<int:note_id>/restore", methods=["PUT"])
@@ -121,36 +128,62 @@ def archive_note(note_id):
 def restore_note(note_id):
     #  Пользователь может восстановить ТОЛЬКО свои заметки.
     user = multi_auth.current_user()
-    note = NoteModel.query.get(note_id)
-    if note.author_id == user.id:
-        note.deleted = False
-        note.save()
-        return note, 200
-    abort(403, description=f"Forbidden")
+    note = get_note_for_write(note_id, user, include_archived=True)
+    note.deleted = False
+    note.save()
+    return note, 200
 
 
 @app.route("/notes/filter/tag", methods=["GET"])
 @multi_auth.login_required
-@doc(summary="Get auth user notes by tags", description='Get auth user notes by tags', tags=['Notes'])
-@marshal_with(NoteSchema(many=True), code=200)
+@doc(summary="Get auth user notes by tags", description='Get auth user notes by tags. Repeat name to filter by several tags: '
+                                                         'match=all (default) returns notes with all of them, match=any - with any of them. '
+                                                         'Notes with tags from exclude are skipped', tags=['Notes'])
+@marshal_with(NotePageSchema, code=200)
 @doc(responses={"401": {"description": "Unauthorized"}})
+@doc(responses={"400": {"description": "Invalid cursor"}})
 @doc(security=[{"basicAuth": []}])
-@use_kwargs({"name": fields.Str()}, location=('query'))
-def get_user_notes_by_tag(**kwargs):
-    # авторизованный пользователь получает только свои заметки с указанным тегом
+@use_kwargs({"name": fields.List(fields.Str()),
+             "match": fields.Str(validate=validate.OneOf(["all", "any"])),
+             "exclude": fields.List(fields.Str())}, location=('query'))
+@use_kwargs(page_args, location='query')
+def get_user_notes_by_tag(name=(), match="all", exclude=(), stream=False, **kwargs):
+    # авторизованный пользователь получает только свои заметки с указанными тегами
     user = multi_auth.current_user()
-    notes = NoteModel.query.filter((NoteModel.deleted==False) & (NoteModel.author_id==user.id) & (NoteModel.tags.any(name=kwargs['name'])))
-    return notes, 200
+    tag_ids = dict(db.session.query(TagModel.name, TagModel.id).filter(TagModel.name.in_(set(name) | set(exclude))))
+    include = {tag_ids[tag_name] for tag_name in name if tag_name in tag_ids}
+    excluded = {tag_ids[tag_name] for tag_name in exclude if tag_name in tag_ids}
+    notes = NoteModel.query.filter(writable_by(user) & (NoteModel.deleted==False))
+    # несуществующий тег: для match=all заметок нет, для match=any он просто не учитывается
+    if (match == "all" and len(include) < len(set(name))) or (name and not include):
+        notes = notes.filter(false())
+    elif include and Config.TAG_INDEX_ENABLED and not stream and not wants_ndjson():
+        tags_arg = "all_tags" if match == "all" else "any_tags"
+        note_ids = tag_index.match(user.id, exclude_tags=excluded, **{tags_arg: include})
+        # пока индекс тегов автора загружается, отвечает SQL-запрос ниже
+        if note_ids is not None:
+            return conditional_note_ids(with_author_and_tags(notes), NoteModel.id, note_ids, user, **kwargs)
+    if match == "all":
+        for tag_id in include:
+            notes = notes.filter(NoteModel.tags.any(TagModel.id == tag_id))
+    elif include:
+        notes = notes.filter(NoteModel.tags.any(TagModel.id.in_(include)))
+    if excluded:
+        notes = notes.filter(~NoteModel.tags.any(TagModel.id.in_(excluded)))
+    return conditional_notes(with_author_and_tags(notes), (NoteModel.id,), user, stream=stream, **kwargs)
 
 
 @app.route("/notes/filter/user", methods=["GET"])
+@response_cache.cached("notes")
 @doc(summary="Get public notes by username", description='Get public notes by username', tags=['Notes'])
-@marshal_with(NoteSchema(many=True), code=200)
+@marshal_with(NotePageSchema, code=200)
 @use_kwargs({"username": fields.Str()}, location=('query'))
-def get_user_public_notes(**kwargs):
+@use_kwargs(page_args, location='query')
+@doc(responses={"400": {"description": "Invalid cursor"}})
+def get_user_public_notes(username=None, **kwargs):
     # получение публичных заметок пользователя с указанным именем
-    notes = NoteModel.query.join(NoteModel.author).filter((NoteModel.deleted==False) & (UserModel.username==kwargs['username']) & (NoteModel.private==False))
-    return notes, 200
+    notes = public_notes().join(NoteModel.author).filter(UserModel.username==username)
+    return conditional_notes(with_author_and_tags(notes, author_joined=True), (NoteModel.id,), **kwargs)
 
 @app.route("/notes/<int:note_id>/tags", methods=["PUT"])
 @multi_auth.login_required
@@ -162,15 +195,16 @@ def get_user_public_notes(**kwargs):
 @doc(security=[{"basicAuth": []}])
 def note_add_tags(note_id, **kwargs):
     user = multi_auth.current_user()
-    print(note_id)
-    note = get_object_or_404(NoteModel, note_id)
-    if note.author_id == user.id:
-        for id in kwargs['tags']:
-            tag = get_object_or_404(TagModel, id)
-            note.tags.append(tag)
-        note.save()
-        return note, 200
-    abort(403, description=f"Forbidden")
+    note = get_note_for_write(note_id, user)
+    tag_ids = set(kwargs['tags'])
+    found = {id for id, in db.session.query(TagModel.id).filter(TagModel.id.in_(tag_ids))}
+    for id in kwargs['tags']:
+        if id not in found:
+            abort(404, description=_("Object with id=%(object_id)s not found", object_id=id))
+    add_tags(tag_ids, [note.id])
+    note.save()
+    tag_index.add(user.id, tag_ids, [note.id])
+    return note, 200
 
 @app.route("/notes/<int:note_id>/tags", methods=["DELETE"])
 @multi_auth.login_required
@@ -182,38 +216,130 @@ def note_add_tags(note_id, **kwargs):
 @doc(security=[{"basicAuth": []}])
 def note_delete_tags(note_id, **kwargs):
     user = multi_auth.current_user()
-    note = get_object_or_404(NoteModel, note_id)
-    if note.author_id == user.id:
-        for id in kwargs['tags']:
-            try:
-                tag = TagModel.query.get(id)
-                if tag:
-                    note.tags.remove(tag)
-            except ValueError:
-                pass
-        note.save()
-        return note, 200
-    abort(403, description=f"Forbidden")
+    note = get_note_for_write(note_id, user)
+    remove_tags(set(kwargs['tags']), [note.id])
+    note.save()
+    tag_index.remove(user.id, kwargs['tags'], [note.id])
+    return note, 200
 
 @app.route("/notes/public", methods=["GET"])
+@response_cache.cached("notes")
 @doc(summary="Get all public notes", description='Get all public notes', tags=['Notes'])
-@marshal_with(NoteSchema(many=True), code=200)
-def get_all_public_notes():
+@marshal_with(NotePageSchema, code=200)
+@use_kwargs(page_args, location='query')
+@doc(responses={"400": {"description": "Invalid cursor"}})
+def get_all_public_notes(**kwargs):
     # получение публичных заметок всех пользователей
-    notes = NoteModel.query.filter((NoteModel.private==False) & (NoteModel.deleted==False))
-    return notes, 200
+    notes = public_notes()
+    return conditional_notes(with_author_and_tags(notes), (NoteModel.id,), **kwargs)
 
 
 @app.route("/notes/deleted", methods=["GET"])
 @multi_auth.login_required
 @doc(summary="Get all notes from archive", description='Get all notes from archive for current auth User', tags=['Notes'])
-@marshal_with(NoteSchema(many=True), code=200)
+@marshal_with(NotePageSchema, code=200)
+@use_kwargs(page_args, location='query')
 @doc(responses={"401": {"description": "Unauthorized"}})
+@doc(responses={"400": {"description": "Invalid cursor"}})
 @doc(security=[{"basicAuth": []}])
-def get_deleted_notes():
+def get_deleted_notes(**kwargs):
     # авторизованный пользователь получает только свои архивные заметки
     user = multi_auth.current_user()
-    notes = NoteModel.query.join(NoteModel.author).filter(((UserModel.id==user.id) | (NoteModel.private==False)) & (NoteModel.deleted))
-    return notes, 200
+    parts = [with_author_and_tags(part) for part in readable_notes(user, deleted=True)]
+    return conditional_notes(parts, (NoteModel.id,), user, **kwargs)
+
+
+@app.route("/notes/search", methods=["GET"])
+@multi_auth.login_required
+@doc(summary="Full-text search in notes", description='Search in text of notes of current auth User and public notes. '
+                                                      'Results are ordered by relevance', tags=['Notes'])
+@marshal_with(NoteSearchResultSchema(many=True), code=200)
+@use_kwargs({"q": fields.Str(required=True, validate=validate.Length(min=1)),
+             "limit": fields.Int(validate=validate.Range(min=1, max=Config.NOTES_PAGE_SIZE_MAX))}, location='query')
+@doc(responses={"400": {"description": "Query has no words"}})
+@doc(responses={"401": {"description": "Unauthorized"}})
+@doc(security=[{"basicAuth": []}])
+def search_notes(q, limit=None):
+    # пустой запрос FTS5 - синтаксическая ошибка SQLite, а не пустой результат
+    if not fts_query(q):
+        abort(400, description="Search query has no words")
+    # поиск по своим заметкам и публичным заметкам других пользователей, кроме архивных
+    user = multi_auth.current_user()
+    results = with_author_and_tags(NoteModel.search(q)).filter(readable_by(user) & (NoteModel.deleted==False))
+    results = results.limit(limit or Config.NOTES_PAGE_SIZE)
+    return [{"note": note, "snippet": snippet, "rank": rank} for note, snippet, rank in results], 200
+
+
+@app.route("/notes/batch", methods=["POST"])
+@multi_auth.login_required
+@doc(summary="Create notes in batch", description='Create many notes for current auth User in one transaction. '
+                                                  'Returns result for every item', tags=['Notes'])
+@marshal_with(NoteBatchResultSchema(many=True), code=200)
+@use_kwargs({"notes": fields.List(fields.Nested(NoteRequestSchema), required=True, validate=batch_size)}, location='json')
+@doc(responses={"401": {"description": "Unauthorized"}})
+@doc(security=[{"basicAuth": []}])
+def create_notes_batch(notes):
+    user = multi_auth.current_user()
+    results = [None] * len(notes)
+    mappings = []
+    for index, data in enumerate(notes):
+        if not data.get("text"):
+            results[index] = batch_result(index, None, 400, "Text is required")
+            continue
+        mappings.append((index, dict(data, author_id=user.id)))
+    db.session.bulk_insert_mappings(NoteModel, [mapping for _, mapping in mappings], return_defaults=True)
+    track_mappings(db.session, NoteModel)
+    db.session.commit()
+    for index, mapping in mappings:
+        results[index] = batch_result(index, mapping["id"], 201)
+    return results, 200
+
+
+@app.route("/notes/batch", methods=["PUT"])
+@multi_auth.login_required
+@doc(summary="Edit notes in batch", description='Edit many notes of current auth User in one transaction. '
+                                                'Returns result for every item', tags=['Notes'])
+@marshal_with(NoteBatchResultSchema(many=True), code=200)
+@use_kwargs({"notes": fields.List(fields.Nested(NoteBatchUpdateSchema), required=True, validate=batch_size)}, location='json')
+@doc(responses={"401": {"description": "Unauthorized"}})
+@doc(security=[{"basicAuth": []}])
+def edit_notes_batch(notes):
+    user = multi_auth.current_user()
+    errors = check_notes_for_write(user, [data["id"] for data in notes])
+    results = []
+    mappings = []
+    for index, data in enumerate(notes):
+        if data["id"] in errors:
+            results.append(batch_result(index, data["id"], *errors[data["id"]]))
+            continue
+        mappings.append(data)
+        results.append(batch_result(index, data["id"], 200))
+    db.session.bulk_update_mappings(NoteModel, mappings)
+    track_mappings(db.session, NoteModel)
+    db.session.commit()
+    return results, 200
 
 
+@app.route("/notes/batch", methods=["DELETE"])
+@multi_auth.login_required
+@doc(summary="Archive notes in batch", description='Archive many notes of current auth User in one transaction. '
+                                                   'Returns result for every item', tags=['Notes'])
+@marshal_with(NoteBatchResultSchema(many=True), code=200)
+@use_kwargs({"notes": fields.List(fields.Int(), required=True, validate=batch_size)}, location='json')
+@doc(responses={"401": {"description": "Unauthorized"}})
+@doc(security=[{"basicAuth": []}])
+def archive_notes_batch(notes):
+    user = multi_auth.current_user()
+    errors = check_notes_for_write(user, notes)
+    results = []
+    archived = set()
+    for index, note_id in enumerate(notes):
+        if note_id in errors:
+            results.append(batch_result(index, note_id, *errors[note_id]))
+            continue
+        archived.add(note_id)
+        results.append(batch_result(index, note_id, 204))
+    if archived:
+        NoteModel.query.filter(NoteModel.id.in_(archived)).update({NoteModel.deleted: True}, synchronize_session=False)
+    db.session.commit()
+    return results, 200
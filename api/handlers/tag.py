@@ -1,10 +1,15 @@
 from api import app, request, multi_auth, abort, db
 from api.models.tag import TagModel
-from api.models.note import NoteModel
+from api.models.note import NoteModel, add_tags, remove_tags
 from api.schemas.tag import tag_schema, tags_schema, TagSchema, TagRequestSchema
-from api.schemas.note import NoteSchema
-from utility.helpers import get_object_or_404
-from flask import jsonify
+from api.schemas.note import NoteSchema, NoteBatchResultSchema
+from utility.helpers import get_object_or_404, batch_result, batch_size
+from utility.visibility import check_notes_for_write
+from utility.tag_index import tag_index
+from utility.response_cache import response_cache
+from api.schemas.job import JobSchema
+from utility.jobs import job_queue
+from flask import jsonify, url_for
 from flask_apispec import doc, marshal_with, use_kwargs
 from sqlalchemy.exc import IntegrityError
 from webargs import fields
@@ -21,6 +26,7 @@ def get_tag_by_id(tag_id):
 
 
 @app.route("/tags")
+@response_cache.cached("tags")
 @doc(summary="Get tags", description='Get tags', tags=['Tags'])
 @marshal_with(TagSchema(many=True), code=200)
 def get_tags():
@@ -58,14 +64,59 @@ def edit_tag(tag_id, **kwargs):
 
 
 @app.route("/tags/<int:tag_id>", methods=["DELETE"])
-@doc(summary="Delete tag by id", description='Delete tag by id', tags=['Tags'])
+@multi_auth.login_required(optional=True)
+@doc(summary="Delete tag by id", description='Delete tag by id. The tag is removed from notes '
+                                             'and deleted by a background job. Only an auth User can see its status', tags=['Tags'])
+@marshal_with(JobSchema, code=202)
 @doc(responses={"404": {"description": "Not found"}})
 def delete_tag(tag_id):
-    tag = get_object_or_404(TagModel, tag_id)
-    # delete tag from notes
-    notes = NoteModel.query.filter(NoteModel.tags.any(id=tag_id))
-    for note in notes:
-        note.tags.remove(tag)
-    # delete tag
-    tag.delete()
-    return '', 204
+    get_object_or_404(TagModel, tag_id)
+    user = multi_auth.current_user()
+    # популярный тег может быть у многих заметок - связи удаляются порциями в фоне
+    job = job_queue.enqueue("delete_tag", key=f"delete_tag:{tag_id}", owner_id=user.id if user else None, tag_id=tag_id)
+    return job, 202, {"Location": url_for("get_job", job_id=job.id)}
+
+
+def change_tag_notes(tag_id, note_ids, change, change_index):
+    user = multi_auth.current_user()
+    get_object_or_404(TagModel, tag_id)
+    errors = check_notes_for_write(user, note_ids)
+    results = []
+    changed = set()
+    for index, note_id in enumerate(note_ids):
+        if note_id in errors:
+            results.append(batch_result(index, note_id, *errors[note_id]))
+            continue
+        changed.add(note_id)
+        results.append(batch_result(index, note_id, 200))
+    if changed:
+        change([tag_id], changed)
+    db.session.commit()
+    change_index(user.id, [tag_id], changed)
+    return results, 200
+
+
+@app.route("/tags/<int:tag_id>/notes", methods=["PUT"])
+@multi_auth.login_required
+@doc(summary="Add tag to notes", description='Add tag to many notes of current auth User. '
+                                            'Returns result for every note', tags=['Tags'])
+@marshal_with(NoteBatchResultSchema(many=True), code=200)
+@use_kwargs({"notes": fields.List(fields.Int(), required=True, validate=batch_size)}, location='json')
+@doc(responses={"401": {"description": "Unauthorized"}})
+@doc(responses={"404": {"description": "Not found"}})
+@doc(security=[{"basicAuth": []}])
+def tag_add_notes(tag_id, notes):
+    return change_tag_notes(tag_id, notes, add_tags, tag_index.add)
+
+
+@app.route("/tags/<int:tag_id>/notes", methods=["DELETE"])
+@multi_auth.login_required
+@doc(summary="Remove tag from notes", description='Remove tag from many notes of current auth User. '
+                                                 'Returns result for every note', tags=['Tags'])
+@marshal_with(NoteBatchResultSchema(many=True), code=200)
+@use_kwargs({"notes": fields.List(fields.Int(), required=True, validate=batch_size)}, location='json')
+@doc(responses={"401": {"description": "Unauthorized"}})
+@doc(responses={"404": {"description": "Not found"}})
+@doc(security=[{"basicAuth": []}])
+def tag_delete_notes(tag_id, notes):
+    return change_tag_notes(tag_id, notes, remove_tags, tag_index.remove)
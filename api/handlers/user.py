@@ -1,14 +1,21 @@
 from api import app, request, multi_auth, abort
 from api.models.user import UserModel
-from api.models.note import NoteModel
+from api.models.note import NoteModel, with_author_and_tags
 from api.schemas.user import UserSchema, UserRequestSchema, UserPUTRequestSchema
-from api.schemas.note import NoteSchema
+from api.schemas.note import NoteSchema, NotePageSchema
 from utility.helpers import get_object_or_404
-from flask import jsonify
+from utility.pagination import page_args
+from utility.visibility import public_notes
+from utility.conditional import conditional_notes
+from utility.response_cache import response_cache
+from api.schemas.job import JobSchema
+from utility.jobs import job_queue
+from flask import jsonify, url_for
 from flask_apispec import doc, marshal_with, use_kwargs
 from sqlalchemy.exc import IntegrityError
 
 @app.route("/users/<int:user_id>")
+@response_cache.cached("user", "user:{user_id}")
 @doc(summary="Get user by id", description='Get user by id', tags=['Users'])
 @marshal_with(UserSchema, code=200)
 @doc(responses={"404": {"description": "Not found"}})
@@ -18,6 +25,7 @@ def get_user_by_id(user_id):
 
 
 @app.route("/users")
+@response_cache.cached("users")
 @doc(summary="Get users", description='Get user', tags=['Users'])
 @marshal_with(UserSchema(many=True), code=200)
 def get_users():
@@ -50,6 +58,7 @@ def create_user(**kwargs):
 def edit_user(user_id, **kwargs):
     user = multi_auth.current_user()
     if user_id == user.id:
+        user = get_object_or_404(UserModel, user_id)
         for key in kwargs:
             setattr(user, key, kwargs[key])
         user.save()
@@ -59,21 +68,30 @@ def edit_user(user_id, **kwargs):
 
 @app.route("/users/<int:user_id>", methods=["DELETE"])
 @multi_auth.login_required(role="admin")
-@doc(summary="Delete user by id", description='Delete user by id for current auth User with role=admin', tags=['Users'])
+@doc(summary="Delete user by id", description='Delete user by id for current auth User with role=admin. '
+                                              'The user and the notes are deleted by a background job', tags=['Users'])
+@marshal_with(JobSchema, code=202)
 @doc(responses={"401": {"description": "Unauthorized"}})
 @doc(responses={"404": {"description": "Not found"}})
 @doc(responses={"403": {"description": "Forbidden"}})
 @doc(security=[{"basicAuth": []}])
 def delete_user(user_id):
-    user = get_object_or_404(UserModel, user_id)
-    user.delete()
-    return '', 204
+    get_object_or_404(UserModel, user_id)
+    # заметки пользователя удаляются порциями в фоне, повторный запрос возвращает ту же задачу
+    job = job_queue.enqueue("delete_user", key=f"delete_user:{user_id}", owner_id=multi_auth.current_user().id,
+                            user_id=user_id)
+    return job, 202, {"Location": url_for("get_job", job_id=job.id)}
 
 
 @app.route("/users/<int:user_id>/notes/", methods=["GET"])
-@doc(summary="Get notes by user id", description='Get notes by user id', tags=['Users'])
+@response_cache.cached("notes")
+@doc(summary="Get notes by user id", description='Get public notes by user id', tags=['Users'])
 @doc(responses={"404": {"description": "Not found"}})
-@marshal_with(NoteSchema(many=True), code=200)
-def get_user_notes(user_id):
+@doc(responses={"400": {"description": "Invalid cursor"}})
+@marshal_with(NotePageSchema, code=200)
+@use_kwargs(page_args, location='query')
+def get_user_notes(user_id, **kwargs):
     user = get_object_or_404(UserModel, user_id)
-    return user.notes, 200
+    # анонимному пользователю доступны только публичные заметки
+    notes = public_notes().filter(NoteModel.author_id==user.id)
+    return conditional_notes(with_author_and_tags(notes), (NoteModel.id,), **kwargs)
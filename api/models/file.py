@@ -0,0 +1,55 @@
+from api import db
+from sqlalchemy.dialects.sqlite import insert
+
+
+class StoredFileModel(db.Model):
+    """
+    Uploaded file stored once per content (see utility/storage.py). ref_count is the number of
+    uploads of this content that were not released yet (rows of file_upload).
+    """
+    __tablename__ = 'stored_file'
+    name = db.Column(db.String(80), primary_key=True)  # sha256 + расширение
+    size = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=1)
+
+    @staticmethod
+    def add_reference(name, size, user_id=None):
+        """
+        Records an upload of the file by the user: creates the row or increments ref_count. Does not commit.
+        """
+        statement = insert(StoredFileModel).values(name=name, size=size, ref_count=1)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=[StoredFileModel.name],
+            set_={"ref_count": StoredFileModel.ref_count + 1}))
+        db.session.execute(FileUploadModel.__table__.insert().values(name=name, user_id=user_id))
+
+    @staticmethod
+    def release_reference(name, user_id):
+        """
+        Deletes one upload of the file by the user and decrements ref_count, deletes the row when
+        it reaches zero. Returns the new ref_count (None if the user has no upload of this file). Does not commit.
+        """
+        uploads = FileUploadModel.__table__
+        # одним запросом: при одновременных вызовах загрузку удаляет только один из них
+        upload_id = db.select(uploads.c.id).where((uploads.c.user_id == user_id) & (uploads.c.name == name)) \
+            .limit(1).scalar_subquery()
+        if db.session.execute(uploads.delete().where(uploads.c.id == upload_id)).rowcount == 0:
+            return None
+        table = StoredFileModel.__table__
+        db.session.execute(table.update().where(table.c.name == name).values(ref_count=table.c.ref_count - 1))
+        ref_count = db.session.execute(db.select(table.c.ref_count).where(table.c.name == name)).scalar()
+        if ref_count == 0:
+            db.session.execute(table.delete().where(table.c.name == name))
+        return ref_count
+
+
+class FileUploadModel(db.Model):
+    """
+    One upload of a stored file. Only its user may release it; anonymous uploads (user_id is None)
+    are never released.
+    """
+    __tablename__ = 'file_upload'
+    __table_args__ = (db.Index('ix_file_upload_user_id_name', 'user_id', 'name'),)
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(80), db.ForeignKey('stored_file.name'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user_model.id'), nullable=True)
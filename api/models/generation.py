@@ -0,0 +1,26 @@
+from api import db
+from sqlalchemy.dialects.sqlite import insert
+
+
+class CacheGenerationModel(db.Model):
+    """
+    Invalidation counter of in-process caches shared by all processes (see utility/generation.py).
+    """
+    __tablename__ = 'cache_generation'
+    name = db.Column(db.String(32), primary_key=True)
+    generation = db.Column(db.Integer, nullable=False, default=0)
+
+    @staticmethod
+    def increment(name):
+        """
+        Creates the row or increments generation. Does not commit.
+        """
+        statement = insert(CacheGenerationModel).values(name=name, generation=1)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=[CacheGenerationModel.name],
+            set_={"generation": CacheGenerationModel.generation + 1}))
+
+    @staticmethod
+    def get(name):
+        table = CacheGenerationModel.__table__
+        return db.session.execute(db.select(table.c.generation).where(table.c.name == name)).scalar() or 0
@@ -0,0 +1,35 @@
+import json
+from api import db
+
+
+class JobModel(db.Model):
+    """
+    Background job (see utility/jobs.py). Times are unix timestamps.
+    """
+    __tablename__ = 'job'
+    __table_args__ = (
+        # выбор следующей задачи: status = 'queued' AND run_at <= ? ORDER BY run_at
+        db.Index('ix_job_status_run_at', 'status', 'run_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(64), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default="{}")
+    # повторный запрос с тем же ключом возвращает уже созданную задачу
+    idempotency_key = db.Column(db.String(128), unique=True)
+    status = db.Column(db.String(16), nullable=False, default="queued")  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False)
+    run_at = db.Column(db.Float, nullable=False)
+    # задача, взятая упавшим обработчиком, снова доступна после locked_until
+    locked_until = db.Column(db.Float)
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer)
+    error = db.Column(db.Text)
+    # пользователь, запустивший задачу: только он видит ее статус (None - анонимный запрос)
+    owner_id = db.Column(db.Integer, db.ForeignKey('user_model.id'), nullable=True)
+    created_at = db.Column(db.Float, nullable=False)
+    finished_at = db.Column(db.Float)
+
+    @property
+    def arguments(self):
+        return json.loads(self.payload)
@@ -1,27 +1,143 @@
 from api import db
 from api.models.user import UserModel
 from api.models.tag import TagModel
+from utility.write_queue import write_queue
 from sqlalchemy.sql import expression
+from sqlalchemy import DDL, func, literal_column, table, column
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import contains_eager, joinedload, raiseload, selectinload
 
 tags = db.Table('tags',
                db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'), primary_key=True),
-               db.Column('note_model_id', db.Integer, db.ForeignKey('note_model.id'), primary_key=True)
+               db.Column('note_model_id', db.Integer, db.ForeignKey('note_model.id'), primary_key=True),
+               # первичный ключ (tag_id, note_model_id) не помогает искать теги заметки
+               db.Index('ix_tags_note_model_id_tag_id', 'note_model_id', 'tag_id'),
                )
 
 class NoteModel(db.Model):
     # __name = "Author"
+    __table_args__ = (
+        # свои заметки: author_id = ? AND deleted = ? (порядок по id дает rowid в конце индекса)
+        db.Index('ix_note_model_author_id_deleted', 'author_id', 'deleted'),
+        # публичные заметки: private = 0 AND deleted = ?
+        db.Index('ix_note_model_private_deleted', 'private', 'deleted'),
+        # те же условия с порядком GET /notes по (importance, id): страница читается из индекса без сортировки
+        db.Index('ix_note_model_author_id_deleted_importance', 'author_id', 'deleted', 'importance', 'id'),
+        db.Index('ix_note_model_private_deleted_importance', 'private', 'deleted', 'importance', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     author_id = db.Column(db.Integer, db.ForeignKey(UserModel.id))
     importance = db.Column(db.Integer, server_default="1", nullable=False, default=1)
     text = db.Column(db.String(255), unique=False, nullable=False)
     private = db.Column(db.Boolean(), default=True, nullable=False)
-    tags = db.relationship(TagModel, secondary=tags, lazy='subquery', backref=db.backref('notes', lazy=True))
+    # связи загружаются лениво, списки заметок задают стратегию загрузки явно (см. with_author_and_tags)
+    tags = db.relationship(TagModel, secondary=tags, lazy='select', backref=db.backref('notes', lazy=True))
     deleted = db.Column(db.Boolean(), nullable=False, default=False)
+    # глобально возрастающий номер изменения, выставляется триггерами БД (см. NOTE_VERSION_DDL)
+    version = db.Column(db.Integer, nullable=False, server_default="0", server_onupdate=db.FetchedValue(), index=True)
 
     def save(self):
-        db.session.add(self)
-        db.session.commit()
+        write_queue.commit(self)
 
     def delete(self):
-        db.session.delete(self)
-        db.session.commit()
\ No newline at end of file
+        write_queue.commit(self, delete=True)
+
+    @staticmethod
+    def search(text):
+        """
+        Full-text search over note text.
+        Returns query of (NoteModel, snippet, rank) ordered by bm25 rank (best first).
+        """
+        fts = literal_column(note_fts.name)
+        rank = func.bm25(fts)
+        snippet = func.snippet(fts, 0, '[', ']', '...', 12)
+        return db.session.query(NoteModel, snippet, rank) \
+            .join(note_fts, note_fts.c.rowid == NoteModel.id) \
+            .filter(fts.op('MATCH')(fts_query(text))) \
+            .order_by(rank)
+
+
+def with_author_and_tags(query, author_joined=False):
+    """
+    Loader options for queries of notes serialized with NoteSchema: the author is loaded in the same SELECT,
+    tags of all notes with one more SELECT ... IN. Access to any other relationship raises instead of
+    issuing a query per note. Pass author_joined=True if the query already joins NoteModel.author.
+    """
+    author = contains_eager(NoteModel.author) if author_joined else joinedload(NoteModel.author)
+    return query.options(author, selectinload(NoteModel.tags), raiseload('*'))
+
+
+# Максимум строк в одном INSERT ... VALUES (SQLite ограничивает число параметров запроса)
+TAGS_INSERT_CHUNK_SIZE = 5000
+
+
+def add_tags(tag_ids, note_ids):
+    """
+    Links every note with every tag. Already existing links are skipped by the database.
+    Does not commit.
+    """
+    rows = [{"tag_id": tag_id, "note_model_id": note_id} for note_id in note_ids for tag_id in tag_ids]
+    for start in range(0, len(rows), TAGS_INSERT_CHUNK_SIZE):
+        db.session.execute(insert(tags).values(rows[start:start + TAGS_INSERT_CHUNK_SIZE]).on_conflict_do_nothing())
+
+
+def remove_tags(tag_ids, note_ids=None):
+    """
+    Unlinks tags from the notes (from all notes if note_ids is None) with one DELETE.
+    Does not commit.
+    """
+    condition = tags.c.tag_id.in_(tag_ids)
+    if note_ids is not None:
+        condition &= tags.c.note_model_id.in_(note_ids)
+    db.session.execute(tags.delete().where(condition))
+
+
+def fts_query(text):
+    # каждое слово ищем как отдельную фразу, чтобы спецсимволы FTS5 из запроса не ломали синтаксис
+    return " ".join('"{}"'.format(word.replace('"', '""')) for word in text.split())
+
+
+# Полнотекстовый индекс (SQLite FTS5) по NoteModel.text, синхронизируется триггерами.
+# Для существующей БД создается миграцией, для тестов - вместе с таблицей note_model.
+note_fts = table('note_fts', column('rowid'), column('text'))
+
+NOTE_FTS_DDL = [
+    "CREATE VIRTUAL TABLE note_fts USING fts5(text, content='note_model', content_rowid='id')",
+    "CREATE TRIGGER note_fts_insert AFTER INSERT ON note_model BEGIN "
+    "INSERT INTO note_fts(rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER note_fts_delete AFTER DELETE ON note_model BEGIN "
+    "INSERT INTO note_fts(note_fts, rowid, text) VALUES ('delete', old.id, old.text); END",
+    "CREATE TRIGGER note_fts_update AFTER UPDATE OF text ON note_model BEGIN "
+    "INSERT INTO note_fts(note_fts, rowid, text) VALUES ('delete', old.id, old.text); "
+    "INSERT INTO note_fts(rowid, text) VALUES (new.id, new.text); END",
+]
+
+for statement in NOTE_FTS_DDL:
+    db.event.listen(NoteModel.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+db.event.listen(NoteModel.__table__, 'before_drop', DDL("DROP TABLE IF EXISTS note_fts").execute_if(dialect='sqlite'))
+
+
+# Версия заметки меняется при любом изменении, влияющем на ее представление в API:
+# сама заметка, ее теги, имя автора, названия ее тегов. Новое значение = MAX(version) + 1,
+# поэтому MAX(version) и COUNT(*) по выборке меняются при любом изменении в ней (используется для ETag).
+NEXT_NOTE_VERSION = "(SELECT COALESCE(MAX(version), 0) + 1 FROM note_model)"
+
+NOTE_VERSION_DDL = [
+    "CREATE TRIGGER note_version_insert AFTER INSERT ON note_model BEGIN "
+    f"UPDATE note_model SET version = {NEXT_NOTE_VERSION} WHERE id = new.id; END",
+    "CREATE TRIGGER note_version_update AFTER UPDATE ON note_model WHEN new.version = old.version BEGIN "
+    f"UPDATE note_model SET version = {NEXT_NOTE_VERSION} WHERE id = new.id; END",
+    "CREATE TRIGGER note_version_tags_insert AFTER INSERT ON tags BEGIN "
+    f"UPDATE note_model SET version = {NEXT_NOTE_VERSION} WHERE id = new.note_model_id; END",
+    "CREATE TRIGGER note_version_tags_delete AFTER DELETE ON tags BEGIN "
+    f"UPDATE note_model SET version = {NEXT_NOTE_VERSION} WHERE id = old.note_model_id; END",
+    "CREATE TRIGGER note_version_author_update AFTER UPDATE OF username ON user_model BEGIN "
+    f"UPDATE note_model SET version = {NEXT_NOTE_VERSION} WHERE author_id = new.id; END",
+    "CREATE TRIGGER note_version_tag_update AFTER UPDATE OF name ON tag BEGIN "
+    f"UPDATE note_model SET version = {NEXT_NOTE_VERSION} "
+    "WHERE id IN (SELECT note_model_id FROM tags WHERE tag_id = new.id); END",
+]
+
+# tags создается последней, к этому моменту существуют все таблицы, на которые ссылаются триггеры
+for statement in NOTE_VERSION_DDL:
+    db.event.listen(tags, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
@@ -1,5 +1,6 @@
 from api import db
 from sqlalchemy.exc import IntegrityError
+from utility.write_queue import write_queue
 
 class TagModel(db.Model):
    __tablename__ = 'tag'
@@ -8,12 +9,10 @@ class TagModel(db.Model):
 
    def save(self):
       try:
-         db.session.add(self)
-         db.session.commit()
+         write_queue.commit(self)
       except IntegrityError as e:
          db.session.rollback()
          raise e
 
    def delete(self):
-      db.session.delete(self)
-      db.session.commit()
+      write_queue.commit(self, delete=True)
@@ -1,8 +1,34 @@
 from api import db, Config, ma
 from passlib.apps import custom_app_context as pwd_context
 from itsdangerous import URLSafeTimedSerializer as Serializer
-from itsdangerous import URLSafeSerializer, BadSignature
+from itsdangerous import BadSignature
 from sqlalchemy.exc import IntegrityError
+from utility.auth_cache import credential_cache, user_cache, users_generation
+from utility.write_queue import write_queue
+
+
+class UserIdentity:
+    """
+    Authenticated user as seen by request handlers (multi_auth.current_user()).
+    Plain object, not bound to a db session, so it can be kept in user_cache.
+    """
+
+    def __init__(self, id, username, role, token_version):
+        self.id = id
+        self.username = username
+        self.role = role
+        self.token_version = token_version
+
+    @classmethod
+    def from_model(cls, user):
+        return cls(user.id, user.username, user.role, user.token_version)
+
+    def get_roles(self):
+        return self.role
+
+    def generate_auth_token(self):
+        s = Serializer(Config.SECRET_KEY)
+        return s.dumps({'id': self.id, 'role': self.role, 'ver': self.token_version})
 
 
 class UserModel(db.Model):
@@ -12,6 +38,8 @@ class UserModel(db.Model):
     password_hash = db.Column(db.String(128))
     notes = db.relationship('NoteModel', backref='author', lazy='dynamic')
     role = db.Column(db.String(32), nullable=False, server_default="simple_user", default="simple_user")
+    # увеличивается при смене пароля и отзыве токенов, токены со старой версией недействительны
+    token_version = db.Column(db.Integer, nullable=False, server_default="1", default=1)
 
     def __init__(self, username, password, role="simple_user"):
         self.username = username
@@ -22,33 +50,60 @@ class UserModel(db.Model):
         return self.role
 
     def hash_password(self, password):
+        if self.password_hash is not None:
+            self.revoke_tokens()
         self.password_hash = pwd_context.hash(password)
 
     def verify_password(self, password):
         return pwd_context.verify(password, self.password_hash)
 
+    def revoke_tokens(self):
+        self.token_version = (self.token_version or 1) + 1
+
     def generate_auth_token(self):
-        s = URLSafeSerializer(Config.SECRET_KEY)
-        return s.dumps({'id': self.id})
+        return UserIdentity.from_model(self).generate_auth_token()
 
     def save(self):
+        existed = self.id is not None
         try:
-            db.session.add(self)
-            db.session.commit()
+            write_queue.commit(self)
         except IntegrityError as e:
             db.session.rollback()
             raise e
+        credential_cache.invalidate_user(self.id)
+        user_cache.pop(self.id)
+        if existed:
+            users_generation.bump()
 
     def delete(self):
-        db.session.delete(self)
-        db.session.commit()
+        write_queue.commit(self, delete=True)
+        credential_cache.invalidate_user(self.id)
+        user_cache.pop(self.id)
+        users_generation.bump()
+
+    @staticmethod
+    def get_identity(user_id):
+        """
+        Returns UserIdentity from user_cache, loading the user from db only on a cache miss.
+        """
+        identity = user_cache.get(user_id)
+        if identity is None:
+            user = UserModel.query.get(user_id)
+            if user is None:
+                return None
+            identity = UserIdentity.from_model(user)
+            user_cache.set(user_id, identity)
+        return identity
 
     @staticmethod
     def verify_auth_token(token):
-        s = URLSafeSerializer(Config.SECRET_KEY)
+        s = Serializer(Config.SECRET_KEY)
         try:
-            data = s.loads(token)
+            data = s.loads(token, max_age=Config.AUTH_TOKEN_EXPIRATION)
         except BadSignature:
-            return None  # invalid token
-        user = UserModel.query.get(data['id'])
-        return user
+            return None  # invalid or expired token
+        users_generation.check()
+        identity = UserModel.get_identity(data['id'])
+        if identity is None or identity.token_version != data.get('ver'):
+            return None  # user deleted or token revoked
+        return identity
@@ -0,0 +1,13 @@
+from api import ma
+from api.models.job import JobModel
+from utility.serializer import CompiledSchemaMixin
+
+
+# Сериализация ответа(response)
+class JobSchema(CompiledSchemaMixin, ma.SQLAlchemyAutoSchema):
+    class Meta:
+        model = JobModel
+        fields = ("id", "kind", "status", "attempts", "progress", "total", "error", "created_at", "finished_at")
+
+
+job_schema = JobSchema()
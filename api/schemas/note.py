@@ -2,12 +2,13 @@ from api import ma
 from api.models.note import NoteModel
 from api.schemas.user import UserSchema
 from api.schemas.tag import TagSchema
+from utility.serializer import CompiledSchemaMixin
 
 
 #       schema        flask-restful
 # object ------>  dict ----------> json
 
-class NoteSchema(ma.SQLAlchemySchema):
+class NoteSchema(CompiledSchemaMixin, ma.SQLAlchemySchema):
     class Meta:
         model = NoteModel
 
@@ -18,6 +19,17 @@ class NoteSchema(ma.SQLAlchemySchema):
     author = ma.Nested(UserSchema())
     tags = ma.Nested(TagSchema(many=True))
 
+# Страница заметок: {"items": [...], "next_cursor": "..."}
+class NotePageSchema(CompiledSchemaMixin, ma.Schema):
+    items = ma.Nested(NoteSchema, many=True)
+    next_cursor = ma.Str(allow_none=True)
+
+# Результат полнотекстового поиска: заметка, фрагмент текста с совпадением и ранг (bm25, чем меньше - тем лучше)
+class NoteSearchResultSchema(CompiledSchemaMixin, ma.Schema):
+    note = ma.Nested(NoteSchema)
+    snippet = ma.Str()
+    rank = ma.Float()
+
 # Десериализация запроса(request)
 class NoteRequestSchema(ma.SQLAlchemySchema):
     class Meta:
@@ -26,6 +38,17 @@ class NoteRequestSchema(ma.SQLAlchemySchema):
     text = ma.Str()
     private = ma.Boolean()
 
+# Элемент пакетного изменения заметок: id обязателен
+class NoteBatchUpdateSchema(NoteRequestSchema):
+    id = ma.Int(required=True)
+
+# Результат обработки одного элемента пакета
+class NoteBatchResultSchema(CompiledSchemaMixin, ma.Schema):
+    index = ma.Int()
+    id = ma.Int(allow_none=True)
+    status = ma.Int()
+    error = ma.Str()
+
 note_schema = NoteSchema()
 notes_schema = NoteSchema(many=True)
 
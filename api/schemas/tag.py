@@ -1,8 +1,9 @@
 from api import ma
 from api.models.tag import TagModel
+from utility.serializer import CompiledSchemaMixin
 
 # Сериализация ответа(response)
-class TagSchema(ma.SQLAlchemyAutoSchema):
+class TagSchema(CompiledSchemaMixin, ma.SQLAlchemyAutoSchema):
    class Meta:
        model = TagModel
        fields = ("id", "name", )
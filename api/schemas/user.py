@@ -1,5 +1,6 @@
 from api import ma
 from api.models.user import UserModel
+from utility.serializer import CompiledSchemaMixin
 
 
 #       schema        flask-restful
@@ -7,7 +8,7 @@ from api.models.user import UserModel
 
 
 # Сериализация ответа(response)
-class UserSchema(ma.SQLAlchemySchema):
+class UserSchema(CompiledSchemaMixin, ma.SQLAlchemySchema):
     class Meta:
         model = UserModel
         fields = ('id', 'username', "is_staff", "role")
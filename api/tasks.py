@@ -0,0 +1,65 @@
+from api import app, db
+from api.models.file import FileUploadModel
+from api.models.job import JobModel
+from api.models.note import NoteModel, tags, remove_tags
+from api.models.tag import TagModel
+from api.models.user import UserModel
+from utility.auth_cache import users_generation
+from utility.jobs import job_queue
+from utility.tag_index import tag_index
+
+# Каскадные удаления, затрагивающие много заметок, выполняются в фоне (flask worker).
+# Каждая порция удаляется и коммитится вместе с progress задачи: прерванная задача при повторе
+# продолжает с оставшихся строк, а транзакция не держит блокировку записи SQLite надолго.
+# Последняя (неполная) порция удаляется условием, а не по списку id, в одной транзакции с самим
+# объектом: заметка или связь, добавленная между порциями, удаляется вместе с ним.
+
+
+@job_queue.task("delete_user")
+def delete_user(job, user_id):
+    notes = NoteModel.__table__
+    if job.total is None:
+        total = db.session.execute(db.select(db.func.count()).where(notes.c.author_id == user_id)).scalar()
+        job_queue.progress(job, 0, total)
+    chunk_size = app.config["JOB_CHUNK_SIZE"]
+    while True:
+        note_ids = db.session.execute(db.select(notes.c.id).where(notes.c.author_id == user_id)
+                                      .limit(chunk_size)).scalars().all()
+        if len(note_ids) < chunk_size:
+            break
+        db.session.execute(tags.delete().where(tags.c.note_model_id.in_(note_ids)))
+        db.session.execute(notes.delete().where(notes.c.id.in_(note_ids)))
+        job_queue.progress(job, job.progress + len(note_ids))
+        db.session.commit()
+    user_notes = db.select(notes.c.id).where(notes.c.author_id == user_id)
+    db.session.execute(tags.delete().where(tags.c.note_model_id.in_(user_notes)))
+    deleted = db.session.execute(notes.delete().where(notes.c.author_id == user_id)).rowcount
+    # загрузки файлов остаются, но освободить их больше некому (id может достаться новому пользователю)
+    FileUploadModel.query.filter(FileUploadModel.user_id == user_id).update({FileUploadModel.user_id: None})
+    JobModel.query.filter(JobModel.owner_id == user_id).update({JobModel.owner_id: None})
+    UserModel.query.filter(UserModel.id == user_id).delete()
+    job_queue.progress(job, job.progress + deleted)
+    db.session.commit()
+    # задача выполняется в процессе flask worker: кеши процессов gunicorn очищаются через общий счетчик
+    users_generation.bump()
+
+
+@job_queue.task("delete_tag")
+def delete_tag(job, tag_id):
+    if job.total is None:
+        total = db.session.execute(db.select(db.func.count()).where(tags.c.tag_id == tag_id)).scalar()
+        job_queue.progress(job, 0, total)
+    chunk_size = app.config["JOB_CHUNK_SIZE"]
+    while True:
+        note_ids = db.session.execute(db.select(tags.c.note_model_id).where(tags.c.tag_id == tag_id)
+                                      .limit(chunk_size)).scalars().all()
+        if len(note_ids) < chunk_size:
+            break
+        remove_tags([tag_id], note_ids)
+        job_queue.progress(job, job.progress + len(note_ids))
+        db.session.commit()
+    deleted = db.session.execute(tags.delete().where(tags.c.tag_id == tag_id)).rowcount
+    TagModel.query.filter(TagModel.id == tag_id).delete()
+    job_queue.progress(job, job.progress + deleted)
+    db.session.commit()
+    tag_index.generation.bump()
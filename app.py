@@ -3,7 +3,8 @@ from api.models.note import NoteModel
 from api.models.user import UserModel
 from api.models.note import TagModel
 from config import Config
-from api.handlers import auth, note, user, tag, file
+from api.handlers import auth, note, user, tag, file, job, metrics
+from api import tasks  # задачи фоновой очереди (flask worker)
 from flask import render_template, send_from_directory
 
 # CRUD
@@ -35,6 +36,10 @@ docs.register(note.note_delete_tags)
 docs.register(note.get_all_public_notes)
 docs.register(note.get_deleted_notes)
 docs.register(note.change_note_importance)
+docs.register(note.search_notes)
+docs.register(note.create_notes_batch)
+docs.register(note.edit_notes_batch)
+docs.register(note.archive_notes_batch)
 
 
 # TAGS
@@ -43,11 +48,25 @@ docs.register(tag.get_tags)
 docs.register(tag.create_tag)
 docs.register(tag.edit_tag)
 docs.register(tag.delete_tag)
+docs.register(tag.tag_add_notes)
+docs.register(tag.tag_delete_notes)
 
 # FILES
 docs.register(file.upload_file)
+docs.register(file.delete_file)
+docs.register(file.create_upload)
+docs.register(file.upload_session)
+docs.register(file.upload_chunk)
+docs.register(file.complete_upload)
+docs.register(file.cancel_upload)
 docs.register(file.download_file)
 
+# JOBS
+docs.register(job.get_job)
+
+# MONITORING
+docs.register(metrics.get_metrics)
+
 
 @app.shell_context_processor
 def make_shell_context():
@@ -1,3 +1,4 @@
+import click
 from api import app
 from api.models.user import UserModel
 from sqlalchemy.exc import IntegrityError
@@ -25,3 +26,29 @@ def get_users():
    for i, user in enumerate(users, start=1):
       print(f"{i}. User id: {user.id} {user.username}")
 
+
+@app.cli.command('checkdb')
+def check_db():
+   """
+   Show effective SQLite settings of the database
+   """
+   from api import db
+   from utility.sqlite import check_settings
+   settings, mismatches = check_settings(db.engine)
+   for name, value in settings.items():
+      print(f"{name}: {value}")
+   for name, (expected, actual) in mismatches.items():
+      print(f"WARNING: {name} is {actual}, configured {expected}")
+
+
+@app.cli.command('worker')
+@click.option('--threads', default=1, help='Jobs run at the same time in each process')
+@click.option('--processes', default=1, help='Worker processes')
+@click.option('--burst', is_flag=True, help='Exit when no job is ready')
+def run_worker(threads, processes, burst):
+   """
+   Runs background jobs (deleting users, tags)
+   """
+   from utility.jobs import job_queue
+   import api.tasks  # noqa: задачи регистрируются при импорте
+   job_queue.serve(threads, processes, burst)
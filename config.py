@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 from apispec import APISpec
 from apispec.ext.marshmallow import MarshmallowPlugin
@@ -7,6 +8,18 @@ BASE_DIR = Path(__file__).parent
 class Config:
     SQLALCHEMY_DATABASE_URI = f"sqlite:///{BASE_DIR / 'main.db'}"
     TEST_DATABASE = 'sqlite:///:memory:'
+    # SQLite: прагмы выставляются на каждом соединении, пул - одно соединение на поток процесса (utility/sqlite.py)
+    SQLITE_PRAGMAS = {
+        "busy_timeout": 5000,  # ms, запись ждет блокировку вместо ошибки "database is locked"
+        "journal_mode": "WAL",  # читатели не блокируются писателем
+        "synchronous": "NORMAL",  # в WAL устойчиво к падению процесса, fsync только при checkpoint
+        "cache_size": -64000,  # KiB на соединение
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+    }
+    SQLITE_POOL_SIZE = int(os.environ.get("SQLITE_POOL_SIZE", 8))  # не меньше числа потоков gunicorn (--threads); 0 - без пула
+    SQLITE_POOL_OVERFLOW = 8
+    SQLITE_POOL_TIMEOUT = 30  # seconds
     SQLALCHEMY_TRACK_MODIFICATIONS = False  # Зачем эта настройка: https://flask-sqlalchemy-russian.readthedocs.io/ru/latest/config.html#id2
     DEBUG = True
     # SQLALCHEMY_ECHO = True
@@ -32,5 +45,45 @@ class Config:
     LANGUAGES = ['en', 'ru']
     UPLOAD_FOLDER_NAME = 'upload'
     UPLOAD_FOLDER = BASE_DIR / UPLOAD_FOLDER_NAME
+    UPLOAD_CHUNK_SIZE = 64 * 1024  # bytes read from an upload at once
+    UPLOAD_SESSION_TTL = 24 * 60 * 60  # seconds, unfinished resumable uploads are deleted after this time
+    UPLOAD_SESSION_GC_INTERVAL = 10 * 60  # seconds
+    # None - файл отдает Python, "x-accel-redirect" (nginx) или "x-sendfile" (Apache, lighttpd) - прокси
+    DOWNLOAD_OFFLOAD = os.environ.get("DOWNLOAD_OFFLOAD") or None
+    DOWNLOAD_ACCEL_PREFIX = '/internal-upload/'  # internal location nginx, указывающий на UPLOAD_FOLDER
+    DOWNLOAD_MAX_AGE = 365 * 24 * 60 * 60  # seconds, content-addressed files never change
+    IMAGE_VARIANTS = {"thumbnail": 256, "medium": 1280}  # name -> max width and height, px
+    IMAGE_VARIANT_QUALITY = 85
+    IMAGE_VARIANT_WORKERS = 2  # processes; 0 - variants are created during the upload request
+    JOB_MAX_ATTEMPTS = 5
+    JOB_RETRY_DELAY = 10  # seconds, doubled after each failed attempt
+    JOB_RETRY_MAX_DELAY = 10 * 60  # seconds
+    JOB_LEASE = 5 * 60  # seconds, a job of a crashed worker is run again after this time
+    JOB_POLL_INTERVAL = 1  # seconds
+    JOB_CHUNK_SIZE = 500  # rows deleted per transaction by cascade jobs
+    NOTES_PAGE_SIZE = 50
+    NOTES_PAGE_SIZE_MAX = 500
+    NOTES_STREAM_CHUNK_SIZE = 500
+    NOTES_BATCH_MAX_SIZE = 500
+    TAG_INDEX_ENABLED = True
+    TAG_INDEX_TTL = 300  # seconds, picks up tag changes made by other gunicorn workers
+    TAG_INDEX_BACKGROUND_LOAD = True  # False - an author's index is loaded during the request
+    AUTH_CACHE_SIZE = 1024
+    AUTH_CACHE_TTL = 300  # seconds
+    AUTH_TOKEN_EXPIRATION = 24 * 60 * 60  # seconds
+    USER_CACHE_SIZE = 4096
+    USER_CACHE_TTL = 60  # seconds, bounds staleness between gunicorn workers
+    CACHE_SYNC_INTERVAL = 1  # seconds, how often a process checks for user/tag changes made by other processes
+    RESPONSE_CACHE_ENABLED = True
+    RESPONSE_CACHE_BACKEND = "sqlite"  # "sqlite" - shared by all workers, "memory" - per process
+    RESPONSE_CACHE_PATH = BASE_DIR / 'response_cache.db'
+    RESPONSE_CACHE_SIZE = 10000  # entries
+    WRITE_QUEUE_ENABLED = False  # group commit of model save()/delete() by a writer thread (utility/write_queue.py)
+    WRITE_QUEUE_MAX_DELAY = 0.002  # seconds, how long the writer waits to collect more changes into a batch
+    WRITE_QUEUE_MAX_BATCH = 64  # changes per commit
+    WRITE_QUEUE_TIMEOUT = 30  # seconds, request waits for its commit
+    METRICS_ENABLED = True
+    METRICS_DIR = os.environ.get("METRICS_DIR")  # set for gunicorn with several workers
+    METRICS_FLUSH_INTERVAL = 5  # seconds, how often a worker saves its metrics to METRICS_DIR
 
 
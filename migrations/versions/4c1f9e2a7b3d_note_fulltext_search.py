@@ -0,0 +1,39 @@
+"""note full-text search
+
+Revision ID: 4c1f9e2a7b3d
+Revises: 97536f30a8c6
+Create Date: 2026-10-18 12:04:51.217436
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c1f9e2a7b3d'
+down_revision = '97536f30a8c6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE VIRTUAL TABLE note_fts USING fts5(text, content='note_model', content_rowid='id')")
+
+    # индекс существующих заметок строит команда rebuild (читает note_model целиком).
+    # Миграция выполняется одной транзакцией Alembic: запись в БД заблокирована до ее конца
+    op.execute("INSERT INTO note_fts(note_fts) VALUES ('rebuild')")
+
+    op.execute("CREATE TRIGGER note_fts_insert AFTER INSERT ON note_model BEGIN "
+               "INSERT INTO note_fts(rowid, text) VALUES (new.id, new.text); END")
+    op.execute("CREATE TRIGGER note_fts_delete AFTER DELETE ON note_model BEGIN "
+               "INSERT INTO note_fts(note_fts, rowid, text) VALUES ('delete', old.id, old.text); END")
+    op.execute("CREATE TRIGGER note_fts_update AFTER UPDATE OF text ON note_model BEGIN "
+               "INSERT INTO note_fts(note_fts, rowid, text) VALUES ('delete', old.id, old.text); "
+               "INSERT INTO note_fts(rowid, text) VALUES (new.id, new.text); END")
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS note_fts_update")
+    op.execute("DROP TRIGGER IF EXISTS note_fts_delete")
+    op.execute("DROP TRIGGER IF EXISTS note_fts_insert")
+    op.execute("DROP TABLE IF EXISTS note_fts")
@@ -0,0 +1,60 @@
+"""note version
+
+Revision ID: 7d3b5a1e9c40
+Revises: e5a7c3d90f12
+Create Date: 2026-10-18 16:27:55.804413
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d3b5a1e9c40'
+down_revision = 'e5a7c3d90f12'
+branch_labels = None
+depends_on = None
+
+NEXT_NOTE_VERSION = "(SELECT COALESCE(MAX(version), 0) + 1 FROM note_model)"
+
+
+def upgrade():
+    with op.batch_alter_table('note_model', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_index(batch_op.f('ix_note_model_version'), ['version'], unique=False)
+
+    # начальные версии: уникальные и возрастающие
+    op.execute("UPDATE note_model SET version = id")
+
+    op.execute("CREATE TRIGGER note_version_insert AFTER INSERT ON note_model BEGIN "
+               f"UPDATE note_model SET version = {NEXT_NOTE_VERSION} WHERE id = new.id; END")
+    op.execute("CREATE TRIGGER note_version_update AFTER UPDATE ON note_model WHEN new.version = old.version BEGIN "
+               f"UPDATE note_model SET version = {NEXT_NOTE_VERSION} WHERE id = new.id; END")
+    op.execute("CREATE TRIGGER note_version_tags_insert AFTER INSERT ON tags BEGIN "
+               f"UPDATE note_model SET version = {NEXT_NOTE_VERSION} WHERE id = new.note_model_id; END")
+    op.execute("CREATE TRIGGER note_version_tags_delete AFTER DELETE ON tags BEGIN "
+               f"UPDATE note_model SET version = {NEXT_NOTE_VERSION} WHERE id = old.note_model_id; END")
+    op.execute("CREATE TRIGGER note_version_author_update AFTER UPDATE OF username ON user_model BEGIN "
+               f"UPDATE note_model SET version = {NEXT_NOTE_VERSION} WHERE author_id = new.id; END")
+    op.execute("CREATE TRIGGER note_version_tag_update AFTER UPDATE OF name ON tag BEGIN "
+               f"UPDATE note_model SET version = {NEXT_NOTE_VERSION} "
+               "WHERE id IN (SELECT note_model_id FROM tags WHERE tag_id = new.id); END")
+
+
+def downgrade():
+    for trigger in ('note_version_tag_update', 'note_version_author_update', 'note_version_tags_delete',
+                    'note_version_tags_insert', 'note_version_update', 'note_version_insert'):
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+
+    with op.batch_alter_table('note_model', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_note_model_version'))
+        batch_op.drop_column('version')
+
+    # batch-режим пересоздает note_model, вместе с таблицей пропадают триггеры полнотекстового индекса
+    op.execute("CREATE TRIGGER IF NOT EXISTS note_fts_insert AFTER INSERT ON note_model BEGIN "
+               "INSERT INTO note_fts(rowid, text) VALUES (new.id, new.text); END")
+    op.execute("CREATE TRIGGER IF NOT EXISTS note_fts_delete AFTER DELETE ON note_model BEGIN "
+               "INSERT INTO note_fts(note_fts, rowid, text) VALUES ('delete', old.id, old.text); END")
+    op.execute("CREATE TRIGGER IF NOT EXISTS note_fts_update AFTER UPDATE OF text ON note_model BEGIN "
+               "INSERT INTO note_fts(note_fts, rowid, text) VALUES ('delete', old.id, old.text); "
+               "INSERT INTO note_fts(rowid, text) VALUES (new.id, new.text); END")
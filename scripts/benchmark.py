@@ -0,0 +1,425 @@
+import sys, os
+import click
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import base64
+import http.client
+import io
+import json
+import math
+import platform
+import random
+import shutil
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from werkzeug.serving import make_server, WSGIRequestHandler
+from werkzeug.test import EnvironBuilder
+from api import db
+from app import app  # все обработчики регистрируются в app.py
+from api.models.user import UserModel
+from api.models.tag import TagModel
+from config import BASE_DIR
+from utility.cache import clear_caches
+from utility.response_cache import response_cache
+from utility.storage import storage
+from utility.uploads import upload_sessions
+from utility.jobs import job_queue
+from scripts.generate_data import seed_database, insert_rows, PASSWORD
+
+# Нагрузочный тест всех обработчиков приложения на синтетических данных (scripts/generate_data.py).
+# Каждый обработчик прогоняется дважды на одинаковой копии БД: через Flask test client
+# (последовательно, без сети) и через многопоточный WSGI сервер с несколькими клиентами.
+# Результат - JSON с пропускной способностью и p50/p95/p99 по каждому обработчику, для сравнения запусков.
+
+# служебные обработчики flask и flask-apispec
+EXCLUDED_ENDPOINTS = {"static", "flask-apispec.swagger-ui", "flask-apispec.swagger-json", "flask-apispec.static"}
+BATCH_SIZE = 20
+UPLOAD_SIZE = 64 * 1024
+
+
+class BenchContext:
+    """
+    Data of one benchmark phase: generated dataset, auth headers of the admin (user 1) and
+    the notes that scenarios may change.
+    """
+
+    def __init__(self, dataset, seed):
+        self.dataset = dataset
+        self.rng = random.Random(seed)
+        self.user_id = 1
+        credentials = f"{dataset.usernames[self.user_id]}:{PASSWORD}".encode("utf-8")
+        self.auth = {"Authorization": "Basic " + base64.b64encode(credentials).decode("ascii")}
+        self.own_notes = dataset.notes_of(self.user_id)
+        self.readable_notes = dataset.readable_by(self.user_id)
+        self.archived = []
+
+    def take_own_notes(self, count):
+        """
+        Removes and returns up to count random notes of the user that are not archived.
+        """
+        count = min(count, len(self.own_notes))
+        taken = self.rng.sample(self.own_notes, count)
+        taken_set = set(taken)
+        self.own_notes = [note_id for note_id in self.own_notes if note_id not in taken_set]
+        return taken
+
+    def create_scratch(self, model, rows):
+        # объекты для удаления/изменения создаются в обход API, чтобы не влиять на замер
+        with app.app_context():
+            start = db.session.query(db.func.max(model.id)).scalar() + 1
+            rows = [dict(row, id=start + index) for index, row in enumerate(rows)]
+            insert_rows(model.__table__, rows)
+            db.session.commit()
+        return [row["id"] for row in rows]
+
+
+def get(path, headers=None):
+    return {"method": "GET", "path": path, "headers": headers or {}}
+
+
+def send(method, path, headers, **kwargs):
+    return dict(method=method, path=path, headers=headers, **kwargs)
+
+
+def random_tag(ctx):
+    # популярные теги встречаются в запросах чаще
+    names = list(ctx.dataset.tag_names.values())
+    return names[min(int(ctx.rng.paretovariate(1.2)) - 1, len(names) - 1)]
+
+
+def random_word(ctx):
+    words = ctx.dataset.words
+    return words[min(int(ctx.rng.paretovariate(1.1)) - 1, len(words) - 1)]
+
+
+def scratch_users(ctx, count):
+    password_hash = UserModel.query.get(ctx.user_id).password_hash
+    return ctx.create_scratch(UserModel, [{"username": f"scratch{ctx.rng.random()}", "password_hash": password_hash}
+                                          for _ in range(count)])
+
+
+def scratch_tags(ctx, count):
+    return ctx.create_scratch(TagModel, [{"name": f"scratch{ctx.rng.random()}"} for _ in range(count)])
+
+
+def scratch_files(ctx, count):
+    with app.app_context():
+        return [storage.save(io.BytesIO(f"scratch {ctx.rng.random()}".encode()), "scratch.bin", ctx.user_id)[0]
+                for _ in range(count)]
+
+
+def scratch_jobs(ctx, count):
+    # задачи не выполняются (обработчик не запущен), замеряется только чтение статуса
+    with app.app_context():
+        return [job_queue.enqueue("delete_tag", owner_id=ctx.user_id, tag_id=tag_id).id for tag_id in scratch_tags(ctx, count)]
+
+
+def scratch_uploads(ctx, count, complete=False):
+    uploads = []
+    for _ in range(count):
+        content = f"scratch {ctx.rng.random()}".encode() * 100
+        upload_id = upload_sessions.create("scratch.bin", len(content))["id"]
+        if complete:
+            upload_sessions.append(upload_id, 0, io.BytesIO(content))
+        uploads.append((upload_id, content))
+    return uploads
+
+
+def upload_request(ctx, index):
+    data = {"image": (io.BytesIO(b"x" * UPLOAD_SIZE), f"bench-{index}.bin")}
+    return send("PUT", "/files/upload", {}, data=data)
+
+
+# endpoint -> (ctx, count) -> list of requests; порядок важен: сначала чтение, затем изменения
+SCENARIOS = {
+    "get_notes": lambda ctx, n: [get("/notes", ctx.auth) for _ in range(n)],
+    "get_note_by_id": lambda ctx, n: [get(f"/notes/{ctx.rng.choice(ctx.readable_notes)}", ctx.auth) for _ in range(n)],
+    "get_all_public_notes": lambda ctx, n: [get("/notes/public") for _ in range(n)],
+    "get_user_public_notes": lambda ctx, n: [
+        get(f"/notes/filter/user?username={ctx.rng.choice(list(ctx.dataset.usernames.values()))}") for _ in range(n)],
+    "get_user_notes_by_tag": lambda ctx, n: [
+        get(f"/notes/filter/tag?name={random_tag(ctx)}&name={random_tag(ctx)}&match=any", ctx.auth) for _ in range(n)],
+    "get_deleted_notes": lambda ctx, n: [get("/notes/deleted", ctx.auth) for _ in range(n)],
+    "search_notes": lambda ctx, n: [get(f"/notes/search?q={random_word(ctx)}", ctx.auth) for _ in range(n)],
+    "get_users": lambda ctx, n: [get("/users") for _ in range(n)],
+    "get_user_by_id": lambda ctx, n: [get(f"/users/{ctx.rng.choice(list(ctx.dataset.usernames))}") for _ in range(n)],
+    "get_user_notes": lambda ctx, n: [get(f"/users/{ctx.rng.choice(list(ctx.dataset.usernames))}/notes/")
+                                      for _ in range(n)],
+    "get_tags": lambda ctx, n: [get("/tags") for _ in range(n)],
+    "get_tag_by_id": lambda ctx, n: [get(f"/tags/{ctx.rng.choice(list(ctx.dataset.tag_names))}") for _ in range(n)],
+    "get_auth_token": lambda ctx, n: [get("/auth/token", ctx.auth) for _ in range(n)],
+    "get_metrics": lambda ctx, n: [get("/metrics") for _ in range(n)],
+    "get_job": lambda ctx, n: [get(f"/jobs/{job_id}", ctx.auth) for job_id in scratch_jobs(ctx, n)],
+    "download_file": lambda ctx, n: [get("/upload/bench.bin") for _ in range(n)],
+    "create_note": lambda ctx, n: [send("POST", "/notes", ctx.auth, json={"text": f"{random_word(ctx)} {i}",
+                                                                          "private": bool(i % 2)}) for i in range(n)],
+    "edit_note": lambda ctx, n: [send("PUT", f"/notes/{ctx.rng.choice(ctx.own_notes)}", ctx.auth,
+                                      json={"text": f"{random_word(ctx)} edited"}) for _ in range(n)],
+    "change_note_importance": lambda ctx, n: [send("PUT", f"/notes/{ctx.rng.choice(ctx.own_notes)}/importance", ctx.auth)
+                                              for _ in range(n)],
+    "note_add_tags": lambda ctx, n: [send("PUT", f"/notes/{ctx.rng.choice(ctx.own_notes)}/tags", ctx.auth,
+                                          json={"tags": ctx.rng.sample(list(ctx.dataset.tag_names), 2)})
+                                     for _ in range(n)],
+    "note_delete_tags": lambda ctx, n: [send("DELETE", f"/notes/{ctx.rng.choice(ctx.own_notes)}/tags", ctx.auth,
+                                             json={"tags": ctx.rng.sample(list(ctx.dataset.tag_names), 2)})
+                                        for _ in range(n)],
+    "tag_add_notes": lambda ctx, n: [send("PUT", f"/tags/{ctx.rng.choice(list(ctx.dataset.tag_names))}/notes", ctx.auth,
+                                          json={"notes": ctx.rng.sample(ctx.own_notes, min(BATCH_SIZE, len(ctx.own_notes)))})
+                                     for _ in range(n)],
+    "tag_delete_notes": lambda ctx, n: [send("DELETE", f"/tags/{ctx.rng.choice(list(ctx.dataset.tag_names))}/notes",
+                                             ctx.auth, json={"notes": ctx.rng.sample(ctx.own_notes, min(BATCH_SIZE, len(ctx.own_notes)))})
+                                        for _ in range(n)],
+    "create_notes_batch": lambda ctx, n: [send("POST", "/notes/batch", ctx.auth,
+                                               json={"notes": [{"text": random_word(ctx)} for _ in range(BATCH_SIZE)]})
+                                          for _ in range(n)],
+    "edit_notes_batch": lambda ctx, n: [send("PUT", "/notes/batch", ctx.auth, json={"notes": [
+        {"id": note_id, "text": random_word(ctx)}
+        for note_id in ctx.rng.sample(ctx.own_notes, min(BATCH_SIZE, len(ctx.own_notes)))]}) for _ in range(n)],
+    "archive_note": lambda ctx, n: archive_notes(ctx, n),
+    "restore_note": lambda ctx, n: [send("PUT", f"/notes/{note_id}/restore", ctx.auth) for note_id in ctx.archived],
+    "archive_notes_batch": lambda ctx, n: [send("DELETE", "/notes/batch", ctx.auth, json={"notes": ctx.take_own_notes(BATCH_SIZE)})
+                                           for _ in range(min(n, len(ctx.own_notes) // BATCH_SIZE))],
+    "create_tag": lambda ctx, n: [send("POST", "/tags", {}, json={"name": f"new{ctx.rng.random()}"}) for _ in range(n)],
+    "edit_tag": lambda ctx, n: [send("PUT", f"/tags/{tag_id}", {}, json={"name": f"renamed{ctx.rng.random()}"})
+                                for tag_id in scratch_tags(ctx, n)],
+    "delete_tag": lambda ctx, n: [send("DELETE", f"/tags/{tag_id}", {}) for tag_id in scratch_tags(ctx, n)],
+    "upload_file": lambda ctx, n: [upload_request(ctx, i) for i in range(n)],
+    "delete_file": lambda ctx, n: [send("DELETE", f"/files/{name}", ctx.auth) for name in scratch_files(ctx, n)],
+    "create_upload": lambda ctx, n: [send("POST", "/files/uploads", {}, json={"filename": f"bench-{i}.bin",
+                                                                              "size": UPLOAD_SIZE}) for i in range(n)],
+    "upload_session": lambda ctx, n: [get(f"/files/uploads/{upload_id}") for upload_id, _ in scratch_uploads(ctx, n)],
+    "upload_chunk": lambda ctx, n: [send("PATCH", f"/files/uploads/{upload_id}", {"Upload-Offset": "0"}, data=content)
+                                    for upload_id, content in scratch_uploads(ctx, n)],
+    "complete_upload": lambda ctx, n: [send("POST", f"/files/uploads/{upload_id}/complete", {})
+                                       for upload_id, _ in scratch_uploads(ctx, n, complete=True)],
+    "cancel_upload": lambda ctx, n: [send("DELETE", f"/files/uploads/{upload_id}", {})
+                                     for upload_id, _ in scratch_uploads(ctx, n)],
+    # регистрация считает хеш пароля (сотни миллисекунд), поэтому запросов меньше
+    "create_user": lambda ctx, n: [send("POST", "/users", {}, json={"username": f"new{ctx.rng.random()}"[:32],
+                                                                    "password": PASSWORD})
+                                   for _ in range(max(1, n // 20))],
+    "delete_user": lambda ctx, n: [send("DELETE", f"/users/{user_id}", ctx.auth)
+                                   for user_id in with_app_context(scratch_users, ctx, n)],
+    # изменение и отзыв токенов сбрасывают кеш авторизации - каждый следующий запрос проверяет хеш пароля
+    "edit_user": lambda ctx, n: [send("PUT", f"/users/{ctx.user_id}", ctx.auth,
+                                      json={"username": ctx.dataset.usernames[ctx.user_id]}) for _ in range(max(1, n // 20))],
+    "revoke_auth_tokens": lambda ctx, n: [send("DELETE", "/auth/token", ctx.auth) for _ in range(max(1, n // 20))],
+}
+
+
+def archive_notes(ctx, count):
+    ctx.archived = ctx.take_own_notes(count)
+    return [send("DELETE", f"/notes/{note_id}", ctx.auth) for note_id in ctx.archived]
+
+
+def with_app_context(function, *args):
+    with app.app_context():
+        return function(*args)
+
+
+def percentile(values, fraction):
+    # nearest-rank
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def summarize(requests, latencies, statuses, elapsed):
+    latencies = sorted(latencies)
+    counts = {}
+    for status in statuses:
+        counts[str(status)] = counts.get(str(status), 0) + 1
+    result = {"method": requests[0]["method"], "requests": len(latencies),
+              "errors": sum(1 for status in statuses if status >= 400), "statuses": counts,
+              "rps": round(len(latencies) / elapsed, 1) if elapsed else None}
+    for name, fraction in (("p50_ms", 0.5), ("p95_ms", 0.95), ("p99_ms", 0.99)):
+        result[name] = round(percentile(latencies, fraction) * 1000, 3)
+    return result
+
+
+def run_test_client(requests, threads):
+    client = app.test_client()
+    latencies, statuses = [], []
+    started = time.perf_counter()
+    for request in requests:
+        request_started = time.perf_counter()
+        response = client.open(**request)
+        response.get_data()
+        latencies.append(time.perf_counter() - request_started)
+        statuses.append(response.status_code)
+    return latencies, statuses, time.perf_counter() - started
+
+
+class QuietHandler(WSGIRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive между запросами одного клиента
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def encode_request(request):
+    """
+    (method, url, body, headers) for http.client, encoded the same way as the test client does.
+    """
+    builder = EnvironBuilder(path=request["path"], method=request["method"], headers=request["headers"],
+                             json=request.get("json"), data=request.get("data"))
+    try:
+        environ = builder.get_environ()
+        body = environ["wsgi.input"].read()
+    finally:
+        builder.close()
+    url = environ["PATH_INFO"] + ("?" + environ["QUERY_STRING"] if environ["QUERY_STRING"] else "")
+    headers = dict(request["headers"], **{"Content-Length": str(len(body))})
+    if environ.get("CONTENT_TYPE"):
+        headers["Content-Type"] = environ["CONTENT_TYPE"]
+    return request["method"], url, body, headers
+
+
+def wsgi_runner(port):
+    local = threading.local()
+
+    def perform(encoded):
+        connection = getattr(local, "connection", None)
+        if connection is None:
+            connection = local.connection = http.client.HTTPConnection("127.0.0.1", port)
+        started = time.perf_counter()
+        connection.request(*encoded)
+        response = connection.getresponse()
+        response.read()
+        if response.will_close:
+            connection.close()
+            local.connection = None
+        return time.perf_counter() - started, response.status
+
+    def run(requests, threads):
+        encoded = [encode_request(request) for request in requests]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(threads) as executor:
+            results = list(executor.map(perform, encoded))
+        elapsed = time.perf_counter() - started
+        return [latency for latency, _ in results], [status for _, status in results], elapsed
+
+    return run
+
+
+def run_phase(runner, dataset, requests, threads, seed):
+    ctx = BenchContext(dataset, seed)
+    # первый запрос проверяет хеш пароля и заполняет кеш авторизации - в замер не входит
+    runner([get("/notes?limit=1", ctx.auth)], 1)
+    results = {}
+    for endpoint, scenario in SCENARIOS.items():
+        if endpoint not in app.view_functions:
+            continue
+        endpoint_requests = scenario(ctx, requests)
+        if not endpoint_requests:
+            continue
+        results[endpoint] = summarize(endpoint_requests, *runner(endpoint_requests, threads))
+    return results
+
+
+def run_benchmark(workdir, users=100, notes=10000, tags=50, requests=200, threads=8, seed=0):
+    """
+    Seeds a SQLite database in workdir and benchmarks every endpoint of the app.
+    Returns the report as a dict. App configuration is restored afterwards.
+    """
+    workdir = Path(workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+    keys = ("SQLALCHEMY_DATABASE_URI", "DEBUG", "UPLOAD_FOLDER", "RESPONSE_CACHE_PATH")
+    saved_config = {key: app.config[key] for key in keys}
+    upload_folder = workdir / "upload"
+    upload_folder.mkdir(exist_ok=True)
+    (upload_folder / "bench.bin").write_bytes(b"x" * UPLOAD_SIZE)
+    app.config.update(DEBUG=False, UPLOAD_FOLDER=upload_folder, RESPONSE_CACHE_PATH=workdir / "response_cache.db")
+    try:
+        seed_path = workdir / "seed.db"
+        app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{seed_path}"
+        started = time.perf_counter()
+        with app.app_context():
+            dataset = seed_database(users, notes, tags, seed)
+            # закрытие соединений пула переносит журнал WAL в файл БД перед копированием
+            db.get_engine().dispose()
+        seed_seconds = time.perf_counter() - started
+
+        phases = {}
+        for phase in ("test_client", "wsgi"):
+            # каждая фаза начинается с одинаковой копии БД и пустых кешей
+            phase_path = workdir / f"{phase}.db"
+            shutil.copyfile(seed_path, phase_path)
+            app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{phase_path}"
+            clear_caches()
+            response_cache.clear()
+            if phase == "test_client":
+                phases[phase] = run_phase(run_test_client, dataset, requests, 1, seed)
+                continue
+            server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietHandler)
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            try:
+                phases[phase] = run_phase(wsgi_runner(server.server_port), dataset, requests, threads, seed)
+            finally:
+                server.shutdown()
+    finally:
+        app.config.update(saved_config)
+        clear_caches()
+        response_cache.clear()
+
+    covered = set(SCENARIOS)
+    skipped = {endpoint: "no scenario" for endpoint in app.view_functions
+               if endpoint not in covered and endpoint not in EXCLUDED_ENDPOINTS}
+    return {
+        "meta": {"users": users, "notes": notes, "tags": tags, "requests": requests, "threads": threads,
+                 "seed": seed, "python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+                 "started_at": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "seed_seconds": round(seed_seconds, 3),
+        "phases": phases,
+        "skipped": skipped,
+    }
+
+
+def compare(report, baseline):
+    """
+    Lines with p50/p95 of every endpoint relative to the baseline report.
+    """
+    lines = []
+    for phase, results in report["phases"].items():
+        for endpoint, result in results.items():
+            old = baseline.get("phases", {}).get(phase, {}).get(endpoint)
+            if old is None:
+                continue
+            changes = " ".join(f"{key} {old[key]} -> {result[key]} ({(result[key] / old[key] - 1) * 100:+.0f}%)"
+                               for key in ("p50_ms", "p95_ms") if old[key])
+            lines.append(f"{phase:12} {endpoint:24} {changes}")
+    return lines
+
+
+@click.command
+@click.option('--output', default='benchmark.json', help='Report file (JSON)')
+@click.option('--baseline', type=click.Path(exists=True), help='Previous report to compare with')
+@click.option('--workdir', default=str(BASE_DIR / 'benchmark'), help='Directory for the database and uploads')
+@click.option('--users', default=100, help='Number of users')
+@click.option('--notes', default=10000, help='Number of notes')
+@click.option('--tags', default=50, help='Number of tags')
+@click.option('--requests', default=200, help='Requests per endpoint')
+@click.option('--threads', default=8, help='Concurrent clients of the WSGI server')
+@click.option('--seed', default=0, help='Random seed for data and requests')
+def benchmark(output, baseline, workdir, **kwargs):
+   """
+   Benchmarks every endpoint on synthetic data, writes throughput and p50/p95/p99 per endpoint as JSON
+   """
+   report = run_benchmark(workdir, **kwargs)
+   with open(output, "w", encoding="UTF-8") as f:
+       json.dump(report, f, indent=4)
+   for phase, results in report["phases"].items():
+       for endpoint, result in results.items():
+           print(f"{phase:12} {endpoint:24} {result['rps']:>8} rps  p50 {result['p50_ms']:>8} ms  "
+                 f"p95 {result['p95_ms']:>8} ms  p99 {result['p99_ms']:>8} ms  errors {result['errors']}")
+   if report["skipped"]:
+       print("No scenario for:", ", ".join(report["skipped"]))
+   if baseline:
+       with open(baseline, encoding="UTF-8") as f:
+           print("\n".join(compare(report, json.load(f))))
+
+
+if __name__ == '__main__':
+   benchmark()
@@ -2,30 +2,178 @@ import sys, os
 import click
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import datetime
+import gzip
+import hashlib
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from sqlalchemy import create_engine, MetaData
 from config import Config, BASE_DIR
 from api.models.note import NoteModel
 from api.models.user import UserModel
 from api.models.tag import TagModel
 
+# Потоковая выгрузка БД: таблицы читаются пачками строк, строки сразу пишутся в файл.
+# Форматы: json - прежний {"table": [row, ...]} (одна строка на запись, без отступов),
+# ndjson - каталог с файлом <table>.ndjson на каждую таблицу (таблицы выгружаются параллельно).
+# Рядом с выгрузкой сохраняется манифест с числом строк и контрольной суммой каждой таблицы,
+# load_db.py проверяет его при загрузке.
+
+CHUNK_SIZE = 5000
+MANIFEST_NAME = "manifest.json"
+COMPRESSION_SUFFIXES = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+
+def encode_value(value):
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def row_line(row):
+    """
+    Canonical JSON of a row; the checksum of a table is computed over these lines.
+    """
+    return json.dumps(row, ensure_ascii=False, separators=(",", ":"), default=encode_value)
+
+
+def open_text(path, mode):
+    """
+    Opens a text file, compressed according to its suffix (.gz, .zst).
+    """
+    path = str(path)
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="UTF-8", compresslevel=6)
+    if path.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            raise click.ClickException("zstd compression requires the zstandard package: pip install zstandard")
+        return zstandard.open(path, mode + "t", encoding="UTF-8")
+    return open(path, mode, encoding="UTF-8")
+
+
+def manifest_path(path):
+    path = Path(path)
+    if path.is_dir():
+        return path / MANIFEST_NAME
+    return path.with_name(path.name.split(".")[0] + "." + MANIFEST_NAME)
+
+
+class TableChecksum:
+    """
+    Row count and sha256 of the canonical lines of a table.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.sha256 = hashlib.sha256()
+
+    def update(self, line):
+        self.rows += 1
+        self.sha256.update(line.encode("UTF-8"))
+        self.sha256.update(b"\n")
+
+    def result(self):
+        return {"rows": self.rows, "sha256": self.sha256.hexdigest()}
+
+
+def iter_lines(engine, table, chunk_size):
+    """
+    Yields canonical lines of the table rows; rows are fetched from a server-side cursor by chunks.
+    """
+    primary_key = list(table.primary_key.columns)
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True).execute(table.select().order_by(*primary_key))
+        for rows in result.partitions(chunk_size):
+            for row in rows:
+                yield row_line(dict(row._mapping))
+
+
+def dump_table_file(engine, table, path, chunk_size):
+    checksum = TableChecksum()
+    with open_text(path, "w") as f:
+        for line in iter_lines(engine, table, chunk_size):
+            f.write(line)
+            f.write("\n")
+            checksum.update(line)
+    return dict(checksum.result(), file=path.name)
+
+
+def dump_json(engine, tables, path, chunk_size):
+    manifest = {}
+    with open_text(path, "w") as f:
+        f.write("{")
+        for index, table in enumerate(tables):
+            f.write(("," if index else "") + "\n" + json.dumps(table.name) + ": [")
+            checksum = TableChecksum()
+            for line in iter_lines(engine, table, chunk_size):
+                f.write(("," if checksum.rows else "") + "\n" + line)
+                checksum.update(line)
+            f.write("\n]")
+            manifest[table.name] = dict(checksum.result(), file=path.name)
+        f.write("\n}\n")
+    return manifest
+
+
+def dump_ndjson(engine, tables, directory, chunk_size, compression, jobs):
+    directory.mkdir(parents=True, exist_ok=True)
+    suffix = ".ndjson" + COMPRESSION_SUFFIXES[compression]
+    with ThreadPoolExecutor(jobs) as executor:
+        futures = {table.name: executor.submit(dump_table_file, engine, table, directory / (table.name + suffix),
+                                               chunk_size)
+                   for table in tables}
+    return {name: future.result() for name, future in futures.items()}
+
+
+def dump_database(engine, path, table_names, file_format="json", compression="none", jobs=4, chunk_size=CHUNK_SIZE):
+    """
+    Dumps tables (in foreign-key order) to path and writes the manifest. Returns the manifest.
+    """
+    meta = MetaData()
+    meta.reflect(bind=engine)
+    tables = [table for table in meta.sorted_tables if table.name in table_names]
+    path = Path(path)
+    if file_format == "json":
+        suffix = COMPRESSION_SUFFIXES[compression]
+        if not path.name.endswith(suffix):
+            path = path.with_name(path.name + suffix)
+        files = dump_json(engine, tables, path, chunk_size)
+    else:
+        files = dump_ndjson(engine, tables, path, chunk_size, compression, jobs)
+    manifest = {"format": file_format, "compression": compression,
+                "created_at": datetime.datetime.now().isoformat(timespec="seconds"), "tables": files}
+    with open(manifest_path(path), "w", encoding="UTF-8") as f:
+        json.dump(manifest, f, indent=4)
+    return manifest
+
+
 @click.command
 @click.argument('file_name', default='data.json')
-def dump_db(file_name):
-   path_to_db = Config.SQLALCHEMY_DATABASE_URI
-   models_only=[UserModel, NoteModel, TagModel]
+@click.option('--format', 'file_format', type=click.Choice(["json", "ndjson"]), default="json",
+              help='json: one file; ndjson: directory FILE_NAME with a file per table')
+@click.option('--compress', 'compression', type=click.Choice(list(COMPRESSION_SUFFIXES)), default="none",
+              help='Compression of the dump files (zstd requires the zstandard package)')
+@click.option('--jobs', default=4, help='Tables dumped in parallel (ndjson)')
+@click.option('--chunk-size', default=CHUNK_SIZE, help='Rows fetched from the database at once')
+@click.option('--table', 'table_names', multiple=True, help='Table to dump (default: users, notes and tags)')
+@click.option('--database', default=Config.SQLALCHEMY_DATABASE_URI, help='SQLAlchemy database URI')
+def dump_db(file_name, file_format, compression, jobs, chunk_size, table_names, database):
+   """
+   Dumps the database to fixtures/FILE_NAME with a manifest of row counts and checksums
+   """
+   models_only = [UserModel, NoteModel, TagModel]
+   table_names = table_names or [model.__tablename__ for model in models_only]
    file_name = BASE_DIR / "fixtures" / file_name
-   engine = create_engine(path_to_db)
-   meta = MetaData()
-   meta.reflect(bind=engine)
-   result = {}
-   for table in meta.sorted_tables:
-       if models_only and table.name not in [model.__tablename__ for model in models_only]:
-           continue
-       result[table.name] = [dict(row) for row in engine.execute(table.select())]
-
-   with open(file_name, "w", encoding="UTF-8") as f:
-       json.dump(result, f, ensure_ascii=False, indent=4)
+   engine = create_engine(database)
+   started = time.perf_counter()
+   manifest = dump_database(engine, file_name, table_names, file_format, compression, jobs, chunk_size)
+   for table, info in manifest["tables"].items():
+       print(f"{table}: {info['rows']} rows -> {info['file']}")
+   print(f"Done in {time.perf_counter() - started:.2f} s, manifest: {manifest_path(file_name)}")
 
 
-dump_db()
\ No newline at end of file
+if __name__ == '__main__':
+   dump_db()
@@ -0,0 +1,127 @@
+import sys, os
+import click
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import itertools
+import random
+from passlib.apps import custom_app_context as pwd_context
+from api import app, db
+from api.models.user import UserModel
+from api.models.note import NoteModel, tags as note_tags
+from api.models.tag import TagModel
+from config import BASE_DIR
+
+# Синтетические данные для нагрузочных тестов: число заметок у пользователей и популярность
+# тегов и слов распределены по степенному закону (несколько "активных" пользователей и
+# популярных тегов, длинный хвост остальных). При одинаковом seed данные совпадают.
+
+PASSWORD = "benchmark"
+INSERT_CHUNK_SIZE = 5000
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "to", "vi", "za", "pe", "do", "ri", "mu", "te", "go", "bi"]
+
+
+class Dataset:
+    """
+    Ids and names of the generated rows, used to build benchmark requests.
+    """
+
+    def __init__(self, usernames, note_authors, private_notes, deleted_notes, tag_names, words):
+        self.usernames = usernames          # user id -> username
+        self.note_authors = note_authors    # note id -> author id
+        self.private_notes = private_notes  # set of note ids
+        self.deleted_notes = deleted_notes  # set of note ids
+        self.tag_names = tag_names          # tag id -> name, most popular first
+        self.words = words                  # most frequent first
+
+    def notes_of(self, user_id, deleted=False):
+        return [note_id for note_id, author_id in self.note_authors.items()
+                if author_id == user_id and (note_id in self.deleted_notes) == deleted]
+
+    def readable_by(self, user_id):
+        return [note_id for note_id, author_id in self.note_authors.items()
+                if note_id not in self.deleted_notes and (author_id == user_id or note_id not in self.private_notes)]
+
+
+def zipf_cum_weights(size, exponent):
+    return list(itertools.accumulate(1 / rank ** exponent for rank in range(1, size + 1)))
+
+
+def make_words(rng, count):
+    words = set()
+    while len(words) < count:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def insert_rows(table, rows):
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        db.session.execute(table.insert(), rows[start:start + INSERT_CHUNK_SIZE])
+
+
+def seed_database(users=100, notes=10000, tags=50, seed=0, password=PASSWORD):
+    """
+    Recreates all tables of the current app database and fills them with synthetic rows.
+    User 1 is an admin and the most active author. All users share one password.
+    Must be called inside an app context.
+    """
+    rng = random.Random(seed)
+    db.drop_all()
+    db.create_all()
+    # хеш пароля считается один раз: это самая медленная операция при создании пользователя
+    password_hash = pwd_context.hash(password)
+    usernames = {user_id: f"user{user_id}" for user_id in range(1, users + 1)}
+    words = make_words(rng, 500)
+    word_weights = zipf_cum_weights(len(words), 1.1)
+    tag_names = {tag_id: f"tag{tag_id}" for tag_id in range(1, tags + 1)}
+    tag_ids = list(tag_names)
+    tag_weights = zipf_cum_weights(tags, 1.2)
+
+    authors = rng.choices(list(usernames), cum_weights=zipf_cum_weights(users, 1.2), k=notes)
+    note_rows, tag_rows = [], []
+    private_notes, deleted_notes = set(), set()
+    for note_id, author_id in enumerate(authors, start=1):
+        text = " ".join(rng.choices(words, cum_weights=word_weights, k=rng.randint(4, 20)))[:255]
+        private = rng.random() < 0.5
+        deleted = rng.random() < 0.05
+        note_rows.append({"id": note_id, "author_id": author_id, "text": text, "private": private,
+                          "deleted": deleted, "importance": rng.randint(1, 3)})
+        if private:
+            private_notes.add(note_id)
+        if deleted:
+            deleted_notes.add(note_id)
+        if tags and rng.random() < 0.8:
+            count = min(int(rng.paretovariate(1.3)), 8, tags)
+            chosen = set()
+            while len(chosen) < count:
+                chosen.add(rng.choices(tag_ids, cum_weights=tag_weights)[0])
+            tag_rows += [{"tag_id": tag_id, "note_model_id": note_id} for tag_id in sorted(chosen)]
+
+    db.session.execute("PRAGMA synchronous=OFF")
+    insert_rows(UserModel.__table__, [
+        {"id": user_id, "username": username, "password_hash": password_hash,
+         "role": "admin" if user_id == 1 else "simple_user"} for user_id, username in usernames.items()])
+    insert_rows(TagModel.__table__, [{"id": tag_id, "name": name} for tag_id, name in tag_names.items()])
+    insert_rows(NoteModel.__table__, note_rows)
+    insert_rows(note_tags, tag_rows)
+    db.session.commit()
+    return Dataset(usernames, dict(enumerate(authors, start=1)), private_notes, deleted_notes, tag_names, words)
+
+
+@click.command
+@click.argument('file_name', default='benchmark.db')
+@click.option('--users', default=100, help='Number of users')
+@click.option('--notes', default=10000, help='Number of notes')
+@click.option('--tags', default=50, help='Number of tags')
+@click.option('--seed', default=0, help='Random seed, the same seed gives the same data')
+def generate_data(file_name, users, notes, tags, seed):
+   """
+   Creates SQLite database FILE_NAME filled with synthetic users, notes and tags
+   """
+   app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{BASE_DIR / file_name}"
+   with app.app_context():
+      seed_database(users, notes, tags, seed)
+   print(f"{users} users, {notes} notes, {tags} tags -> {BASE_DIR / file_name} (password '{PASSWORD}')")
+
+
+if __name__ == '__main__':
+   generate_data()
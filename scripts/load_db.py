@@ -3,35 +3,314 @@ import click
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 import json
-from sqlalchemy import create_engine, MetaData, insert, Table
-from sqlalchemy.orm import sessionmaker
+import tempfile
+import time
+from pathlib import Path
+from contextlib import contextmanager
+from sqlalchemy import create_engine, MetaData
+from sqlalchemy.dialects import sqlite, postgresql
 from config import Config, BASE_DIR
-from api.models.note import NoteModel
-from api.models.user import UserModel
-from sqlalchemy.exc import IntegrityError
+from scripts.dump_db import open_text, manifest_path, row_line, TableChecksum
+
+# Потоковая загрузка фикстур {"table": [row, ...], ...}: строки читаются из файла по одной,
+# вставляются пачками (executemany) в больших транзакциях, таблицы загружаются в порядке внешних ключей.
+# Принимаются и выгрузки dump_db.py: сжатые файлы и каталоги ndjson. Если рядом есть манифест,
+# число строк и контрольные суммы таблиц сверяются с ним, при расхождении загрузка откатывается.
+
+READ_SIZE = 1024 * 1024
+CHUNK_SIZE = 5000
+TRANSACTION_ROWS = 200000
+# на время загрузки; после загрузки восстанавливаются прежние значения
+FAST_LOAD_PRAGMAS = {
+    "journal_mode": "MEMORY",
+    "synchronous": "OFF",
+    "cache_size": "-262144",  # 256 Мб
+    "temp_store": "MEMORY",
+}
+UPSERT_DIALECTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+class FixtureReader:
+    """
+    Incremental parser of a fixture file: rows are decoded one by one, so memory
+    does not depend on the size of the file.
+    """
+
+    def __init__(self, file, read_size=READ_SIZE):
+        self.file = file
+        self.read_size = read_size
+        self.buffer = ""
+        self.pos = 0
+        self.decoder = json.JSONDecoder()
+
+    def tables(self):
+        """
+        Yields (table name, iterator of rows). Rows of a table must be consumed before the next table.
+        """
+        self._expect("{")
+        if self._peek() == "}":
+            return
+        while True:
+            name = self._value()
+            self._expect(":")
+            yield name, self._rows()
+            if self._expect(",}") == "}":
+                return
+
+    def _rows(self):
+        self._expect("[")
+        if self._peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self._value()
+            if self._expect(",]") == "]":
+                return
+
+    def _fill(self):
+        chunk = self.file.read(self.read_size)
+        if not chunk:
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def _expect(self, chars):
+        char = self._peek()
+        if not char or char not in chars:
+            raise ValueError(f"Invalid fixture: expected {' or '.join(chars)!s}, got {char or 'end of file'!r}")
+        self.pos += 1
+        return char
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # значение не поместилось в буфер
+                if not self._fill():
+                    raise
+                continue
+            # число на границе буфера могло быть прочитано не полностью
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+
+def insert_statement(dialect, table, columns, on_conflict):
+    if on_conflict == "error":
+        return table.insert()
+    statement = UPSERT_DIALECTS[dialect.name](table)
+    primary_key = [column.name for column in table.primary_key]
+    update = {column: statement.excluded[column] for column in columns if column not in primary_key}
+    if on_conflict == "update" and primary_key and update:
+        return statement.on_conflict_do_update(index_elements=primary_key, set_=update)
+    return statement.on_conflict_do_nothing()
+
+
+def insert_chunk(connection, table, rows, on_conflict):
+    """
+    Inserts rows with executemany, grouped by the set of columns. Returns the number of written rows.
+    """
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(row), []).append(row)
+    written = 0
+    for columns, group in groups.items():
+        unknown = set(columns) - set(table.columns.keys())
+        if unknown:
+            raise ValueError(f"Table {table.name} has no columns {', '.join(sorted(unknown))}")
+        result = connection.execute(insert_statement(connection.dialect, table, columns, on_conflict), group)
+        written += max(result.rowcount, 0)
+    return written
+
+
+@contextmanager
+def fast_load_pragmas(connection):
+    if connection.dialect.name != "sqlite":
+        yield
+        return
+    saved = {name: connection.exec_driver_sql(f"PRAGMA {name}").scalar() for name in FAST_LOAD_PRAGMAS}
+    for name, value in FAST_LOAD_PRAGMAS.items():
+        connection.exec_driver_sql(f"PRAGMA {name}={value}")
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            connection.exec_driver_sql(f"PRAGMA {name}={value}")
+
+
+class Loader:
+    """
+    Loads (table name, rows) pairs into the database. A table whose parent tables
+    (by foreign key) are not loaded yet is spooled to a temporary file and loaded after them.
+    With expected checksums ({table: {"rows", "sha256"}} of a manifest) everything is loaded
+    in one transaction, which is rolled back if the data does not match.
+    """
+
+    def __init__(self, connection, metadata, on_conflict="skip", chunk_size=CHUNK_SIZE,
+                 transaction_rows=TRANSACTION_ROWS, expected=None):
+        self.connection = connection
+        self.metadata = metadata
+        self.on_conflict = on_conflict
+        self.chunk_size = chunk_size
+        self.transaction_rows = transaction_rows if expected is None else float("inf")
+        self.expected = expected
+        self.stats = {}  # table name -> [read, written, seconds]
+        self.checksums = {}
+        self._loaded = set()
+        self._spooled = {}
+        self._transaction = None
+        self._transaction_size = 0
+
+    def load(self, tables):
+        with fast_load_pragmas(self.connection):
+            self._transaction = self.connection.begin()
+            try:
+                for name, rows in tables:
+                    table = self._table(name)
+                    if self._parents(table) - self._loaded:
+                        self._spool(name, rows)
+                    else:
+                        self._load_table(table, rows)
+                for table in self.metadata.sorted_tables:
+                    if table.name in self._spooled:
+                        with self._spooled.pop(table.name) as spool:
+                            spool.seek(0)
+                            self._load_table(table, map(json.loads, spool))
+                if self.expected is not None:
+                    self._verify()
+                self._transaction.commit()
+            except BaseException:
+                self._transaction.rollback()
+                raise
+        return self.stats
+
+    def _verify(self):
+        mismatched = [name for name, expected in self.expected.items()
+                      if name not in self.checksums or self.checksums[name].result() != {
+                          "rows": expected["rows"], "sha256": expected["sha256"]}]
+        if mismatched:
+            raise ValueError(f"Data does not match the manifest: {', '.join(mismatched)}")
+
+    def _table(self, name):
+        if name not in self.metadata.tables:
+            raise ValueError(f"Unknown table {name}")
+        return self.metadata.tables[name]
+
+    def _parents(self, table):
+        return {key.column.table.name for key in table.foreign_keys} - {table.name}
+
+    def _spool(self, name, rows):
+        spool = self._spooled.get(name)
+        if spool is None:
+            spool = self._spooled[name] = tempfile.TemporaryFile("w+", encoding="UTF-8")
+        for row in rows:
+            spool.write(json.dumps(row) + "\n")
+
+    def _load_table(self, table, rows):
+        stats = self.stats.setdefault(table.name, [0, 0, 0.0])
+        started = time.perf_counter()
+        checksum = self.checksums.setdefault(table.name, TableChecksum()) if self.expected is not None else None
+        chunk = []
+        for row in rows:
+            if checksum is not None:
+                checksum.update(row_line(row))
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                self._write(table, chunk, stats)
+                chunk = []
+        if chunk:
+            self._write(table, chunk, stats)
+        stats[2] += time.perf_counter() - started
+        self._loaded.add(table.name)
+
+    def _write(self, table, chunk, stats):
+        stats[0] += len(chunk)
+        stats[1] += insert_chunk(self.connection, table, chunk, self.on_conflict)
+        self._transaction_size += len(chunk)
+        if self._transaction_size >= self.transaction_rows:
+            self._transaction.commit()
+            self._transaction = self.connection.begin()
+            self._transaction_size = 0
+
+
+def read_manifest(path):
+    path = manifest_path(path)
+    if not path.exists():
+        return None
+    with open(path, encoding="UTF-8") as f:
+        return json.load(f)
+
+
+def ndjson_tables(directory, manifest):
+    for name, info in manifest["tables"].items():
+        with open_text(directory / info["file"], "r") as f:
+            yield name, map(json.loads, f)
+
+
+def json_tables(path):
+    with open_text(path, "r") as f:
+        yield from FixtureReader(f).tables()
+
+
+def load_fixture(engine, path, on_conflict="skip", chunk_size=CHUNK_SIZE, verify=True):
+    """
+    Loads a fixture file (plain or compressed JSON) or an ndjson dump directory into the database of engine.
+    Returns {table: [read, written, seconds]}.
+    """
+    path = Path(path)
+    manifest = read_manifest(path)
+    if path.is_dir():
+        if manifest is None:
+            raise ValueError(f"{manifest_path(path)} not found")
+        tables = ndjson_tables(path, manifest)
+    else:
+        tables = json_tables(path)
+    expected = manifest["tables"] if manifest is not None and verify else None
+    metadata = MetaData(bind=engine)
+    metadata.reflect()
+    with engine.connect() as connection:
+        loader = Loader(connection, metadata, on_conflict, chunk_size, expected=expected)
+        return loader.load(tables)
+
+
+def rows_per_second(rows, seconds):
+    return f"{rows / seconds:.0f}" if seconds else "-"
+
 
 @click.command
 @click.argument('file_name', default='notes.json')
-def load_db(file_name):
-   path_to_db = Config.SQLALCHEMY_DATABASE_URI
+@click.option('--on-conflict', type=click.Choice(["skip", "update", "error"]), default="skip",
+              help='Existing rows (same primary key or unique value): keep, overwrite or fail')
+@click.option('--chunk-size', default=CHUNK_SIZE, help='Rows per INSERT executemany')
+@click.option('--no-verify', is_flag=True, help='Do not check row counts and checksums of the manifest')
+@click.option('--database', default=Config.SQLALCHEMY_DATABASE_URI, help='SQLAlchemy database URI')
+def load_db(file_name, on_conflict, chunk_size, no_verify, database):
+   """
+   Loads fixtures/FILE_NAME (JSON file, .gz/.zst or ndjson directory of dump_db.py) into the database
+   """
    file_name = BASE_DIR / "fixtures" / file_name
-   engine = create_engine(path_to_db)
-   meta = MetaData(bind=engine)
-   DBSession = sessionmaker(bind=engine)
-   session = DBSession()
-
-   with open(file_name, "r", encoding="UTF-8") as f:
-       data = json.load(f)
-       for table_name, values in data.items():
-           table = Table(table_name, meta, autoload=True)
-           query_insert = insert(table)
-           for value in values:
-                query_insert = query_insert.values(value)
-                try:
-                    session.execute(query_insert)
-                    session.commit()
-                except IntegrityError:
-                    pass
-
-
-load_db()
+   engine = create_engine(database)
+   started = time.perf_counter()
+   stats = load_fixture(engine, file_name, on_conflict, chunk_size, verify=not no_verify)
+   for table, (read, written, seconds) in stats.items():
+       print(f"{table}: {read} rows read, {written} written, {rows_per_second(read, seconds)} rows/s")
+   total = sum(read for read, _, _ in stats.values())
+   seconds = time.perf_counter() - started
+   print(f"Total: {total} rows in {seconds:.2f} s, {rows_per_second(total, seconds)} rows/s")
+
+
+if __name__ == '__main__':
+   load_db()
@@ -4,14 +4,20 @@ from config import Config
 from base64 import b64encode
 from api.models.user import UserModel
 import pytest
+from contextlib import contextmanager
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from utility.cache import clear_caches
 
 @pytest.fixture()
 def application():
     app.config.update({
-        'SQLALCHEMY_DATABASE_URI': Config.TEST_DATABASE
+        'SQLALCHEMY_DATABASE_URI': Config.TEST_DATABASE,
+        'RESPONSE_CACHE_BACKEND': 'memory',
+        'TAG_INDEX_BACKGROUND_LOAD': False,
     })
     db.create_all()
+    clear_caches()
     yield app
     db.drop_all()
 
@@ -35,3 +41,35 @@ def auth_headers(user_admin):
             f"{user_data['username']}:{user_data['password']}".encode('ascii')).decode('utf-8')
     }
     return headers
+
+
+@pytest.fixture()
+def sql_statements(application):
+    """
+    Collects (statement, parameters) of every SQL statement executed during the test.
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    engine = db.get_engine()
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    yield statements
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+@pytest.fixture()
+def query_count(sql_statements):
+    """
+    Context manager asserting that the block executes at most `limit` SQL statements:
+    with query_count(3): client.get(...)
+    """
+    @contextmanager
+    def guard(limit):
+        start = len(sql_statements)
+        yield
+        executed = [statement for statement, _ in sql_statements[start:]]
+        assert len(executed) <= limit, f"{len(executed)} statements executed, expected at most {limit}:\n" + \
+                                       "\n".join(executed)
+    return guard
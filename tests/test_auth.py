@@ -1,17 +1,66 @@
 import pytest
+from api import db
+from api.models.generation import CacheGenerationModel
 from api.models.user import UserModel
 from api.models.note import NoteModel
 from tests.init_test import client, user_admin, application, auth_headers
+from utility.auth_cache import credential_cache
+from config import Config
 
 
 def test_basic_auth(client, auth_headers, user_admin):
     response = client.get('/auth/token', headers=auth_headers)
     data = response.json
     assert response.status_code == 200
-    assert data["token"] == user_admin.generate_auth_token()
+    assert UserModel.verify_auth_token(data["token"]).id == user_admin.id
 
 
-@pytest.mark.skip(reason="test not implemented")
-def test_token_auth(client):
-    pass
-    # Пока отложим реализацию данного теста
+def test_basic_auth_cache(client, auth_headers, user_admin):
+    client.get('/auth/token', headers=auth_headers)
+    hits = credential_cache.hits
+    response = client.get('/auth/token', headers=auth_headers)
+    assert response.status_code == 200
+    assert credential_cache.hits == hits + 1
+
+
+def test_basic_auth_cache_invalidated_on_edit(client, auth_headers, user_admin):
+    response = client.put(f'/users/{user_admin.id}', json={"username": "root"}, headers=auth_headers)
+    assert response.status_code == 200
+    assert len(credential_cache) == 0
+    response = client.get('/auth/token', headers=auth_headers)
+    assert response.status_code == 401
+
+
+def test_auth_caches_invalidated_by_other_process(client, auth_headers, user_admin, monkeypatch):
+    monkeypatch.setattr(Config, "CACHE_SYNC_INTERVAL", 0)
+    user_id = user_admin.id
+    token = client.get('/auth/token', headers=auth_headers).json["token"]
+    assert client.get('/notes', headers={'Authorization': f'Bearer {token}'}).status_code == 200
+    # пользователя удалил другой процесс (flask worker), кеши этого процесса о нем не знают
+    db.session.execute(UserModel.__table__.delete().where(UserModel.id == user_id))
+    CacheGenerationModel.increment("users")
+    db.session.commit()
+    assert client.get('/auth/token', headers=auth_headers).status_code == 401
+    assert client.get('/notes', headers={'Authorization': f'Bearer {token}'}).status_code == 401
+
+
+def test_token_auth(client, auth_headers, user_admin):
+    token = client.get('/auth/token', headers=auth_headers).json["token"]
+    response = client.get('/notes', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200
+
+
+def test_token_revoke(client, auth_headers, user_admin):
+    token = client.get('/auth/token', headers=auth_headers).json["token"]
+    token_headers = {'Authorization': f'Bearer {token}'}
+    response = client.delete('/auth/token', headers=token_headers)
+    assert response.status_code == 204
+    response = client.get('/notes', headers=token_headers)
+    assert response.status_code == 401
+
+
+def test_token_expired(client, user_admin, monkeypatch):
+    token = user_admin.generate_auth_token()
+    monkeypatch.setattr(Config, "AUTH_TOKEN_EXPIRATION", -1)
+    response = client.get('/notes', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 401
@@ -0,0 +1,31 @@
+import json
+from tests.init_test import application
+from scripts.benchmark import run_benchmark, compare, EXCLUDED_ENDPOINTS
+from scripts.generate_data import seed_database
+
+
+def test_seed_is_reproducible(application):
+    with application.app_context():
+        first = seed_database(users=5, notes=200, tags=5, seed=1)
+        second = seed_database(users=5, notes=200, tags=5, seed=1)
+    assert first.note_authors == second.note_authors
+    assert first.private_notes == second.private_notes
+    # степенное распределение: у первого пользователя больше всего заметок
+    counts = [len(first.notes_of(user_id)) for user_id in first.usernames]
+    assert counts[0] == max(counts)
+
+
+def test_benchmark_covers_every_endpoint(application, tmp_path):
+    database_uri = application.config["SQLALCHEMY_DATABASE_URI"]
+    report = run_benchmark(tmp_path, users=5, notes=300, tags=5, requests=3, threads=2)
+    assert application.config["SQLALCHEMY_DATABASE_URI"] == database_uri
+    assert report["skipped"] == {}
+    endpoints = set(application.view_functions) - EXCLUDED_ENDPOINTS
+    for phase in ("test_client", "wsgi"):
+        results = report["phases"][phase]
+        assert set(results) == endpoints
+        for endpoint, result in results.items():
+            assert result["errors"] == 0, (phase, endpoint, result["statuses"])
+            assert result["p50_ms"] <= result["p95_ms"] <= result["p99_ms"]
+    json.dumps(report)
+    assert len(compare(report, report)) == 2 * len(endpoints)
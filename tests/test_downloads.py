@@ -0,0 +1,78 @@
+import gzip
+import hashlib
+import pytest
+from tests.init_test import client, application
+from tests.test_files import upload_folder, upload
+
+CONTENT = bytes(range(256)) * 20
+
+
+@pytest.fixture()
+def uploaded(client, upload_folder):
+    response = upload(client, CONTENT, "data.txt").json
+    return "/" + response["url"], response["name"]
+
+
+def test_range_request(client, uploaded):
+    url, _ = uploaded
+    response = client.get(url, headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.data == CONTENT[100:200]
+    assert response.headers["Content-Range"] == f"bytes 100-199/{len(CONTENT)}"
+    assert client.get(url, headers={"Range": f"bytes={len(CONTENT) + 1}-"}).status_code == 416
+
+
+def test_conditional_requests(client, uploaded):
+    url, name = uploaded
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.headers["Content-Disposition"].startswith("attachment")
+    # ETag - хеш содержимого, файл по этому адресу не меняется
+    assert response.get_etag() == (hashlib.sha256(CONTENT).hexdigest(), False)
+    assert "immutable" in response.headers["Cache-Control"]
+    assert client.get(url, headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+    assert client.get(url, headers={"If-Modified-Since": response.headers["Last-Modified"]}).status_code == 304
+    # If-Range с чужим ETag - весь файл
+    response = client.get(url, headers={"Range": "bytes=0-9", "If-Range": '"other"'})
+    assert response.status_code == 200
+    assert response.data == CONTENT
+
+
+def test_precompressed_copy(client, uploaded, upload_folder):
+    url, name = uploaded
+    path = next(upload_folder.rglob(name))
+    path.with_name(name + ".gz").write_bytes(gzip.compress(CONTENT))
+
+    response = client.get(url, headers={"Accept-Encoding": "gzip, deflate"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Content-Type"] == "text/plain; charset=utf-8"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert gzip.decompress(response.data) == CONTENT
+    assert response.get_etag()[0].endswith("-gzip")
+
+    response = client.get(url)
+    assert "Content-Encoding" not in response.headers
+    assert response.data == CONTENT
+
+
+@pytest.mark.parametrize("mode, header", [("x-accel-redirect", "X-Accel-Redirect"), ("x-sendfile", "X-Sendfile")])
+def test_offload_to_proxy(client, uploaded, application, monkeypatch, mode, header):
+    monkeypatch.setitem(application.config, "DOWNLOAD_OFFLOAD", mode)
+    url, name = uploaded
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.data == b""
+    assert response.headers[header].endswith(name)
+    if mode == "x-accel-redirect":
+        assert response.headers[header] == "/internal-upload" + url[len("/upload"):]
+    response = client.get(url, headers={"If-None-Match": response.headers["ETag"]})
+    assert response.status_code == 304
+    assert header not in response.headers
+
+
+def test_service_files_are_not_served(client, upload_folder):
+    (upload_folder / ".uploads").mkdir()
+    (upload_folder / ".uploads" / "secret.json").write_text("{}")
+    assert client.get("/upload/.uploads/secret.json").status_code == 404
+    assert client.get("/upload/../config.py").status_code == 404
+    assert client.get("/upload/missing.txt").status_code == 404
@@ -0,0 +1,79 @@
+import gzip
+import json
+import pytest
+from sqlalchemy import create_engine
+from api import db
+from api.models.note import NoteModel
+from api.models.tag import TagModel
+from api.models.user import UserModel
+from scripts.dump_db import dump_database, manifest_path
+from scripts.load_db import load_fixture
+
+TABLES = ["user_model", "note_model", "tag"]
+
+
+def make_engine(path):
+    engine = create_engine(f"sqlite:///{path}")
+    db.Model.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture()
+def source(tmp_path):
+    engine = make_engine(tmp_path / "source.db")
+    with engine.begin() as connection:
+        connection.execute(UserModel.__table__.insert(), [
+            {"id": i, "username": f"user{i}", "password_hash": "", "role": "simple_user"} for i in range(1, 4)])
+        connection.execute(NoteModel.__table__.insert(), [
+            {"id": i, "author_id": i % 3 + 1, "text": f"Заметка {i}", "private": bool(i % 2)} for i in range(1, 101)])
+        connection.execute(TagModel.__table__.insert(), [{"id": 1, "name": "work"}])
+    return engine
+
+
+def table_rows(engine, table):
+    # version заметок выставляют триггеры при вставке, в сравнении не участвует
+    columns = [column for column in table.columns if column.name != "version"]
+    with engine.connect() as connection:
+        return [tuple(row) for row in connection.execute(db.select(columns).order_by(table.c.id))]
+
+
+@pytest.mark.parametrize("file_format, compression, name", [
+    ("json", "none", "data.json"),
+    ("json", "gzip", "data.json"),
+    ("ndjson", "gzip", "dump"),
+])
+def test_dump_and_load(source, tmp_path, file_format, compression, name):
+    manifest = dump_database(source, tmp_path / name, TABLES, file_format, compression, jobs=2, chunk_size=7)
+    assert list(manifest["tables"]) == ["tag", "user_model", "note_model"]
+    assert manifest["tables"]["note_model"]["rows"] == 100
+    assert manifest_path(tmp_path / name).exists()
+
+    target = make_engine(tmp_path / "target.db")
+    path = tmp_path / manifest["tables"]["tag"]["file"] if file_format == "json" else tmp_path / name
+    stats = load_fixture(target, path)
+    assert stats["note_model"][1] == 100
+    for table in (UserModel.__table__, NoteModel.__table__, TagModel.__table__):
+        assert table_rows(target, table) == table_rows(source, table)
+
+
+def test_json_dump_is_compatible(source, tmp_path):
+    dump_database(source, tmp_path / "data.json", TABLES)
+    with open(tmp_path / "data.json", encoding="UTF-8") as f:
+        data = json.load(f)
+    assert data["note_model"][0]["text"] == "Заметка 1"
+    assert len(data["user_model"]) == 3
+
+
+def test_manifest_mismatch_rolls_back(source, tmp_path):
+    dump_database(source, tmp_path / "dump", TABLES, "ndjson", "gzip")
+    path = tmp_path / "dump" / "note_model.ndjson.gz"
+    with gzip.open(path, "rt", encoding="UTF-8") as f:
+        lines = f.readlines()
+    with gzip.open(path, "wt", encoding="UTF-8") as f:
+        f.writelines(lines[:-1])
+
+    target = make_engine(tmp_path / "target.db")
+    with pytest.raises(ValueError, match="note_model"):
+        load_fixture(target, tmp_path / "dump")
+    assert table_rows(target, UserModel.__table__) == []
+    assert load_fixture(target, tmp_path / "dump", verify=False)["note_model"][1] == 99
@@ -0,0 +1,78 @@
+import hashlib
+import io
+import pytest
+from base64 import b64encode
+from api.models.file import StoredFileModel
+from api.models.user import UserModel
+from tests.init_test import client, application, auth_headers, user_admin
+from utility.storage import storage
+
+
+@pytest.fixture()
+def upload_folder(application, tmp_path, monkeypatch):
+    monkeypatch.setitem(application.config, "UPLOAD_FOLDER", tmp_path)
+    monkeypatch.setitem(application.config, "UPLOAD_CHUNK_SIZE", 1000)
+    return tmp_path
+
+
+def upload(client, content, filename, headers=None):
+    return client.put('/files/upload', data={"image": (io.BytesIO(content), filename)}, headers=headers)
+
+
+def test_upload_is_content_addressed(client, upload_folder):
+    content = b"\x89PNG" + bytes(range(256)) * 40
+    digest = hashlib.sha256(content).hexdigest()
+    response = upload(client, content, "photo.PNG")
+    assert response.status_code == 200
+    assert response.json["url"] == f"upload/{digest[:2]}/{digest[2:4]}/{digest}.png"
+    assert response.json["size"] == len(content)
+    assert (upload_folder / digest[:2] / digest[2:4] / f"{digest}.png").read_bytes() == content
+    assert client.get("/" + response.json["url"]).data == content
+
+    # тот же файл под другим именем не копируется
+    assert upload(client, content, "copy.png").json["url"] == response.json["url"]
+    assert StoredFileModel.query.get(f"{digest}.png").ref_count == 2
+    assert len([path for path in upload_folder.rglob("*") if path.is_file()]) == 1
+
+
+def test_same_name_does_not_overwrite(client, upload_folder):
+    first = upload(client, b"first", "image.jpg").json["url"]
+    second = upload(client, b"second", "image.jpg").json["url"]
+    assert first != second
+    assert client.get("/" + first).data == b"first"
+
+
+def test_release(client, auth_headers, upload_folder):
+    name = upload(client, b"content", "a.txt", auth_headers).json["name"]
+    upload(client, b"content", "b.txt", auth_headers)
+    assert client.delete(f'/files/{name}').status_code == 401
+    assert client.delete(f'/files/{name}', headers=auth_headers).status_code == 204
+    assert storage.path(name).exists()
+    assert client.delete(f'/files/{name}', headers=auth_headers).status_code == 204
+    assert not storage.path(name).exists()
+    assert StoredFileModel.query.get(name) is None
+    assert client.delete(f'/files/{name}', headers=auth_headers).status_code == 404
+
+
+def test_release_only_own_uploads(client, auth_headers, upload_folder):
+    UserModel(username="other", password="1234").save()
+    other_headers = {"Authorization": "Basic " + b64encode(b"other:1234").decode("ascii")}
+    name = upload(client, b"content", "a.txt", auth_headers).json["name"]
+    upload(client, b"content", "b.txt")
+    assert client.delete(f'/files/{name}', headers=other_headers).status_code == 404
+    assert client.delete(f'/files/{name}', headers=auth_headers).status_code == 204
+    # анонимную загрузку освободить некому
+    assert client.delete(f'/files/{name}', headers=auth_headers).status_code == 404
+    assert StoredFileModel.query.get(name).ref_count == 1
+    assert storage.path(name).exists()
+
+
+def test_failed_upload_leaves_no_temp_files(application, upload_folder):
+    class BrokenStream:
+        def read(self, size):
+            raise IOError("connection reset")
+
+    with application.test_request_context():
+        with pytest.raises(IOError):
+            storage.save(BrokenStream(), "broken.bin")
+    assert list((upload_folder / ".tmp").iterdir()) == []
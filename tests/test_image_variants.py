@@ -0,0 +1,66 @@
+import io
+import time
+import pytest
+from tests.init_test import client, application, auth_headers, user_admin
+from tests.test_files import upload_folder, upload
+from utility import image_variants as variants_module
+from utility.imaging import available
+from utility.storage import storage
+
+# без Pillow фикстуры тестов с изображениями не создаются
+needs_pillow = pytest.mark.skipif(not available(), reason="Pillow is not installed")
+
+
+def png(width, height):
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 30)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def image_size(data):
+    from PIL import Image
+    return Image.open(io.BytesIO(data)).size
+
+
+def test_original_until_variant_is_ready(client, upload_folder, monkeypatch):
+    monkeypatch.setattr(variants_module, "available", lambda: True)
+    monkeypatch.setattr(variants_module.image_variants, "schedule", lambda name: None)
+    response = upload(client, b"original", "photo.png").json
+    url = "/" + response["url"]
+
+    pending = client.get(url + "?variant=thumbnail")
+    assert pending.data == b"original"
+    assert "immutable" not in pending.headers["Cache-Control"]
+
+    storage.path(response["name"] + ".thumbnail").write_bytes(b"small")
+    ready = client.get(url + "?variant=thumbnail")
+    assert ready.data == b"small"
+    assert ready.get_etag()[0].endswith("-thumbnail")
+    assert "immutable" in ready.headers["Cache-Control"]
+    assert client.get(url + "?variant=huge").status_code == 422
+
+
+@needs_pillow
+def test_variants_created_on_upload(client, auth_headers, application, upload_folder, monkeypatch):
+    monkeypatch.setitem(application.config, "IMAGE_VARIANT_WORKERS", 0)
+    response = upload(client, png(2000, 1000), "photo.png", headers=auth_headers).json
+    url = "/" + response["url"]
+    assert image_size(client.get(url + "?variant=thumbnail").data) == (256, 128)
+    assert image_size(client.get(url + "?variant=medium").data) == (1280, 640)
+    assert image_size(client.get(url).data) == (2000, 1000)
+
+    # копии удаляются вместе с файлом
+    assert client.delete(f'/files/{response["name"]}', headers=auth_headers).status_code == 204
+    assert [path for path in upload_folder.rglob("*") if path.is_file()] == []
+
+
+@needs_pillow
+def test_variants_in_process_pool(client, application, upload_folder, monkeypatch):
+    monkeypatch.setitem(application.config, "IMAGE_VARIANT_WORKERS", 1)
+    name = upload(client, png(600, 600), "photo.png").json["name"]
+    path = storage.path(name + ".thumbnail")
+    deadline = time.monotonic() + 30
+    while not path.exists() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert image_size(path.read_bytes()) == (256, 256)
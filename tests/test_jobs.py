@@ -0,0 +1,120 @@
+import threading
+import pytest
+from base64 import b64encode
+from api import db
+from api.models.job import JobModel
+from api.models.note import NoteModel
+from api.models.user import UserModel
+from tests.init_test import client, application, auth_headers, user_admin
+from utility.cache import clear_caches
+from utility.jobs import job_queue
+
+
+@pytest.fixture()
+def failing_task():
+    calls = []
+
+    @job_queue.task("flaky")
+    def flaky(job, fail_times):
+        calls.append(job.attempts)
+        if len(calls) <= fail_times:
+            raise RuntimeError("temporary error")
+
+    return calls
+
+
+def test_delete_user_cascade(client, auth_headers, application, monkeypatch):
+    monkeypatch.setitem(application.config, "JOB_CHUNK_SIZE", 2)
+    user = UserModel(username="author", password="secret")
+    user.save()
+    user_id = user.id
+    for i in range(5):
+        NoteModel(author_id=user_id, text=f"note {i}").save()
+
+    response = client.delete(f'/users/{user_id}', headers=auth_headers)
+    assert response.status_code == 202
+    # повторный запрос не создает вторую задачу
+    assert client.delete(f'/users/{user_id}', headers=auth_headers).json["id"] == response.json["id"]
+    assert client.get(f'/users/{user_id}').status_code == 200
+
+    job_queue.work(burst=True)
+    job = client.get(response.headers["Location"], headers=auth_headers).json
+    assert (job["status"], job["progress"], job["total"]) == ("done", 5, 5)
+    assert client.get(f'/users/{user_id}').status_code == 404
+    assert NoteModel.query.filter_by(author_id=user_id).count() == 0
+
+
+def test_job_visible_to_owner_only(client, auth_headers, user_admin):
+    user = UserModel(username="author", password="secret")
+    user.save()
+    location = client.delete(f'/users/{user.id}', headers=auth_headers).headers["Location"]
+    assert client.get(location).status_code == 401
+    other = UserModel(username="other", password="secret")
+    other.save()
+    other_headers = {"Authorization": "Basic " + b64encode(b"other:secret").decode("ascii")}
+    assert client.get(location, headers=other_headers).status_code == 403
+    assert client.get(location, headers=auth_headers).status_code == 200
+
+
+def test_retry_with_backoff(application, failing_task, monkeypatch):
+    monkeypatch.setitem(application.config, "JOB_MAX_ATTEMPTS", 3)
+    job_id = job_queue.enqueue("flaky", fail_times=1).id
+    job_queue.work(burst=True)
+    job = JobModel.query.get(job_id)
+    # повтор отложен
+    assert (job.status, job.attempts) == ("queued", 1)
+    assert 5 <= job.run_at - job.created_at <= 10 + 1
+    assert "temporary error" in job.error
+
+    assert job_queue.run(job_queue.claim(now=job.run_at)) == "done"
+    assert failing_task == [1, 2]
+
+
+def test_failed_after_max_attempts(application, failing_task, monkeypatch):
+    monkeypatch.setitem(application.config, "JOB_MAX_ATTEMPTS", 2)
+    monkeypatch.setitem(application.config, "JOB_RETRY_DELAY", 0)
+    job_id = job_queue.enqueue("flaky", key="flaky:1", fail_times=5).id
+    job_queue.work(burst=True)
+    assert JobModel.query.get(job_id).status == "failed"
+    assert failing_task == [1, 2]
+    # завершенная задача с тем же ключом ставится заново
+    assert job_queue.enqueue("flaky", key="flaky:1", fail_times=0).id == job_id
+    job_queue.work(burst=True)
+    assert JobModel.query.get(job_id).status == "done"
+
+
+def test_expired_lease_is_claimed_again(application):
+    job = job_queue.enqueue("delete_tag", tag_id=1)
+    claimed = job_queue.claim()
+    assert claimed.id == job.id
+    assert job_queue.claim() is None
+    # обработчик завис или упал
+    assert job_queue.claim(now=claimed.locked_until + 1).id == job.id
+
+
+@pytest.fixture()
+def file_database(application, tmp_path, monkeypatch):
+    # несколько потоков - нужна БД в файле, а не общее соединение с :memory:
+    db.session.remove()  # сессия не должна остаться в транзакции на прежнем соединении
+    monkeypatch.setitem(application.config, "SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'jobs.db'}")
+    db.create_all()
+    yield application
+    db.drop_all()
+    db.session.remove()
+    clear_caches()
+
+
+def test_threads_run_each_job_once(file_database):
+    runs = []
+    lock = threading.Lock()
+
+    @job_queue.task("count")
+    def count(job, number):
+        with lock:
+            runs.append(number)
+
+    for number in range(30):
+        job_queue.enqueue("count", number=number)
+    job_queue.work(threads=4, burst=True)
+    assert sorted(runs) == list(range(30))
+    assert JobModel.query.filter_by(status="done").count() == 30
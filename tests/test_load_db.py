@@ -0,0 +1,67 @@
+import io
+import json
+import pytest
+from sqlalchemy import create_engine
+from api import db
+from api.models.note import NoteModel
+from api.models.tag import TagModel
+from api.models.user import UserModel
+from scripts.load_db import FixtureReader, load_fixture
+
+
+@pytest.fixture()
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'load.db'}")
+    db.Model.metadata.create_all(engine)
+    return engine
+
+
+def write_fixture(path, data):
+    with open(path, "w", encoding="UTF-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+    return path
+
+
+def test_reader_is_incremental():
+    data = {"tag": [{"id": 1, "name": "тег"}, {"id": 2, "name": "x" * 100}], "empty": [], "note_model": [{"id": 12345}]}
+    # буфер меньше одной строки: значения собираются из нескольких чтений
+    reader = FixtureReader(io.StringIO(json.dumps(data, ensure_ascii=False, indent=4)), read_size=7)
+    assert [(name, list(rows)) for name, rows in reader.tables()] == list(data.items())
+    assert list(FixtureReader(io.StringIO("{}")).tables()) == []
+    with pytest.raises(ValueError):
+        [list(rows) for _, rows in FixtureReader(io.StringIO('{"tag": [{"id": 1} {"id": 2}]}')).tables()]
+
+
+def test_load_in_foreign_key_order(engine, tmp_path):
+    # заметки в файле раньше авторов
+    path = write_fixture(tmp_path / "data.json", {
+        "note_model": [{"id": i, "author_id": i % 3 + 1, "text": f"note {i}", "private": False, "deleted": False}
+                       for i in range(1, 11)],
+        "user_model": [{"id": i, "username": f"user{i}", "password_hash": "", "role": "simple_user"}
+                       for i in range(1, 4)],
+    })
+    stats = load_fixture(engine, path, chunk_size=4)
+    assert stats["user_model"][:2] == [3, 3]
+    assert stats["note_model"][:2] == [10, 10]
+    assert list(stats) == ["user_model", "note_model"]
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("SELECT count(*) FROM note_model").scalar() == 10
+        # прагмы загрузки сняты
+        assert connection.exec_driver_sql("PRAGMA synchronous").scalar() == 2
+
+
+def test_conflicts(engine, tmp_path):
+    rows = [{"id": 1, "name": "work"}, {"id": 2, "name": "home"}]
+    load_fixture(engine, write_fixture(tmp_path / "tags.json", {"tag": rows}))
+    changed = write_fixture(tmp_path / "changed.json", {"tag": [{"id": 1, "name": "job"}, {"id": 3, "name": "new"}]})
+
+    assert load_fixture(engine, changed, on_conflict="skip")["tag"][:2] == [2, 1]
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("SELECT name FROM tag ORDER BY id").scalars().all() == ["work", "home", "new"]
+
+    load_fixture(engine, changed, on_conflict="update")
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("SELECT name FROM tag ORDER BY id").scalars().all() == ["job", "home", "new"]
+
+    with pytest.raises(Exception):
+        load_fixture(engine, changed, on_conflict="error")
@@ -0,0 +1,109 @@
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import pytest
+from tests.init_test import client, application, auth_headers, user_admin
+from utility.metrics import metrics
+
+
+def read_metrics(client):
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain; version=0.0.4")
+    samples = {}
+    for line in response.get_data(as_text=True).splitlines():
+        if not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_request_metrics(client, auth_headers):
+    before = read_metrics(client)
+    client.get('/notes', headers=auth_headers)
+    client.get('/notes', headers=auth_headers)
+    client.get('/notes?stream=true', headers=auth_headers).get_data()
+    samples = read_metrics(client)
+
+    def delta(name):
+        return samples.get(name, 0) - before.get(name, 0)
+
+    assert delta('http_requests_total{endpoint="get_notes",method="GET",status="200"}') == 3
+    assert delta('http_request_duration_seconds_count{endpoint="get_notes"}') == 3
+    assert delta('http_request_duration_seconds_bucket{endpoint="get_notes",le="+Inf"}') == 3
+    # размер потокового ответа тоже учитывается
+    assert delta('http_response_size_bytes_sum{endpoint="get_notes"}') >= 3 * len('{"items": [], "next_cursor": null}')
+    assert delta('db_statements_per_request_sum{endpoint="get_notes"}') > 0
+    assert delta('auth_duration_seconds_count{method="basic",path="hash"}') == 1
+    assert delta('auth_duration_seconds_count{method="basic",path="cached"}') == 2
+
+
+def test_token_auth_and_cache_metrics(client, auth_headers):
+    token = client.get('/auth/token', headers=auth_headers).json["token"]
+    before = read_metrics(client)
+    client.get('/notes', headers={"Authorization": f"Bearer {token}"})
+    client.get('/notes', headers={"Authorization": "Bearer invalid"})
+    client.get('/tags')
+    client.get('/tags')
+    samples = read_metrics(client)
+    assert samples['auth_duration_seconds_count{method="token",path="valid"}'] - \
+           before.get('auth_duration_seconds_count{method="token",path="valid"}', 0) == 1
+    assert samples['auth_duration_seconds_count{method="token",path="failed"}'] - \
+           before.get('auth_duration_seconds_count{method="token",path="failed"}', 0) == 1
+    assert samples['cache_hits_total{cache="responses"}'] - before.get('cache_hits_total{cache="responses"}', 0) == 1
+    assert 'cache_hits_total{cache="credentials"}' in samples
+
+
+def test_histogram_buckets_are_cumulative(client):
+    client.get('/tags')
+    text = client.get('/metrics').get_data(as_text=True)
+    counts = [float(value) for value in
+              re.findall(r'^http_request_duration_seconds_bucket\{endpoint="get_tags",le="[^"]+"\} (\S+)$', text, re.M)]
+    assert counts == sorted(counts)
+    assert counts[-1] == float(re.search(r'^http_request_duration_seconds_count\{endpoint="get_tags"\} (\S+)$',
+                                         text, re.M).group(1))
+
+
+def test_multiprocess_metrics_are_summed(client, tmp_path, monkeypatch):
+    # файл метрик другого процесса gunicorn
+    other = [["http_requests_total", [["endpoint", "get_tags"], ["method", "GET"], ["status", "200"]], 5]]
+    (tmp_path / f"{os.getppid()}-1.json").write_text(json.dumps(other))
+    monkeypatch.setattr(metrics, "directory", str(tmp_path))
+    client.get('/tags')
+    samples = read_metrics(client)
+    own = metrics.snapshot()[("http_requests_total", (("endpoint", "get_tags"), ("method", "GET"), ("status", "200")))]
+    assert samples['http_requests_total{endpoint="get_tags",method="GET",status="200"}'] == own + 5
+    assert (tmp_path / f"{os.getppid()}-1.json").exists()
+    assert any(path.name.startswith(f"{os.getpid()}-") for path in tmp_path.glob("*.json"))
+
+
+def test_dead_process_metrics_keep_counters_only(client, tmp_path, monkeypatch):
+    # файл процесса gunicorn, который уже завершился
+    dead = subprocess.Popen([sys.executable, "-c", ""])
+    dead.wait()
+    other = [["http_requests_total", [["endpoint", "get_tags"], ["method", "GET"], ["status", "200"]], 5],
+             ["cache_entries", [["cache", "users"]], 7]]
+    (tmp_path / f"{dead.pid}-1.json").write_text(json.dumps(other))
+    monkeypatch.setattr(metrics, "directory", str(tmp_path))
+    client.get('/tags')
+    own = metrics.snapshot()
+    for _ in range(2):
+        samples = read_metrics(client)
+        key = ("http_requests_total", (("endpoint", "get_tags"), ("method", "GET"), ("status", "200")))
+        assert samples['http_requests_total{endpoint="get_tags",method="GET",status="200"}'] == own[key] + 5
+        assert samples['cache_entries{cache="users"}'] == own[("cache_entries", (("cache", "users"),))]
+    assert not (tmp_path / f"{dead.pid}-1.json").exists()
+
+
+def test_finished_thread_metrics_are_folded():
+    key = ("jobs_total", (("kind", "test"), ("status", "done")))
+    before = metrics.snapshot().get(key, 0)
+    for _ in range(10):
+        thread = threading.Thread(target=metrics.inc, args=("jobs_total",), kwargs={"kind": "test", "status": "done"})
+        thread.start()
+        thread.join()
+    assert metrics.snapshot()[key] == before + 10
+    assert all(thread.is_alive() for thread, _ in metrics._shards)
@@ -1,7 +1,10 @@
+import json
 import pytest
 from api.models.user import UserModel
 from api.models.note import NoteModel
+from api.models.tag import TagModel
 from tests.init_test import client, application, auth_headers
+from config import Config
 
 
 @pytest.fixture()
@@ -79,3 +82,207 @@ def test_note_edit(client, note_admin, auth_headers):
 def test_note_delete(client, auth_headers):
     pass
     # TODO: реализуйте тест на удаление заметки и запустите его, убрав декоратор @pytest.mark.skip
+
+
+def test_public_notes_pagination(client, user):
+    for i in range(5):
+        NoteModel(author_id=user.id, text=f"Public note {i}", private=False).save()
+    texts = []
+    cursor = None
+    while True:
+        query = {"limit": 2}
+        if cursor:
+            query["cursor"] = cursor
+        response = client.get('/notes/public', query_string=query)
+        assert response.status_code == 200
+        assert len(response.json["items"]) <= 2
+        texts += [item["text"] for item in response.json["items"]]
+        cursor = response.json["next_cursor"]
+        if cursor is None:
+            break
+    assert texts == [f"Public note {i}" for i in range(5)]
+
+
+def test_notes_pagination_invalid_cursor(client, auth_headers):
+    response = client.get('/notes', query_string={"cursor": "garbage"}, headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_notes_ordered_by_importance(client, user_admin, auth_headers):
+    for importance in (1, 3, 2):
+        NoteModel(author_id=user_admin.id, text=f"Importance {importance}", importance=importance).save()
+    response = client.get('/notes', query_string={"limit": 2}, headers=auth_headers)
+    assert [item["importance"] for item in response.json["items"]] == [3, 2]
+    response = client.get('/notes', query_string={"cursor": response.json["next_cursor"]}, headers=auth_headers)
+    assert [item["importance"] for item in response.json["items"]] == [1]
+    assert response.json["next_cursor"] is None
+
+
+def test_notes_merge_own_and_public_notes(client, user, user_admin, auth_headers):
+    for importance in (1, 3, 2):
+        NoteModel(author_id=user_admin.id, text=f"Own {importance}", importance=importance).save()
+        NoteModel(author_id=user.id, text=f"Public {importance}", importance=importance, private=False).save()
+        NoteModel(author_id=user.id, text=f"Private {importance}", importance=importance).save()
+    texts = []
+    cursor = None
+    while True:
+        query = {"limit": 4} if cursor is None else {"limit": 4, "cursor": cursor}
+        response = client.get('/notes', query_string=query, headers=auth_headers)
+        texts += [item["text"] for item in response.json["items"]]
+        cursor = response.json["next_cursor"]
+        if cursor is None:
+            break
+    # при равной важности первой идет более новая заметка
+    assert texts == ["Public 3", "Own 3", "Public 2", "Own 2", "Public 1", "Own 1"]
+    response = client.get('/notes', query_string={"stream": "true"}, headers=auth_headers)
+    assert [item["text"] for item in response.json["items"]] == texts
+
+
+def test_public_notes_stream_json(client, user):
+    for i in range(3):
+        NoteModel(author_id=user.id, text=f"Public note {i}", private=False).save()
+    response = client.get('/notes/public', query_string={"stream": "true", "limit": 2})
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert [item["text"] for item in response.json["items"]] == ["Public note 0", "Public note 1"]
+    assert response.json["next_cursor"] is not None
+
+
+def test_public_notes_stream_ndjson(client, user):
+    for i in range(3):
+        NoteModel(author_id=user.id, text=f"Public note {i}", private=False).save()
+    response = client.get('/notes/public', headers={"Accept": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [line["text"] for line in lines] == [f"Public note {i}" for i in range(3)]
+
+
+def test_note_search(client, user, user_admin, auth_headers):
+    NoteModel(author_id=user_admin.id, text="Buy green apples").save()
+    NoteModel(author_id=user.id, text="Apples are public", private=False).save()
+    NoteModel(author_id=user.id, text="Private apples of testuser").save()
+    NoteModel(author_id=user_admin.id, text="Archived apples", deleted=True).save()
+    NoteModel(author_id=user_admin.id, text="Nothing here").save()
+    response = client.get('/notes/search', query_string={"q": "apples"}, headers=auth_headers)
+    assert response.status_code == 200
+    assert sorted(item["note"]["text"] for item in response.json) == ["Apples are public", "Buy green apples"]
+    assert all("[" in item["snippet"] for item in response.json)
+
+
+def test_note_search_follows_edits(client, note_admin, auth_headers):
+    note_admin.text = "Renamed note"
+    note_admin.save()
+    note_id = note_admin.id
+    response = client.get('/notes/search', query_string={"q": "quote"}, headers=auth_headers)
+    assert response.json == []
+    response = client.get('/notes/search', query_string={"q": 'renamed "note'}, headers=auth_headers)
+    assert [item["note"]["id"] for item in response.json] == [note_id]
+
+
+def test_note_search_without_words(client, note_admin, auth_headers):
+    response = client.get('/notes/search', query_string={"q": " \t "}, headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_note_get_private_of_other_user(client, note, auth_headers):
+    response = client.get(f'/notes/{note.id}', headers=auth_headers)
+    assert response.status_code == 403
+
+
+def test_note_get_public_of_other_user(client, user, auth_headers):
+    note = NoteModel(author_id=user.id, text="Public quote", private=False)
+    note.save()
+    response = client.get(f'/notes/{note.id}', headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json["text"] == "Public quote"
+
+
+def test_note_edit_of_other_user(client, note, auth_headers):
+    response = client.put(f'/notes/{note.id}', json={"text": "Hacked"}, headers=auth_headers)
+    assert response.status_code == 403
+
+
+def test_note_archive_and_restore(client, note_admin, auth_headers):
+    note_id = note_admin.id
+    response = client.delete(f'/notes/{note_id}', headers=auth_headers)
+    assert response.status_code == 204
+    response = client.get(f'/notes/{note_id}', headers=auth_headers)
+    assert response.status_code == 404
+    response = client.put(f'/notes/{note_id}/restore', headers=auth_headers)
+    assert response.status_code == 200
+    response = client.get(f'/notes/{note_id}', headers=auth_headers)
+    assert response.status_code == 200
+
+
+def test_notes_batch_create(client, auth_headers):
+    notes = [{"text": "First"}, {"private": False}, {"text": "Third", "private": False}]
+    response = client.post('/notes/batch', json={"notes": notes}, headers=auth_headers)
+    assert response.status_code == 200
+    assert [item["status"] for item in response.json] == [201, 400, 201]
+    ids = [item["id"] for item in response.json if item["status"] == 201]
+    assert [NoteModel.query.get(note_id).text for note_id in ids] == ["First", "Third"]
+
+
+def test_notes_batch_edit(client, note, note_admin, auth_headers):
+    notes = [{"id": note_admin.id, "text": "Edited", "private": False},
+             {"id": note.id, "text": "Not mine"},
+             {"id": 100, "text": "Missing"}]
+    response = client.put('/notes/batch', json={"notes": notes}, headers=auth_headers)
+    assert response.status_code == 200
+    assert [item["status"] for item in response.json] == [200, 403, 404]
+    edited = NoteModel.query.get(notes[0]["id"])
+    assert edited.text == "Edited" and edited.private is False
+
+
+def test_notes_batch_archive(client, note, note_admin, auth_headers):
+    note_ids = [note_admin.id, note.id]
+    response = client.delete('/notes/batch', json={"notes": note_ids}, headers=auth_headers)
+    assert response.status_code == 200
+    assert [item["status"] for item in response.json] == [204, 403]
+    assert [NoteModel.query.get(note_id).deleted for note_id in note_ids] == [True, False]
+
+
+def test_notes_batch_max_size(client, auth_headers):
+    notes = [{"text": "Note"}] * (Config.NOTES_BATCH_MAX_SIZE + 1)
+    response = client.post('/notes/batch', json={"notes": notes}, headers=auth_headers)
+    assert response.status_code == 422
+
+
+def test_notes_etag(client, note_admin, auth_headers):
+    response = client.get('/notes', headers=auth_headers)
+    etag = response.headers["ETag"]
+    response = client.get('/notes', headers=dict(auth_headers, **{"If-None-Match": etag}))
+    assert response.status_code == 304
+    client.put(f'/notes/{note_admin.id}', json={"text": "Edited"}, headers=auth_headers)
+    response = client.get('/notes', headers=dict(auth_headers, **{"If-None-Match": etag}))
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_notes_etag_depends_on_page_only(client, auth_headers):
+    first = client.post('/notes', json={"text": "First"}, headers=auth_headers).json["id"]
+    client.post('/notes', json={"text": "Second"}, headers=auth_headers)
+    third = client.post('/notes', json={"text": "Third"}, headers=auth_headers).json["id"]
+    response = client.get('/notes', query_string={"limit": 1}, headers=auth_headers)
+    assert [item["id"] for item in response.json["items"]] == [third]
+    headers = dict(auth_headers, **{"If-None-Match": response.headers["ETag"]})
+    # ETag считается по странице и следующей за ней заметке (она определяет next_cursor)
+    client.put(f'/notes/{first}', json={"text": "Edited"}, headers=auth_headers)
+    assert client.get('/notes', query_string={"limit": 1}, headers=headers).status_code == 304
+    client.put(f'/notes/{third}', json={"text": "Edited"}, headers=auth_headers)
+    assert client.get('/notes', query_string={"limit": 1}, headers=headers).status_code == 200
+
+
+def test_note_etag_changes_with_tags(client, note_admin, auth_headers):
+    note_id = note_admin.id
+    tag = TagModel(name="work")
+    tag.save()
+    tag_id = tag.id
+    etag = client.get(f'/notes/{note_id}', headers=auth_headers).headers["ETag"]
+    response = client.get(f'/notes/{note_id}', headers=dict(auth_headers, **{"If-None-Match": etag}))
+    assert response.status_code == 304
+    client.put(f'/notes/{note_id}/tags', json={"tags": [tag_id]}, headers=auth_headers)
+    response = client.get(f'/notes/{note_id}', headers=dict(auth_headers, **{"If-None-Match": etag}))
+    assert response.status_code == 200
+    assert response.json["tags"] == [{"id": tag_id, "name": "work"}]
@@ -0,0 +1,75 @@
+import pytest
+from api import db
+from api.models.user import UserModel
+from api.models.note import NoteModel
+from api.models.tag import TagModel
+from config import Config
+from tests.init_test import client, application, auth_headers, user_admin, sql_statements, query_count
+
+# Число запросов к БД на один запрос к API не должно зависеть от числа заметок в ответе.
+# Авторизация идет через кеш (первый запрос теста прогревает его), ответы анонимных запросов не кешируются.
+ENDPOINTS = [
+    # etag по строкам страницы (агрегат), страница с автором (JOIN), теги всех заметок страницы (SELECT ... IN)
+    ("/notes/public", False, 3),
+    ("/notes/filter/user?username=testuser", False, 3),
+    # свои и чужие публичные заметки читаются отдельно: по два запроса на каждую часть
+    ("/notes", True, 5),
+    ("/notes/deleted", True, 5),
+    # etag потока по всей выборке
+    ("/notes?stream=true", True, 5),
+    # + поиск тега по имени, для индекса тегов - еще id заметок страницы
+    ("/notes/filter/tag?name=work", True, 5),
+    ("/notes/filter/tag?name=work&stream=true", True, 4),
+    # + поиск пользователя по id
+    ("/users/{user_id}/notes/", False, 4),
+    # поиск без etag: результаты с автором, теги
+    ("/notes/search?q=note", True, 2),
+]
+
+
+@pytest.fixture(params=[2, 40], ids=["few", "many"])
+def notes(request, application, user_admin):
+    user = UserModel(username="testuser", password="1234")
+    user.save()
+    # у каждой заметки свой автор: ленивая загрузка авторов дала бы запрос на каждую заметку
+    db.session.bulk_insert_mappings(UserModel, [{"username": f"author{i}", "password_hash": ""}
+                                                for i in range(request.param)])
+    authors = [user.id] + [author.id for author in UserModel.query.filter(UserModel.username.like("author%"))]
+    tags = [TagModel(name="work"), TagModel(name="home")]
+    for i, author_id in enumerate(authors):
+        for deleted in (False, True):
+            db.session.add(NoteModel(author_id=author_id, text=f"note {i}", private=False, deleted=deleted, tags=tags))
+    db.session.add(NoteModel(author_id=user_admin.id, text="note admin", private=False, tags=tags))
+    db.session.add(NoteModel(author_id=user_admin.id, text="note admin", private=False, deleted=True, tags=tags))
+    db.session.commit()
+    return user.id
+
+
+@pytest.mark.parametrize("url, auth, limit", ENDPOINTS)
+def test_list_query_count(client, notes, auth_headers, query_count, monkeypatch, url, auth, limit):
+    monkeypatch.setitem(client.application.config, "RESPONSE_CACHE_ENABLED", False)
+    monkeypatch.setattr(Config, "CACHE_SYNC_INTERVAL", 3600)  # сверка кешей с БД - при прогреве
+    headers = auth_headers if auth else {}
+    url = url.format(user_id=notes)
+    client.get("/notes/filter/tag?name=work&limit=1", headers=auth_headers)  # прогрев кеша авторизации и индекса тегов
+    with query_count(limit):
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200
+        assert response.get_data()
+
+
+@pytest.mark.parametrize("url, auth, limit", [
+    # ответ 304 - только агрегат по строкам страницы, сами заметки не загружаются
+    ("/notes", True, 1),
+    ("/notes/public", False, 1),
+    ("/notes/filter/tag?name=work", True, 3),
+])
+def test_not_modified_query_count(client, notes, auth_headers, query_count, monkeypatch, url, auth, limit):
+    monkeypatch.setitem(client.application.config, "RESPONSE_CACHE_ENABLED", False)
+    monkeypatch.setattr(Config, "CACHE_SYNC_INTERVAL", 3600)
+    headers = auth_headers if auth else {}
+    client.get("/notes/filter/tag?name=work&limit=1", headers=auth_headers)
+    etag = client.get(url, headers=headers).headers["ETag"]
+    with query_count(limit):
+        response = client.get(url, headers=dict(headers, **{"If-None-Match": etag}))
+        assert response.status_code == 304
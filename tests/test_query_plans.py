@@ -0,0 +1,72 @@
+import re
+import pytest
+from api import db
+from api.models.user import UserModel
+from api.models.note import NoteModel
+from api.models.tag import TagModel
+from tests.init_test import client, application, auth_headers, user_admin, sql_statements
+
+# Полный просмотр таблицы (или ее псевдонима tags_1) в выводе EXPLAIN QUERY PLAN: "SCAN note_model" без "USING ... INDEX"
+FULL_SCAN = re.compile(r"\bSCAN (note_model|tags|tag|user_model)(_\d+)?\b(?! USING (COVERING )?INDEX)")
+# Сортировка всей выборки перед LIMIT: страница списка должна читаться из индекса в нужном порядке
+TEMP_SORT = re.compile(r"\bUSE TEMP B-TREE FOR (.* )?ORDER BY\b")
+
+
+@pytest.fixture()
+def notes(user_admin):
+    user = UserModel(username="testuser", password="1234")
+    user.save()
+    tag = TagModel(name="work")
+    tag.save()
+    for i in range(10):
+        note = NoteModel(author_id=user.id if i % 2 else user_admin.id, text=f"note {i}",
+                         private=bool(i % 3), deleted=i == 9)
+        note.tags.append(tag)
+        note.save()
+    return user
+
+
+def query_plan(statement, parameters):
+    rows = db.session.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + statement, tuple(parameters))
+    return [row[-1] for row in rows]
+
+
+def assert_no_full_scans(statements, ordered=False):
+    """
+    Fails on a full scan in the plan of any SELECT, and with ordered=True also on a sort of the whole result.
+    """
+    selects = [(statement, parameters) for statement, parameters in statements if statement.lstrip().startswith("SELECT")]
+    assert selects
+    for statement, parameters in selects:
+        plan = query_plan(statement, parameters)
+        scans = [line for line in plan if FULL_SCAN.search(line) or (ordered and TEMP_SORT.search(line))]
+        assert not scans, f"full table scan or sort {scans} in:\n{statement}"
+
+
+@pytest.mark.parametrize("url, ordered", [
+    ("/notes", True),
+    ("/notes/public", True),
+    ("/notes/deleted", True),
+    ("/notes/filter/tag?name=work", True),
+    ("/notes/filter/user?username=testuser", True),
+    # результаты поиска сортируются по релевантности
+    ("/notes/search?q=note", False),
+    ("/notes/1", False),
+    ("/users/2/notes/", True),
+])
+def test_note_endpoint_uses_indexes(client, notes, auth_headers, sql_statements, url, ordered):
+    # сначала аутентифицируемся, чтобы в списке остались только запросы самого обработчика
+    client.get("/auth/token", headers=auth_headers)
+    sql_statements.clear()
+    response = client.get(url, headers=auth_headers)
+    assert response.status_code == 200
+    assert_no_full_scans(sql_statements, ordered)
+
+
+@pytest.mark.parametrize("url", ["/notes", "/notes/deleted"])
+def test_next_page_uses_indexes(client, notes, auth_headers, sql_statements, url):
+    cursor = client.get(url, query_string={"limit": 2}, headers=auth_headers).json["next_cursor"]
+    sql_statements.clear()
+    response = client.get(url, query_string={"limit": 2, "cursor": cursor}, headers=auth_headers)
+    assert response.status_code == 200
+    assert_no_full_scans(sql_statements, ordered=True)
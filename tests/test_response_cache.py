@@ -0,0 +1,158 @@
+import pytest
+from api.models.user import UserModel
+from api.models.note import NoteModel
+from api.models.tag import TagModel
+from tests.init_test import client, application, auth_headers, user_admin, sql_statements
+from utility.jobs import job_queue
+from utility.response_cache import response_cache, SQLiteBackend
+
+
+def test_tags_cached_until_tag_created(client, auth_headers):
+    TagModel(name="work").save()
+    response = client.get('/tags')
+    assert response.headers["X-Cache"] == "MISS"
+    response = client.get('/tags')
+    assert response.headers["X-Cache"] == "HIT"
+    assert [item["name"] for item in response.json] == ["work"]
+
+    client.post('/tags', json={"name": "home"}, headers=auth_headers)
+    response = client.get('/tags')
+    assert response.headers["X-Cache"] == "MISS"
+    assert [item["name"] for item in response.json] == ["work", "home"]
+
+
+def test_tags_invalidated_by_bulk_delete(client, auth_headers):
+    tag = TagModel(name="work")
+    tag.save()
+    tag_id = tag.id
+    client.get('/tags')
+    client.delete(f'/tags/{tag_id}', headers=auth_headers)
+    job_queue.work(burst=True)
+    response = client.get('/tags')
+    assert response.headers["X-Cache"] == "MISS"
+    assert response.json == []
+
+
+def test_cache_hit_skips_database(client, sql_statements):
+    client.get('/users')
+    sql_statements.clear()
+    response = client.get('/users')
+    assert response.headers["X-Cache"] == "HIT"
+    assert sql_statements == []
+
+
+def test_public_notes_invalidated_by_public_changes_only(client, user_admin, auth_headers):
+    client.get('/notes/public')
+    response = client.post('/notes', json={"text": "Private note"}, headers=auth_headers)
+    note_id = response.json["id"]
+    assert client.get('/notes/public').headers["X-Cache"] == "HIT"
+
+    client.put(f'/notes/{note_id}', json={"private": False}, headers=auth_headers)
+    response = client.get('/notes/public')
+    assert response.headers["X-Cache"] == "MISS"
+    assert [item["id"] for item in response.json["items"]] == [note_id]
+
+    client.delete(f'/notes/{note_id}', headers=auth_headers)
+    response = client.get('/notes/public')
+    assert response.headers["X-Cache"] == "MISS"
+    assert response.json["items"] == []
+
+
+def test_public_notes_invalidated_by_batch_endpoints(client, user_admin, auth_headers):
+    client.get('/notes/public')
+    response = client.post('/notes/batch', json={"notes": [{"text": "Public note", "private": False}]},
+                           headers=auth_headers)
+    note_id = response.json[0]["id"]
+    response = client.get('/notes/public')
+    assert response.headers["X-Cache"] == "MISS"
+    assert [item["text"] for item in response.json["items"]] == ["Public note"]
+
+    client.put('/notes/batch', json={"notes": [{"id": note_id, "text": "Edited"}]}, headers=auth_headers)
+    response = client.get('/notes/public')
+    assert response.headers["X-Cache"] == "MISS"
+    assert [item["text"] for item in response.json["items"]] == ["Edited"]
+
+    client.delete('/notes/batch', json={"notes": [note_id]}, headers=auth_headers)
+    response = client.get('/notes/public')
+    assert response.headers["X-Cache"] == "MISS"
+    assert response.json["items"] == []
+
+
+def test_user_by_id_invalidated_by_user_edit(client, user_admin, auth_headers):
+    user_id = user_admin.id
+    other = UserModel(username="other", password="1234")
+    other.save()
+    other_id = other.id
+    client.get(f'/users/{user_id}')
+    client.get(f'/users/{other_id}')
+    client.put(f'/users/{user_id}', json={"username": "root"}, headers=auth_headers)
+    response = client.get(f'/users/{user_id}')
+    assert response.headers["X-Cache"] == "MISS"
+    assert response.json["username"] == "root"
+    assert client.get(f'/users/{other_id}').headers["X-Cache"] == "HIT"
+
+
+def test_tag_rename_invalidates_notes(client, user_admin, auth_headers):
+    tag = TagModel(name="work")
+    tag.save()
+    tag_id = tag.id
+    note = NoteModel(author_id=user_admin.id, text="Public note", private=False)
+    note.save()
+    client.put(f'/notes/{note.id}/tags', json={"tags": [tag_id]}, headers=auth_headers)
+    client.get('/notes/public')
+    client.put(f'/tags/{tag_id}', json={"name": "job"}, headers=auth_headers)
+    response = client.get('/notes/public')
+    assert response.headers["X-Cache"] == "MISS"
+    assert response.json["items"][0]["tags"][0]["name"] == "job"
+
+
+def test_conditional_request_on_hit(client):
+    client.get('/notes/public')
+    response = client.get('/notes/public')
+    response = client.get('/notes/public', headers={"If-None-Match": response.headers["ETag"]})
+    assert response.status_code == 304
+    assert response.headers["X-Cache"] == "HIT"
+
+
+def test_authenticated_requests_bypass_cache(client, auth_headers):
+    client.get('/tags')
+    response = client.get('/tags', headers=auth_headers)
+    assert "X-Cache" not in response.headers
+
+
+def test_cache_stats(client):
+    before = response_cache.stats()
+    client.get('/tags')
+    response = client.get('/tags')
+    stats = response_cache.stats()
+    assert stats["misses"] == before["misses"] + 1
+    assert stats["hits"] == before["hits"] + 1
+    assert stats["bytes_served"] == before["bytes_served"] + len(response.data)
+
+
+def test_sqlite_backend_shared_between_workers(tmp_path):
+    path = tmp_path / "cache.db"
+    worker1, worker2 = SQLiteBackend(path, maxsize=2), SQLiteBackend(path, maxsize=2)
+    entry = (200, "application/json", "etag", b"[]")
+    assert worker1.set("/tags", entry, ["tags"], worker1.get_generation())
+    assert worker2.get("/tags") == entry
+
+    worker2.invalidate(["tags"])
+    assert worker1.get("/tags") is None
+
+
+def test_sqlite_backend_rejects_stale_entries(tmp_path):
+    backend = SQLiteBackend(tmp_path / "cache.db", maxsize=2)
+    entry = (200, "application/json", None, b"[]")
+    generation = backend.get_generation()
+    backend.invalidate(["tags"])  # запись изменилась, пока строился ответ
+    assert not backend.set("/tags", entry, ["tags"], generation)
+    assert backend.get("/tags") is None
+
+
+def test_sqlite_backend_evicts_oldest(tmp_path):
+    backend = SQLiteBackend(tmp_path / "cache.db", maxsize=2)
+    for key in ("a", "b", "c"):
+        backend.set(key, (200, "application/json", None, b"{}"), ["tags"], backend.get_generation())
+    assert backend.get("a") is None
+    assert backend.get("c") is not None
@@ -0,0 +1,87 @@
+import json
+import pytest
+from marshmallow import Schema, post_dump
+from api import ma
+from api.models.user import UserModel
+from api.models.note import NoteModel
+from api.models.tag import TagModel
+from api.schemas.note import (NoteSchema, NotePageSchema, NoteSearchResultSchema, NoteBatchResultSchema,
+                              note_schema, notes_schema)
+from api.schemas.user import user_schema
+from api.schemas.tag import tags_schema
+from tests.init_test import application, user_admin
+from utility.serializer import CompiledSchemaMixin, dumps
+
+
+@pytest.fixture()
+def notes(application, user_admin):
+    tags = [TagModel(name="work"), TagModel(name="home")]
+    notes = [NoteModel(author_id=user_admin.id, text="Public note", private=False, tags=tags),
+             NoteModel(author_id=user_admin.id, text="Private note", importance=5),
+             NoteModel(text="Note without author")]
+    for note in notes:
+        note.save()
+    return notes
+
+
+def marshmallow_dump(schema, obj, many=None):
+    return Schema.dump(schema, obj, many=many)
+
+
+def test_note_dump_equals_marshmallow(notes):
+    for note in notes:
+        assert note_schema.dump(note) == marshmallow_dump(note_schema, note)
+    assert notes_schema.dump(notes) == marshmallow_dump(notes_schema, notes)
+    assert note_schema.dump(notes[0])["tags"] == [{"id": 1, "name": "work"}, {"id": 2, "name": "home"}]
+    assert note_schema.dump(notes[2])["author"] is None
+
+
+def test_user_and_tag_dump_equals_marshmallow(notes):
+    user = UserModel.query.first()
+    # is_staff из Meta.fields у модели отсутствует и, как и в marshmallow, пропускается
+    assert user_schema.dump(user) == marshmallow_dump(user_schema, user) == \
+           {"id": user.id, "username": "admin", "role": "admin"}
+    tags = TagModel.query.all()
+    assert tags_schema.dump(tags) == marshmallow_dump(tags_schema, tags)
+
+
+def test_dict_dump_equals_marshmallow(notes):
+    page = {"items": notes, "next_cursor": None}
+    schema = NotePageSchema()
+    assert schema.dump(page) == marshmallow_dump(schema, page)
+
+    results = [{"note": notes[0], "snippet": "[Public] note", "rank": -1}]
+    schema = NoteSearchResultSchema(many=True)
+    assert schema.dump(results) == marshmallow_dump(schema, results)
+    assert isinstance(schema.dump(results)[0]["rank"], float)
+
+    results = [{"index": 0, "id": None, "status": 404, "error": "Not found"}, {"index": 1, "id": 1, "status": 200}]
+    schema = NoteBatchResultSchema(many=True)
+    assert schema.dump(results) == marshmallow_dump(schema, results)
+    assert "error" not in schema.dump(results)[1]
+
+
+def test_only_and_hooks(notes):
+    schema = NoteSchema(only=("id", "author.username"))
+    assert schema.dump(notes[0]) == marshmallow_dump(schema, notes[0]) == \
+           {"id": notes[0].id, "author": {"username": "admin"}}
+
+    class HookedSchema(CompiledSchemaMixin, ma.Schema):
+        text = ma.Str()
+
+        @post_dump
+        def upper(self, data, **kwargs):
+            return {"text": data["text"].upper()}
+
+    assert HookedSchema().dump(notes[0]) == {"text": "PUBLIC NOTE"}
+
+
+def test_response_matches_marshmallow(application, notes):
+    response = application.test_client().get('/notes/public')
+    expected = marshmallow_dump(NotePageSchema(), {"items": [notes[0]], "next_cursor": None})
+    assert response.json == expected
+
+
+def test_dumps():
+    data = {"text": "Заметка", "items": [1, 2.5, None, True]}
+    assert json.loads(dumps(data)) == data
@@ -0,0 +1,57 @@
+import threading
+from flask import Flask
+from sqlalchemy.pool import QueuePool, StaticPool
+from config import Config
+from utility.sqlite import SQLAlchemy, check_settings
+
+
+def make_db(uri, **config):
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config.update(SQLALCHEMY_DATABASE_URI=uri, **config)
+    return app, SQLAlchemy(app)
+
+
+def test_file_database_profile(tmp_path):
+    app, db = make_db(f"sqlite:///{tmp_path / 'profile.db'}")
+    with app.app_context():
+        assert isinstance(db.engine.pool, QueuePool)
+        assert db.engine.pool.size() == Config.SQLITE_POOL_SIZE
+        settings, mismatches = check_settings(db.engine)
+    assert mismatches == {}
+    assert settings["journal_mode"] == "wal"
+    assert settings["synchronous"] == "NORMAL"
+    assert settings["busy_timeout"] == Config.SQLITE_PRAGMAS["busy_timeout"]
+
+
+def test_readers_are_not_blocked_by_writer(tmp_path):
+    app, db = make_db(f"sqlite:///{tmp_path / 'wal.db'}")
+    with app.app_context():
+        engine = db.engine
+    with engine.begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE item (id INTEGER PRIMARY KEY)")
+        connection.exec_driver_sql("INSERT INTO item VALUES (1)")
+    with engine.connect() as writer:
+        transaction = writer.begin()
+        writer.exec_driver_sql("INSERT INTO item VALUES (2)")
+        # читатель из другого потока видит последнюю зафиксированную версию, не дожидаясь записи
+        counts = []
+        reader = threading.Thread(target=lambda: counts.append(
+            engine.connect().exec_driver_sql("SELECT count(*) FROM item").scalar()))
+        reader.start()
+        reader.join(timeout=2)
+        transaction.commit()
+    assert counts == [1]
+
+
+def test_mismatch_and_memory_database(tmp_path):
+    app, db = make_db("sqlite:///:memory:")
+    with app.app_context():
+        assert isinstance(db.engine.pool, StaticPool)
+        _, mismatches = check_settings(db.engine)
+    # БД в памяти не поддерживает WAL
+    assert mismatches["journal_mode"] == ("WAL", "memory")
+
+    app, db = make_db(f"sqlite:///{tmp_path / 'nopool.db'}", SQLITE_POOL_SIZE=0)
+    with app.app_context():
+        assert not isinstance(db.engine.pool, QueuePool)
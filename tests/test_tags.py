@@ -0,0 +1,162 @@
+import pytest
+from api import db
+from api.models.generation import CacheGenerationModel
+from api.models.user import UserModel
+from api.models.note import NoteModel, tags
+from api.models.tag import TagModel
+from tests.init_test import client, application, auth_headers, user_admin, sql_statements
+from config import Config
+from utility.cache import clear_caches
+from utility.jobs import job_queue
+from utility.tag_index import tag_index
+
+
+@pytest.fixture()
+def tag():
+    tag = TagModel(name="work")
+    tag.save()
+    return tag
+
+
+@pytest.fixture()
+def notes_admin(user_admin):
+    notes = [NoteModel(author_id=user_admin.id, text=f"Note {i}") for i in range(3)]
+    for note in notes:
+        note.save()
+    return notes
+
+
+def test_note_add_tags(client, tag, notes_admin, auth_headers):
+    note_id = notes_admin[0].id
+    for _ in range(2):
+        response = client.put(f'/notes/{note_id}/tags', json={"tags": [tag.id]}, headers=auth_headers)
+        assert response.status_code == 200
+        assert [item["name"] for item in response.json["tags"]] == ["work"]
+
+
+def test_note_add_tags_not_found(client, tag, notes_admin, auth_headers):
+    note_id = notes_admin[0].id
+    response = client.put(f'/notes/{note_id}/tags', json={"tags": [tag.id, 100]}, headers=auth_headers)
+    assert response.status_code == 404
+    assert NoteModel.query.get(note_id).tags == []
+
+
+def test_note_delete_tags(client, tag, notes_admin, auth_headers):
+    note_id = notes_admin[0].id
+    client.put(f'/notes/{note_id}/tags', json={"tags": [tag.id]}, headers=auth_headers)
+    response = client.delete(f'/notes/{note_id}/tags', json={"tags": [tag.id, 100]}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json["tags"] == []
+
+
+def test_tag_add_and_delete_notes(client, tag, notes_admin, auth_headers):
+    tag_id = tag.id
+    other = UserModel(username="testuser", password="1234")
+    other.save()
+    other_note = NoteModel(author_id=other.id, text="Other note")
+    other_note.save()
+    note_ids = [note.id for note in notes_admin] + [other_note.id]
+    response = client.put(f'/tags/{tag_id}/notes', json={"notes": note_ids}, headers=auth_headers)
+    assert response.status_code == 200
+    assert [item["status"] for item in response.json] == [200, 200, 200, 403]
+    assert len(TagModel.query.get(tag_id).notes) == 3
+    response = client.delete(f'/tags/{tag_id}/notes', json={"notes": note_ids[:2]}, headers=auth_headers)
+    assert response.status_code == 200
+    assert [note.id for note in TagModel.query.get(tag_id).notes] == [note_ids[2]]
+
+
+def test_delete_tag_in_background(client, tag, notes_admin, auth_headers):
+    tag_id = tag.id
+    client.put(f'/tags/{tag_id}/notes', json={"notes": [note.id for note in notes_admin]}, headers=auth_headers)
+    response = client.delete(f'/tags/{tag_id}', headers=auth_headers)
+    assert response.status_code == 202
+    assert response.json["status"] == "queued"
+    job_queue.work(burst=True)
+    job = client.get(response.headers["Location"], headers=auth_headers).json
+    assert (job["status"], job["progress"], job["total"]) == ("done", len(notes_admin), len(notes_admin))
+    assert TagModel.query.get(tag_id) is None
+    assert all(note.tags == [] for note in NoteModel.query.all())
+
+
+@pytest.fixture()
+def tagged_notes(client, notes_admin, auth_headers):
+    # note 1: work, home; note 2: work; note 3: home
+    work = TagModel(name="work")
+    work.save()
+    home = TagModel(name="home")
+    home.save()
+    work_id, home_id = work.id, home.id
+    note_ids = [note.id for note in notes_admin]
+    client.put(f'/tags/{work_id}/notes', json={"notes": note_ids[:2]}, headers=auth_headers)
+    client.put(f'/tags/{home_id}/notes', json={"notes": [note_ids[0], note_ids[2]]}, headers=auth_headers)
+    return note_ids
+
+
+@pytest.mark.parametrize("index_enabled", [True, False])
+@pytest.mark.parametrize("query, expected", [
+    ("name=work", [0, 1]),
+    ("name=work&name=home", [0]),
+    ("name=work&name=home&match=any", [0, 1, 2]),
+    ("name=work&exclude=home", [1]),
+    ("name=work&name=unknown", []),
+    ("name=work&name=unknown&match=any", [0, 1]),
+    ("exclude=work", [2]),
+])
+def test_notes_filter_by_tags(client, tagged_notes, auth_headers, monkeypatch, index_enabled, query, expected):
+    monkeypatch.setattr(Config, "TAG_INDEX_ENABLED", index_enabled)
+    response = client.get(f'/notes/filter/tag?{query}', headers=auth_headers)
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json["items"]] == [tagged_notes[i] for i in expected]
+
+
+def test_notes_filter_by_tags_follows_changes(client, tagged_notes, auth_headers):
+    client.get('/notes/filter/tag?name=work', headers=auth_headers)
+    work_id = TagModel.query.filter_by(name="work").first().id
+    client.delete(f'/notes/{tagged_notes[0]}/tags', json={"tags": [work_id]}, headers=auth_headers)
+    client.put(f'/notes/{tagged_notes[2]}/tags', json={"tags": [work_id]}, headers=auth_headers)
+    response = client.get('/notes/filter/tag?name=work&limit=1', headers=auth_headers)
+    assert [item["id"] for item in response.json["items"]] == [tagged_notes[1]]
+    response = client.get('/notes/filter/tag', query_string={"name": "work", "cursor": response.json["next_cursor"]},
+                          headers=auth_headers)
+    assert [item["id"] for item in response.json["items"]] == [tagged_notes[2]]
+    assert response.json["next_cursor"] is None
+
+
+def test_tag_index_follows_other_processes(client, tagged_notes, auth_headers, monkeypatch):
+    monkeypatch.setattr(Config, "CACHE_SYNC_INTERVAL", 0)
+    user_id = UserModel.query.filter_by(username="admin").first().id
+    work_id = TagModel.query.filter_by(name="work").first().id
+    client.get('/notes/filter/tag?name=work', headers=auth_headers)
+    # тег добавил другой процесс gunicorn: индекс этого процесса о нем не знает
+    db.session.execute(tags.insert().values(tag_id=work_id, note_model_id=tagged_notes[2]))
+    CacheGenerationModel.increment(f"tag_index:{user_id}")
+    db.session.commit()
+    response = client.get('/notes/filter/tag?name=work', headers=auth_headers)
+    assert [item["id"] for item in response.json["items"]] == tagged_notes
+
+
+@pytest.fixture()
+def background_load(application, tmp_path, monkeypatch):
+    # индекс загружается в отдельном потоке - нужна БД в файле, а не общее соединение с :memory:
+    db.session.remove()
+    monkeypatch.setitem(application.config, "SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'tags.db'}")
+    monkeypatch.setitem(application.config, "TAG_INDEX_BACKGROUND_LOAD", True)
+    db.create_all()
+    yield application
+    tag_index.wait()
+    db.drop_all()
+    db.session.remove()
+    clear_caches()
+
+
+def test_tag_index_loads_in_background(background_load, client, tagged_notes, auth_headers):
+    user_id = UserModel.query.filter_by(username="admin").first().id
+    work_id = TagModel.query.filter_by(name="work").first().id
+    # до загрузки индекса отвечает SQL-запрос
+    response = client.get('/notes/filter/tag?name=work', headers=auth_headers)
+    assert [item["id"] for item in response.json["items"]] == tagged_notes[:2]
+    tag_index.wait()
+    assert tag_index.match(user_id, all_tags={work_id}).tolist() == tagged_notes[:2]
+    client.put(f'/notes/{tagged_notes[2]}/tags', json={"tags": [work_id]}, headers=auth_headers)
+    response = client.get('/notes/filter/tag?name=work', headers=auth_headers)
+    assert [item["id"] for item in response.json["items"]] == tagged_notes
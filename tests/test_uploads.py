@@ -0,0 +1,102 @@
+import fcntl
+import hashlib
+import io
+import os
+import time
+import pytest
+from api.models.file import StoredFileModel
+from tests.init_test import client, application, auth_headers, user_admin
+from tests.test_files import upload_folder, upload
+from utility.uploads import upload_sessions
+
+
+def patch(client, url, offset, content):
+    return client.patch(url, data=content, headers={"Upload-Offset": str(offset)})
+
+
+def test_resume_after_interrupted_chunk(client, upload_folder):
+    content = os.urandom(5000)
+    response = client.post('/files/uploads', json={"filename": "video.MP4", "size": len(content)})
+    assert response.status_code == 201
+    assert response.headers["Upload-Offset"] == "0"
+    url = response.json["url"]
+
+    assert patch(client, url, 0, content[:1500]).headers["Upload-Offset"] == "1500"
+    # клиент не получил ответ и не знает, сколько байт принято
+    assert client.get(url).json["offset"] == 1500
+    response = patch(client, url, 1000, content[1000:])
+    assert response.status_code == 409
+    assert response.json["offset"] == 1500
+    assert client.post(url + "/complete").status_code == 409
+
+    assert patch(client, url, 1500, content[1500:]).status_code == 204
+    response = client.post(url + "/complete")
+    digest = hashlib.sha256(content).hexdigest()
+    assert response.json["name"] == f"{digest}.mp4"
+    assert client.get("/" + response.json["url"]).data == content
+    assert client.get(url).status_code == 404
+    assert list((upload_folder / ".uploads").iterdir()) == []
+
+
+def test_resumable_upload_is_deduplicated(client, upload_folder):
+    name = upload(client, b"same content", "a.txt").json["name"]
+    url = client.post('/files/uploads', json={"filename": "b.txt"}).json["url"]
+    patch(client, url, 0, b"same ")
+    patch(client, url, 5, b"content")
+    assert client.post(url + "/complete").json["name"] == name
+    assert StoredFileModel.query.get(name).ref_count == 2
+
+
+def test_resumable_upload_belongs_to_its_user(client, auth_headers, upload_folder):
+    url = client.post('/files/uploads', json={"filename": "a.txt"}, headers=auth_headers).json["url"]
+    patch(client, url, 0, b"content")
+    name = client.post(url + "/complete").json["name"]
+    assert client.delete(f'/files/{name}', headers=auth_headers).status_code == 204
+    assert StoredFileModel.query.get(name) is None
+
+
+def test_session_finished_while_waiting_for_lock(client, upload_folder, monkeypatch):
+    url = client.post('/files/uploads', json={"filename": "a.txt"}).json["url"]
+    patch(client, url, 0, b"content")
+    upload_id = url.rsplit("/", 1)[1]
+    part = upload_folder / ".uploads" / f"{upload_id}.part"
+    stored = upload_folder / "stored"
+    flock = fcntl.flock
+
+    def complete_in_other_process(f, operation):
+        # другой процесс завершил загрузку, пока этот ждал блокировку
+        if part.exists():
+            part.with_suffix(".json").unlink()
+            os.replace(part, stored)
+        flock(f, operation)
+
+    monkeypatch.setattr(fcntl, "flock", complete_in_other_process)
+    assert patch(client, url, 7, b" more").status_code == 404
+    assert stored.read_bytes() == b"content"
+
+    url = client.post('/files/uploads', json={"filename": "b.txt"}).json["url"]
+    part = upload_folder / ".uploads" / f"{url.rsplit('/', 1)[1]}.part"
+    assert client.post(url + "/complete").status_code == 404
+    assert client.delete(url).status_code == 404
+
+
+def test_size_limit_and_cancel(client, upload_folder):
+    url = client.post('/files/uploads', json={"filename": "a.bin", "size": 10}).json["url"]
+    assert patch(client, url, 0, b"x" * 11).status_code == 413
+    assert client.patch(url, data=b"x").status_code == 400
+    assert client.delete(url).status_code == 204
+    assert client.delete(url).status_code == 404
+    assert patch(client, url, 0, b"x").status_code == 404
+
+
+def test_abandoned_sessions_are_collected(application, upload_folder):
+    stale = upload_sessions.create("stale.bin")["id"]
+    fresh = upload_sessions.create("fresh.bin")["id"]
+    upload_sessions.append(fresh, 0, io.BytesIO(b"data"))
+    past = time.time() - application.config["UPLOAD_SESSION_TTL"] - 60
+    for path in (upload_folder / ".uploads").glob(f"{stale}.*"):
+        os.utime(path, (past, past))
+
+    assert upload_sessions.collect_garbage() == 1
+    assert upload_sessions.status(stale) is None
+    assert upload_sessions.status(fresh)["offset"] == 4
@@ -0,0 +1,83 @@
+import threading
+import pytest
+from sqlalchemy.exc import IntegrityError
+from api import db
+from api.models.note import NoteModel
+from api.models.tag import TagModel
+from tests.init_test import client, application, auth_headers, user_admin
+from utility.cache import clear_caches
+from utility.jobs import job_queue
+from utility.metrics import metrics
+
+
+@pytest.fixture()
+def write_queue_enabled(application, monkeypatch):
+    monkeypatch.setitem(application.config, "WRITE_QUEUE_ENABLED", True)
+
+
+@pytest.fixture()
+def file_database(application, write_queue_enabled, tmp_path, monkeypatch):
+    # несколько потоков пишут одновременно - нужна БД в файле, а не общее соединение с :memory:
+    monkeypatch.setitem(application.config, "SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'queue.db'}")
+    monkeypatch.setitem(application.config, "WRITE_QUEUE_MAX_DELAY", 0.05)
+    db.create_all()
+    yield application
+    db.drop_all()
+    db.session.remove()
+    clear_caches()
+
+
+def batch_sizes():
+    # [корзины..., сумма, количество]
+    return metrics.snapshot().get(("write_queue_batch_size", ()), [0] * 11)
+
+
+def test_handlers_through_write_queue(client, auth_headers, write_queue_enabled):
+    batches = batch_sizes()[-1]
+    tag_id = client.post('/tags', json={"name": "work"}).json["id"]
+    response = client.post('/notes', json={"text": "Queued note", "private": False}, headers=auth_headers)
+    assert response.status_code == 201
+    note_id = response.json["id"]
+    assert response.json["author"]["username"] == "admin"
+
+    response = client.put(f'/notes/{note_id}', json={"text": "Edited"}, headers=auth_headers)
+    assert response.json["text"] == "Edited"
+    client.put(f'/notes/{note_id}/tags', json={"tags": [tag_id]}, headers=auth_headers)
+    assert client.get(f'/notes/{note_id}', headers=auth_headers).json["tags"] == [{"id": tag_id, "name": "work"}]
+    # ответ из кеша сброшен изменениями, сделанными писателем
+    assert [note["text"] for note in client.get('/notes/public').json["items"]] == ["Edited"]
+
+    assert client.post('/tags', json={"name": "work"}).status_code == 400
+    assert client.delete(f'/tags/{tag_id}').status_code == 202
+    job_queue.work(burst=True)
+    assert client.get(f'/tags/{tag_id}').status_code == 404
+    assert batch_sizes()[-1] > batches
+
+
+def test_concurrent_writes_are_grouped(file_database):
+    batches_before = batch_sizes()
+    errors = []
+
+    def save(name):
+        with file_database.app_context():
+            try:
+                TagModel(name=name).save()
+            except IntegrityError as error:
+                errors.append(error)
+            finally:
+                db.session.remove()
+
+    names = [f"tag{i}" for i in range(20)] + ["tag0"]
+    threads = [threading.Thread(target=save, args=(name,)) for name in names]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # повторное имя откатывает только свою точку сохранения
+    assert len(errors) == 1
+    with file_database.app_context():
+        assert sorted(tag.name for tag in TagModel.query.all()) == sorted(set(names))
+    batches = [after - before for after, before in zip(batch_sizes(), batches_before)]
+    assert batches[-2] == len(names)  # сумма размеров пачек
+    assert batches[-1] < len(names)
@@ -0,0 +1,40 @@
+import hashlib
+import hmac
+from config import Config
+from utility.cache import LRUCache
+from utility.generation import SharedGeneration
+from utility.metrics import metrics
+
+
+class CredentialCache(LRUCache):
+    """
+    Cache of successful HTTP Basic verifications: digest(username, password) -> user id.
+    Lets repeated Basic-auth requests skip the slow password hash check.
+    Plaintext credentials are never stored, keys are HMAC digests keyed by SECRET_KEY.
+    """
+
+    @staticmethod
+    def make_key(username, password):
+        message = f"{username}\0{password}".encode("utf-8")
+        return hmac.new(Config.SECRET_KEY.encode("utf-8"), message, hashlib.sha256).digest()
+
+    def get_user_id(self, username, password):
+        return self.get(self.make_key(username, password))
+
+    def add(self, username, password, user_id):
+        self.set(self.make_key(username, password), user_id)
+
+    def invalidate_user(self, user_id):
+        self.discard_values(lambda cached_id: cached_id == user_id)
+
+
+credential_cache = CredentialCache(maxsize=Config.AUTH_CACHE_SIZE, ttl=Config.AUTH_CACHE_TTL)
+
+# user id -> UserIdentity, lets authenticated requests skip loading the user row
+user_cache = LRUCache(maxsize=Config.USER_CACHE_SIZE, ttl=Config.USER_CACHE_TTL)
+
+# изменение или удаление пользователя в другом процессе очищает оба кеша
+users_generation = SharedGeneration("users", [credential_cache, user_cache])
+
+metrics.register_cache("credentials", credential_cache)
+metrics.register_cache("users", user_cache)
@@ -0,0 +1,81 @@
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+_caches = weakref.WeakSet()
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache with an optional time-to-live for entries.
+    Keeps hit/miss counters for monitoring.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        _caches.add(self)
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, expires = item
+                if expires is None or expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            item = self._data.pop(key, None)
+        return item[0] if item is not None else None
+
+    def discard_values(self, predicate):
+        """
+        Removes all entries whose value matches predicate.
+        """
+        with self._lock:
+            for key in [key for key, (value, _) in self._data.items() if predicate(value)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data), "maxsize": self.maxsize}
+
+
+def register(cache):
+    """
+    Registers any object with a clear() method to be emptied by clear_caches().
+    """
+    _caches.add(cache)
+
+
+def clear_caches():
+    """
+    Empties every cache of the process, e.g. after the database was recreated.
+    """
+    for cache in list(_caches):
+        cache.clear()
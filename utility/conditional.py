@@ -0,0 +1,66 @@
+import hashlib
+from api import request, db
+from flask import Response
+from sqlalchemy import func, select, union_all
+from werkzeug.http import quote_etag
+from api.schemas.note import note_schema
+from utility.pagination import page_queries, page_ids, paginate, paginate_ids
+
+
+def make_etag(*parts):
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+
+def note_etag(note, user):
+    return make_etag("note", note.id, note.version, user.id if user else None, request.full_path)
+
+
+def notes_etag(query, user=None):
+    """
+    ETag of notes computed with one aggregate query over query (a query of notes or a list of them).
+    Versions are taken from one counter, so MAX(version) changes whenever a note in it is created
+    or changed; COUNT(*) and SUM(id) change when a note leaves it. The ETag includes the request path
+    with the cursor and limit, so for a page query is only the rows of that page.
+    """
+    subqueries = [part.subquery() for part in (query if isinstance(query, (list, tuple)) else [query])]
+    rows = subqueries[0] if len(subqueries) == 1 else union_all(*[select(part) for part in subqueries]).subquery()
+    max_version, count, ids = db.session.query(func.max(rows.c.version), func.count(), func.sum(rows.c.id)).one()
+    return make_etag("notes", max_version, count, ids, user.id if user else None, request.full_path,
+                     request.accept_mimetypes.to_header())
+
+
+def conditional_notes(query, keys, user=None, **kwargs):
+    """
+    paginate() of notes with an ETag, or 304 if the client already has it. The ETag is computed
+    over the rows of the requested page before they are loaded.
+    """
+    etag = notes_etag(page_queries(query, keys, **kwargs), user)
+    return not_modified(etag) or with_etag(paginate(query, keys, note_schema, **kwargs), etag)
+
+
+def conditional_note_ids(query, key, ids, user=None, limit=None, cursor=None):
+    """
+    Same as conditional_notes() for paginate_ids().
+    """
+    ids = page_ids(query, key, ids, limit, cursor)
+    etag = notes_etag(query.filter(key.in_(ids)), user)
+    return not_modified(etag) or with_etag(paginate_ids(query, key, ids, limit), etag)
+
+
+def not_modified(etag):
+    """
+    304 response if the client already has the current representation (If-None-Match), else None.
+    Use as `return not_modified(etag) or ...` so the page is not loaded or serialized on a match.
+    """
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
+
+def with_etag(result, etag):
+    if isinstance(result, Response):
+        result.set_etag(etag)
+        return result
+    return result, 200, {"ETag": quote_etag(etag)}
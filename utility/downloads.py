@@ -0,0 +1,114 @@
+import mimetypes
+import os
+import re
+from pathlib import PurePosixPath
+from urllib.parse import quote
+from api import app, request, abort
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file
+from utility.image_variants import image_variants
+
+# Отдача загруженных файлов. Range (206), ETag/Last-Modified (304) и If-Range обрабатывает
+# werkzeug.send_file, файл не читается в память. Если рядом с файлом лежит сжатая копия
+# (<file>.br, <file>.gz) и клиент ее принимает, отдается она с Content-Encoding.
+# При DOWNLOAD_OFFLOAD байты отдает прокси (X-Accel-Redirect / X-Sendfile), Python проверяет только заголовки.
+# ?variant=thumbnail - уменьшенная копия изображения; пока она не готова, отдается оригинал без долгого кеширования.
+
+# файл хранилища: UPLOAD_FOLDER/ab/12/<sha256><ext>, хеш содержимого - строгий ETag
+CONTENT_ADDRESSED = re.compile(r"^([0-9a-f]{2})/([0-9a-f]{2})/(\1\2[0-9a-f]{60})(\.[\w.-]*)?$")
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+OFFLOAD_MODES = ("x-accel-redirect", "x-sendfile")
+
+
+def find_file(filename):
+    """
+    Absolute path of an uploaded file, None if there is no such file.
+    Service directories (.tmp, .uploads) are not served.
+    """
+    if any(part.startswith(".") for part in PurePosixPath(filename).parts):
+        return None
+    path = safe_join(str(app.config["UPLOAD_FOLDER"]), filename)
+    if path is None or not os.path.isfile(path):
+        return None
+    return path
+
+
+def choose_encoding(path):
+    """
+    (path, encoding) of the best precompressed copy accepted by the client, (path, None) for the file itself.
+    """
+    for encoding, suffix in PRECOMPRESSED:
+        if request.accept_encodings[encoding] and os.path.isfile(path + suffix):
+            return path + suffix, encoding
+    return path, None
+
+
+def has_precompressed(path):
+    return any(os.path.isfile(path + suffix) for _, suffix in PRECOMPRESSED)
+
+
+def send_upload(filename, variant=None):
+    """
+    Response with the uploaded file (or its reduced copy) as an attachment.
+    """
+    path = find_file(filename)
+    if path is None:
+        abort(404, description=f"File {filename} not found")
+    download_name = os.path.basename(filename)
+    mimetype = mimetypes.guess_type(download_name)[0] or "application/octet-stream"
+    match = CONTENT_ADDRESSED.match(filename)
+    sent_variant, pending = None, False
+    if variant is not None and match and image_variants.expected(download_name):
+        if os.path.isfile(f"{path}.{variant}"):
+            path, sent_variant = f"{path}.{variant}", variant
+        else:
+            pending = True
+    sent_path, encoding = choose_encoding(path)
+    if match:
+        etag = match.group(3)
+        if sent_variant is not None:
+            etag += f"-{sent_variant}"
+        if encoding is not None:
+            etag += f"-{encoding}"
+        # оригинал вместо копии нельзя кешировать надолго: копия появится по тому же URL
+        max_age = None if pending else app.config["DOWNLOAD_MAX_AGE"]
+    else:
+        etag, max_age = True, None
+
+    offload = app.config["DOWNLOAD_OFFLOAD"]
+    if offload is not None:
+        response = offload_response(offload, sent_path, mimetype, download_name, etag, max_age)
+    else:
+        response = send_file(sent_path, request.environ, mimetype=mimetype, as_attachment=True,
+                             download_name=download_name, conditional=True, etag=etag, max_age=max_age,
+                             response_class=app.response_class)
+    if encoding is not None:
+        response.headers["Content-Encoding"] = encoding
+    if has_precompressed(path):
+        response.vary.add("Accept-Encoding")
+    if match and not pending:
+        response.cache_control.immutable = True
+    return response
+
+
+def offload_response(mode, path, mimetype, download_name, etag, max_age):
+    """
+    Empty response with the headers of the file, the proxy sends the body (and handles Range).
+    """
+    if mode not in OFFLOAD_MODES:
+        raise ValueError(f"DOWNLOAD_OFFLOAD must be one of {OFFLOAD_MODES}, got {mode!r}")
+    # с use_x_sendfile send_file не открывает файл, а только заполняет заголовки
+    response = send_file(path, request.environ, mimetype=mimetype, as_attachment=True,
+                         download_name=download_name, conditional=False, etag=etag, max_age=max_age,
+                         response_class=app.response_class, use_x_sendfile=True)
+    del response.headers["X-Sendfile"]
+    response.content_length = None
+    response = response.make_conditional(request.environ)
+    if response.status_code == 304:
+        return response
+    if mode == "x-sendfile":
+        response.headers["X-Sendfile"] = path
+    else:
+        relative = os.path.relpath(path, app.config["UPLOAD_FOLDER"]).replace(os.sep, "/")
+        response.headers["X-Accel-Redirect"] = app.config["DOWNLOAD_ACCEL_PREFIX"] + quote(relative)
+    return response
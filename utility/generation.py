@@ -0,0 +1,51 @@
+import threading
+import time
+from api import db
+from api.models.generation import CacheGenerationModel
+from config import Config
+
+# Кеши в памяти процесса (пользователи, индекс тегов) не видят изменений, сделанных другими процессами
+# gunicorn и обработчиком фоновых задач. Процесс, изменивший закешированные данные, увеличивает общий счетчик
+# в основной БД (таблица cache_generation), остальные процессы сверяются с ним не чаще раза
+# в CACHE_SYNC_INTERVAL секунд и очищают свои кеши, если счетчик изменился.
+
+
+class SharedGeneration:
+
+    def __init__(self, name, caches=()):
+        self.name = name
+        self.caches = list(caches)
+        self._seen = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def bump(self):
+        """
+        Tells other processes that the cached data changed. Commits.
+        """
+        CacheGenerationModel.increment(self.name)
+        generation = CacheGenerationModel.get(self.name)
+        db.session.commit()
+        with self._lock:
+            # свое изменение процесс уже учел сам; если счетчик увеличил и кто-то еще, кеши очистит check()
+            if self._seen is not None and generation == self._seen + 1:
+                self._seen = generation
+
+    def check(self):
+        """
+        Clears the caches and returns True if another process bumped the counter.
+        Reads the db at most every CACHE_SYNC_INTERVAL seconds.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < Config.CACHE_SYNC_INTERVAL:
+                return False
+            self._checked_at = now
+        generation = CacheGenerationModel.get(self.name)
+        with self._lock:
+            changed = self._seen is not None and generation != self._seen
+            self._seen = generation
+        if changed:
+            for cache in self.caches:
+                cache.clear()
+        return changed
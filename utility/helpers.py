@@ -1,5 +1,7 @@
 from api import app, db, abort
 from flask_babel import _
+from config import Config
+from marshmallow import validate
 
 @app.errorhandler(404)
 def not_found(e):
@@ -30,3 +32,13 @@ def get_object_or_404(model: db.Model, object_id: int):
         abort(404, description=_("Object with id=%(object_id)s not found", object_id=object_id))
     return object
 
+
+# Валидатор размера пакета для пакетных операций
+batch_size = validate.Length(min=1, max=Config.NOTES_BATCH_MAX_SIZE)
+
+
+def batch_result(index, object_id, status, error=None):
+    result = {"index": index, "id": object_id, "status": status}
+    if error:
+        result["error"] = error
+    return result
@@ -0,0 +1,67 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from api import app
+from utility.imaging import available, is_image, render_variants
+from utility.metrics import metrics
+from utility.storage import storage
+
+# Уменьшенные копии загруженных изображений (IMAGE_VARIANTS: "thumbnail", "medium", ...).
+# Копии создаются в пуле процессов после ответа на загрузку и лежат рядом с оригиналом:
+# UPLOAD_FOLDER/ab/12/<name>.<variant>. Пока копии нет, download_file отдает оригинал.
+
+
+class ImageVariants:
+
+    def __init__(self):
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def expected(self, name):
+        """
+        True if variants of the stored file are (or will be) created.
+        """
+        return available() and is_image(name)
+
+    def path(self, name, variant):
+        return storage.path(f"{name}.{variant}")
+
+    def targets(self, name):
+        return [(str(self.path(name, variant)), size) for variant, size in app.config["IMAGE_VARIANTS"].items()]
+
+    def schedule(self, name):
+        """
+        Starts creating the variants of a stored file, returns at once. Does nothing for other files.
+        """
+        if not self.expected(name):
+            return
+        args = (str(storage.path(name)), self.targets(name), app.config["IMAGE_VARIANT_QUALITY"])
+        if app.config["IMAGE_VARIANT_WORKERS"] == 0:
+            written = render_variants(*args)
+            metrics.inc("image_variants_total", len(written), status="created")
+            return
+        future = self._get_executor().submit(render_variants, *args)
+        future.add_done_callback(lambda done: self._finished(name, done))
+
+    def _finished(self, name, future):
+        try:
+            metrics.inc("image_variants_total", len(future.result()), status="created")
+        except Exception:
+            metrics.inc("image_variants_total", status="failed")
+            app.logger.exception("Failed to create variants of %s", name)
+
+    def _get_executor(self):
+        if self._executor is not None and self._pid == os.getpid():
+            return self._executor
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                # spawn: fork процесса с потоками (gunicorn --threads, очередь записи) небезопасен
+                self._executor = ProcessPoolExecutor(app.config["IMAGE_VARIANT_WORKERS"],
+                                                     mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+
+image_variants = ImageVariants()
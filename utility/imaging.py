@@ -0,0 +1,49 @@
+import os
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # необязательная зависимость, без нее уменьшенные копии не создаются
+    Image = None
+
+# Функции для процессов пула (utility/image_variants.py): модуль не импортирует приложение,
+# поэтому дочерний процесс не создает Flask app и соединения с БД.
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+
+
+def available():
+    return Image is not None
+
+
+def is_image(name):
+    return os.path.splitext(name)[1] in IMAGE_EXTENSIONS
+
+
+def render_variants(source, targets, quality):
+    """
+    Writes reduced copies of the source image in its own format.
+    targets: [(path, max_side)], existing paths are skipped. Returns the written paths.
+    """
+    targets = [(path, size) for path, size in targets if not os.path.exists(path)]
+    if not targets:
+        return []
+    written = []
+    with Image.open(source) as original:
+        image_format = original.format
+        # поворот по EXIF: в копиях метаданные не сохраняются
+        image = ImageOps.exif_transpose(original)
+        if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        for path, size in targets:
+            variant = image.copy()
+            variant.thumbnail((size, size))
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                variant.save(tmp_path, format=image_format, quality=quality, optimize=True)
+                # копия появляется целиком: до этого download_file отдает оригинал
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+            written.append(path)
+    return written
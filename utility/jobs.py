@@ -0,0 +1,188 @@
+import json
+import multiprocessing
+import random
+import signal
+import threading
+import time
+from api import app, db
+from api.models.job import JobModel
+from flask import has_app_context
+from sqlalchemy.dialects.sqlite import insert
+from utility.metrics import metrics
+
+# Очередь фоновых задач в основной БД (таблица job). Обработчик запроса ставит задачу (enqueue) и сразу
+# отвечает 202, задачу выполняет отдельный процесс: flask worker --threads N --processes M.
+# Задача берется условным UPDATE (status queued -> running), поэтому обработчиков может быть много.
+# Упавшая задача повторяется с экспоненциальной задержкой до JOB_MAX_ATTEMPTS раз; задача процесса,
+# который завершился аварийно, снова доступна через JOB_LEASE секунд. Поэтому задачи должны быть
+# идемпотентными: коммитить работу порциями вместе с progress и при повторе продолжать с оставшегося.
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class JobQueue:
+
+    def __init__(self):
+        self._tasks = {}
+
+    def task(self, kind):
+        """
+        Registers function(job, **arguments) as the handler of jobs of this kind.
+        """
+        def register(function):
+            self._tasks[kind] = function
+            return function
+        return register
+
+    def enqueue(self, kind, key=None, owner_id=None, **arguments):
+        """
+        Adds a job of user owner_id and commits. While a job with the same idempotency key is queued
+        or running, that job (with its owner) is returned instead; a finished one is queued again.
+        """
+        now = time.time()
+        values = dict(kind=kind, payload=json.dumps(arguments, sort_keys=True), idempotency_key=key,
+                      status="queued", attempts=0, max_attempts=app.config["JOB_MAX_ATTEMPTS"], run_at=now,
+                      progress=0, total=None, error=None, created_at=now, finished_at=None, owner_id=owner_id)
+        statement = insert(JobModel).values(**values)
+        if key is None:
+            job_id = db.session.execute(statement).inserted_primary_key[0]
+        else:
+            table = JobModel.__table__
+            db.session.execute(statement.on_conflict_do_update(
+                index_elements=[table.c.idempotency_key],
+                set_={name: value for name, value in values.items() if name != "idempotency_key"},
+                where=table.c.status.not_in(ACTIVE_STATUSES)))
+            job_id = db.session.execute(db.select(table.c.id).where(table.c.idempotency_key == key)).scalar()
+        db.session.commit()
+        return JobModel.query.get(job_id)
+
+    def progress(self, job, done, total=None):
+        """
+        Records progress of a running job and extends its lease. Committed with the task's changes.
+        """
+        job.progress = done
+        if total is not None:
+            job.total = total
+        job.locked_until = time.time() + app.config["JOB_LEASE"]
+
+    def claim(self, now=None):
+        """
+        Takes the next ready job (status becomes running) and commits. Returns None if there is none.
+        """
+        now = time.time() if now is None else now
+        table = JobModel.__table__
+        ready = (((table.c.status == "queued") & (table.c.run_at <= now))
+                 | ((table.c.status == "running") & (table.c.locked_until < now)))
+        while True:
+            job_id = db.session.execute(
+                db.select(table.c.id).where(ready).order_by(table.c.run_at).limit(1)).scalar()
+            if job_id is None:
+                db.session.rollback()
+                return None
+            # ту же задачу мог взять другой обработчик - тогда UPDATE не изменит строку
+            claimed = db.session.execute(table.update().where((table.c.id == job_id) & ready).values(
+                status="running", attempts=table.c.attempts + 1, locked_until=now + app.config["JOB_LEASE"]))
+            db.session.commit()
+            if claimed.rowcount == 1:
+                return JobModel.query.get(job_id)
+
+    def run(self, job):
+        """
+        Runs a claimed job and records the result: done, queued for a retry or failed.
+        """
+        job_id, kind, attempts, max_attempts = job.id, job.kind, job.attempts, job.max_attempts
+        started = time.perf_counter()
+        try:
+            function = self._tasks.get(kind)
+            if function is None:
+                raise LookupError(f"Unknown job kind {kind}")
+            function(job, **job.arguments)
+            status, values = "done", dict(finished_at=time.time(), error=None)
+        except Exception as error:
+            db.session.rollback()
+            app.logger.exception("Job %s (%s) failed, attempt %s of %s", job_id, kind, attempts, max_attempts)
+            if attempts < max_attempts:
+                status, values = "queued", dict(run_at=time.time() + self.retry_delay(attempts), error=repr(error))
+            else:
+                status, values = "failed", dict(finished_at=time.time(), error=repr(error))
+        table = JobModel.__table__
+        db.session.execute(table.update().where(table.c.id == job_id).values(status=status, locked_until=None, **values))
+        db.session.commit()
+        metrics.inc("jobs_total", kind=kind, status=status)
+        metrics.observe("job_duration_seconds", time.perf_counter() - started, kind=kind)
+        return status
+
+    def retry_delay(self, attempts):
+        # экспоненциальная задержка со случайным разбросом, чтобы повторы не шли одновременно
+        delay = min(app.config["JOB_RETRY_MAX_DELAY"], app.config["JOB_RETRY_DELAY"] * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1)
+
+    def work(self, threads=1, burst=False, stop=None):
+        """
+        Runs jobs in threads until stop is set (burst: until no job is ready).
+        """
+        stop = stop or threading.Event()
+        if threads == 1:
+            self._work(burst, stop)
+            return
+        workers = [threading.Thread(target=self._work, args=(burst, stop), name=f"job-worker-{index}")
+                   for index in range(threads)]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                while worker.is_alive():
+                    worker.join(0.5)  # с таймаутом, чтобы главный поток получил Ctrl+C
+        except KeyboardInterrupt:
+            stop.set()
+            for worker in workers:
+                worker.join()
+
+    def _work(self, burst, stop):
+        if not has_app_context():
+            # сессия потока закрывается вместе с контекстом
+            with app.app_context():
+                return self._work(burst, stop)
+        while not stop.is_set():
+            job = self.claim()
+            if job is None:
+                if burst:
+                    return
+                stop.wait(app.config["JOB_POLL_INTERVAL"])
+                continue
+            self.run(job)
+
+    def serve(self, threads=1, processes=1, burst=False):
+        """
+        Worker entry point: runs jobs in processes x threads, stops gracefully on SIGTERM / Ctrl+C.
+        """
+        if processes <= 1:
+            stop = threading.Event()
+            signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+            try:
+                self.work(threads, burst, stop)
+            except KeyboardInterrupt:
+                pass
+            return
+        # spawn: дочерний процесс импортирует приложение заново, без унаследованных соединений с БД
+        context = multiprocessing.get_context("spawn")
+        children = [context.Process(target=_serve_process, args=(threads, burst), name=f"job-worker-{index}")
+                    for index in range(processes)]
+        for child in children:
+            child.start()
+        signal.signal(signal.SIGTERM, lambda signum, frame: [child.terminate() for child in children])
+        try:
+            for child in children:
+                child.join()
+        except KeyboardInterrupt:
+            # Ctrl+C получают и дочерние процессы, они завершают текущие задачи
+            for child in children:
+                child.join()
+
+
+def _serve_process(threads, burst):
+    import api.tasks  # noqa: задачи регистрируются при импорте
+    job_queue.serve(threads, 1, burst)
+
+
+job_queue = JobQueue()
@@ -0,0 +1,305 @@
+import atexit
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Метрики в формате Prometheus. Каждый поток пишет только в свой словарь (без блокировок),
+# словари потоков складываются при выдаче /metrics. При нескольких процессах gunicorn
+# каждый процесс периодически сохраняет свои значения в METRICS_DIR, /metrics суммирует все файлы.
+# Файлы завершившихся процессов переносятся в DEAD_PROCESSES_FILE: счетчики и гистограммы
+# остаются в сумме (не должны уменьшаться), gauge отбрасываются.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+JOB_BUCKETS = (0.01, 0.1, 1, 10, 60, 300, 1800)
+
+DEAD_PROCESSES_FILE = "dead.json"
+
+# name: (type, help, buckets)
+METRICS = {
+    "http_requests_total": ("counter", "Requests by endpoint, method and status.", None),
+    "http_request_duration_seconds": ("histogram", "Request latency, streaming included.", LATENCY_BUCKETS),
+    "http_response_size_bytes": ("histogram", "Response body size.", SIZE_BUCKETS),
+    "db_statements_per_request": ("histogram", "SQL statements executed per request.", STATEMENT_BUCKETS),
+    "db_seconds_per_request": ("histogram", "Time spent in SQL statements per request.", LATENCY_BUCKETS),
+    "auth_duration_seconds": ("histogram", "Authentication time by method and path.", LATENCY_BUCKETS),
+    "write_queue_batch_size": ("histogram", "Changes committed together by the write queue.", BATCH_BUCKETS),
+    "write_queue_commit_seconds": ("histogram", "Time to apply and commit one write queue batch.", LATENCY_BUCKETS),
+    "jobs_total": ("counter", "Background job runs by kind and resulting status.", None),
+    "job_duration_seconds": ("histogram", "Background job run time.", JOB_BUCKETS),
+    "image_variants_total": ("counter", "Reduced copies of uploaded images by status.", None),
+    "cache_hits_total": ("counter", "Cache hits.", None),
+    "cache_misses_total": ("counter", "Cache misses.", None),
+    "cache_entries": ("gauge", "Entries in the cache.", None),
+    "cache_bytes_served_total": ("counter", "Bytes of responses served from the cache.", None),
+    "cache_bytes_stored_total": ("counter", "Bytes of responses stored in the cache.", None),
+}
+
+# ключи LRUCache.stats() / ResponseCache.stats() -> метрика
+CACHE_STATS = {
+    "hits": "cache_hits_total",
+    "misses": "cache_misses_total",
+    "size": "cache_entries",
+    "bytes_served": "cache_bytes_served_total",
+    "bytes_stored": "cache_bytes_stored_total",
+}
+
+
+class Metrics:
+
+    def __init__(self):
+        self.directory = None
+        self.flush_interval = 5
+        self._local = threading.local()
+        self._shards = []  # [(поток, его словарь)]
+        self._finished = {}  # значения завершившихся потоков
+        self._collectors = []
+        self._lock = threading.Lock()
+        self._flushed_at = 0.0
+        self._pid = None
+        self._started = None
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._fold_finished_threads()
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _fold_finished_threads(self):
+        # завершившийся поток больше не пишет в свой словарь - переносим значения в общий
+        shards = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                shards.append((thread, shard))
+            else:
+                _merge(self._finished, list(shard.items()))
+        self._shards = shards
+
+    def inc(self, name, value=1, **labels):
+        shard = self._shard()
+        key = (name, tuple(labels.items()))
+        shard[key] = shard.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        shard = self._shard()
+        key = (name, tuple(labels.items()))
+        histogram = shard.get(key)
+        if histogram is None:
+            # счетчики по корзинам (последняя - +Inf), сумма, количество
+            histogram = shard[key] = [0] * (len(METRICS[name][2]) + 3)
+        histogram[bisect_left(METRICS[name][2], value)] += 1
+        histogram[-2] += value
+        histogram[-1] += 1
+
+    def add_collector(self, collector):
+        """
+        Registers a function returning [(name, labels, value), ...], called on every snapshot.
+        """
+        self._collectors.append(collector)
+
+    def register_cache(self, name, cache):
+        def collect():
+            return [(CACHE_STATS[stat], {"cache": name}, value)
+                    for stat, value in cache.stats().items() if stat in CACHE_STATS]
+        self.add_collector(collect)
+
+    def snapshot(self):
+        """
+        Values of this process: {(name, labels): number or histogram list}.
+        """
+        samples = {}
+        with self._lock:
+            self._fold_finished_threads()
+            _merge(samples, list(self._finished.items()))
+            shards = [shard for _, shard in self._shards]
+        for shard in shards:
+            _merge(samples, list(shard.items()))
+        for collector in self._collectors:
+            _merge(samples, [((name, tuple(labels.items())), value) for name, labels, value in collector()])
+        return samples
+
+    def flush(self):
+        """
+        Saves the snapshot of this process to METRICS_DIR (multi-process mode).
+        """
+        self._flushed_at = time.monotonic()
+        pid = os.getpid()
+        if self._pid != pid:
+            # pid может достаться новому процессу, поэтому в имени файла еще и время запуска
+            self._pid, self._started = pid, time.time_ns()
+        _write(os.path.join(self.directory, f"{pid}-{self._started}.json"), self.snapshot())
+
+    def collect(self):
+        if self.directory is None:
+            return self.snapshot()
+        self.flush()
+        for path in glob.glob(os.path.join(self.directory, "*-*.json")):
+            pid = os.path.basename(path).split("-")[0]
+            if pid.isdigit() and not _process_alive(int(pid)):
+                self._fold_dead_process(path)
+        samples = {}
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            _merge(samples, _read(path))
+        return samples
+
+    def _fold_dead_process(self, path):
+        # файл забирает только один из собирающих метрики процессов
+        claimed = f"{path}.{os.getpid()}.fold"
+        try:
+            os.rename(path, claimed)
+        except OSError:
+            return
+        with open(os.path.join(self.directory, "dead.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            dead = os.path.join(self.directory, DEAD_PROCESSES_FILE)
+            samples = dict(_read(dead))
+            _merge(samples, [(key, value) for key, value in _read(claimed) if METRICS[key[0]][0] != "gauge"])
+            _write(dead, samples)
+            os.remove(claimed)
+
+    def render(self):
+        """
+        All metrics in Prometheus text exposition format.
+        """
+        by_name = {}
+        for (name, labels), value in self.collect().items():
+            by_name.setdefault(name, []).append((labels, value))
+        lines = []
+        for name, samples in sorted(by_name.items()):
+            kind, description, buckets = METRICS[name]
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(samples):
+                if kind != "histogram":
+                    lines.append(f"{name}{_labels(labels)} {value}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + ("+Inf",), value):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {value[-2]}")
+                lines.append(f"{name}_count{_labels(labels)} {value[-1]}")
+        return "\n".join(lines) + "\n"
+
+    def init_app(self, app):
+        """
+        Installs request hooks on app and SQL statement counters on every engine.
+        """
+        if not app.config["METRICS_ENABLED"]:
+            return
+        self.directory = app.config["METRICS_DIR"]
+        self.flush_interval = app.config["METRICS_FLUSH_INTERVAL"]
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+            atexit.register(self.flush)
+        app.before_request(self._start_request)
+        app.after_request(self._measure_response)
+        app.teardown_request(self._finish_request)
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def _start_request(self):
+        # [начало, число SQL запросов, время SQL, размер ответа, статус]
+        self._local.request = [time.perf_counter(), 0, 0.0, 0, 500]
+
+    def _measure_response(self, response):
+        state = getattr(self._local, "request", None)
+        if state is not None:
+            state[4] = response.status_code
+            if response.is_streamed and response.content_length is None:
+                response.response = _count_bytes(response.iter_encoded(), state)
+            else:
+                # файл (send_file) не оборачивается: сервер может отдать его через wsgi.file_wrapper
+                state[3] = response.content_length or 0
+        return response
+
+    def _finish_request(self, exception=None):
+        state = getattr(self._local, "request", None)
+        if state is None:
+            return
+        self._local.request = None
+        endpoint = request.endpoint or "unmatched"
+        self.inc("http_requests_total", endpoint=endpoint, method=request.method, status=str(state[4]))
+        self.observe("http_request_duration_seconds", time.perf_counter() - state[0], endpoint=endpoint)
+        self.observe("http_response_size_bytes", state[3], endpoint=endpoint)
+        self.observe("db_statements_per_request", state[1], endpoint=endpoint)
+        self.observe("db_seconds_per_request", state[2], endpoint=endpoint)
+        if self.directory is not None and time.monotonic() - self._flushed_at > self.flush_interval:
+            self.flush()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        state = getattr(self._local, "request", None)
+        if state is not None:
+            state[1] += 1
+            state[2] += time.perf_counter() - context._metrics_started
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+
+def _count_bytes(chunks, state):
+    for chunk in chunks:
+        state[3] += len(chunk)
+        yield chunk
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # процесс другого пользователя
+    return True
+
+
+def _read(path):
+    try:
+        with open(path) as file:
+            data = json.load(file)
+    except (OSError, ValueError):
+        return []  # файл удален или записывается
+    return [((name, tuple(map(tuple, labels))), value) for name, labels, value in data]
+
+
+def _write(path, samples):
+    data = [[name, list(labels), value] for (name, labels), value in samples.items()]
+    with open(path + ".tmp", "w") as file:
+        json.dump(data, file)
+    os.replace(path + ".tmp", path)
+
+
+def _merge(samples, items):
+    for key, value in items:
+        current = samples.get(key)
+        if current is None:
+            samples[key] = list(value) if isinstance(value, list) else value
+        elif isinstance(value, list):
+            samples[key] = [a + b for a, b in zip(current, value)]
+        else:
+            samples[key] = current + value
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+                          for key, value in labels) + "}"
+
+
+metrics = Metrics()
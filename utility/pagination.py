@@ -0,0 +1,131 @@
+from heapq import merge
+from itertools import islice
+from api import abort
+from config import Config
+from itsdangerous import URLSafeSerializer, BadSignature
+from marshmallow import validate
+from sqlalchemy import tuple_
+from webargs import fields
+from utility.streaming import stream_rows, wants_ndjson
+from utility.sorted_ids import ids_after
+
+# Аргументы запроса для постраничного вывода: ?limit=<n>&cursor=<next_cursor>&stream=true
+page_args = {
+    "limit": fields.Int(validate=validate.Range(min=1, max=Config.NOTES_PAGE_SIZE_MAX)),
+    "cursor": fields.Str(),
+    "stream": fields.Bool(),
+}
+
+
+def _serializer():
+    return URLSafeSerializer(Config.SECRET_KEY, salt="page-cursor")
+
+
+def encode_cursor(values):
+    return _serializer().dumps(list(values))
+
+
+def decode_cursor(cursor, size):
+    try:
+        values = _serializer().loads(cursor)
+    except BadSignature:
+        abort(400, description="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        abort(400, description="Invalid cursor")
+    return values
+
+
+def keyset_filter(query, keys, cursor=None, descending=False):
+    """
+    Orders query by keys and skips everything up to (and including) cursor.
+    Rows are located through a row-value comparison, so the database seeks
+    straight to the page instead of scanning OFFSET rows.
+    """
+    if cursor is not None:
+        values = decode_cursor(cursor, len(keys))
+        if descending:
+            query = query.filter(tuple_(*keys) < tuple_(*values))
+        else:
+            query = query.filter(tuple_(*keys) > tuple_(*values))
+    return query.order_by(*[key.desc() if descending else key.asc() for key in keys])
+
+
+def page_queries(query, keys, limit=None, cursor=None, descending=False, stream=False):
+    """
+    Queries of the rows paginate() reads: each part of query after cursor in keys order, limited
+    to one row more than the page. Streams are limited only when limit is given explicitly.
+    """
+    queries = query if isinstance(query, (list, tuple)) else [query]
+    queries = [keyset_filter(query, keys, cursor, descending) for query in queries]
+    if not (stream or wants_ndjson()):
+        limit = limit or Config.NOTES_PAGE_SIZE
+    if limit is not None:
+        queries = [query.limit(limit + 1) for query in queries]
+    return queries
+
+
+def paginate(query, keys, schema, limit=None, cursor=None, descending=False, stream=False):
+    """
+    Returns one page of query as {"items": [...], "next_cursor": ...}.
+    next_cursor is None on the last page.
+
+    query may also be a list of queries with disjoint results (the parts of an OR condition):
+    each one is read in keys order through its own index and the rows are merged here,
+    so the database does not have to collect and sort the whole union for every page.
+
+    With stream=True or "Accept: application/x-ndjson" the rows are streamed
+    with schema instead, and limit is applied only when given explicitly.
+    """
+    queries = page_queries(query, keys, limit, cursor, descending, stream)
+
+    def sort_key(row):
+        return tuple(getattr(row, key.key) for key in keys)
+
+    def make_cursor(row):
+        return encode_cursor(sort_key(row))
+
+    ndjson = wants_ndjson()
+    if stream or ndjson:
+        # связи загружаются опциями запроса (with_author_and_tags): selectin и joined для many-to-one
+        # совместимы с yield_per, теги подгружаются одним запросом на каждую пачку строк
+        rows = merge(*[query.yield_per(Config.NOTES_STREAM_CHUNK_SIZE) for query in queries],
+                     key=sort_key, reverse=descending)
+        return stream_rows(rows, schema, make_cursor, limit=limit, ndjson=ndjson)
+
+    limit = limit or Config.NOTES_PAGE_SIZE
+    rows = list(islice(merge(*[query.all() for query in queries], key=sort_key, reverse=descending), limit + 1))
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = make_cursor(rows[-1])
+    return {"items": rows, "next_cursor": next_cursor}
+
+
+def page_ids(query, key, ids, limit=None, cursor=None):
+    """
+    Keys of the rows of one page ordered by key, plus the key of the first row of the next page if there is one,
+    taken from the sorted array ids. ids are checked against query in chunks, skipping the ones it filters out.
+    """
+    limit = limit or Config.NOTES_PAGE_SIZE
+    if cursor is not None:
+        ids = ids_after(ids, decode_cursor(cursor, 1)[0])
+    found = []
+    position = 0
+    while position < len(ids) and len(found) <= limit:
+        chunk = ids[position:position + limit + 1 - len(found)]
+        position += len(chunk)
+        found += sorted(value for value, in query.with_entities(key).filter(key.in_(chunk.tolist())))
+    return found
+
+
+def paginate_ids(query, key, ids, limit=None):
+    """
+    Same as paginate() ordered by key for the rows whose keys were found by page_ids().
+    """
+    limit = limit or Config.NOTES_PAGE_SIZE
+    rows = query.filter(key.in_(ids)).order_by(key).all() if ids else []
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([getattr(rows[-1], key.key)])
+    return {"items": rows, "next_cursor": next_cursor}
@@ -0,0 +1,270 @@
+import functools
+import sqlite3
+import threading
+from api import app, db, request
+from flask import Response
+from sqlalchemy import inspect
+from utility.cache import LRUCache, register
+from utility.metrics import metrics
+
+# Кеш готовых ответов анонимных GET-обработчиков (одинаковых для всех клиентов).
+# Записи помечаются тегами ("notes", "tags", "user:5", ...) и удаляются после коммита
+# изменений в соответствующих таблицах (см. track_changes), а не по истечении времени.
+
+
+class MemoryBackend:
+    """
+    Per-process LRU backend. Fits a single worker (or tests).
+    """
+
+    def __init__(self, maxsize):
+        self.generation = 0
+        self._entries = LRUCache(maxsize=maxsize)
+        self._keys_by_tag = {}
+        self._lock = threading.Lock()
+
+    def get_generation(self):
+        return self.generation
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def set(self, key, entry, tags, generation):
+        with self._lock:
+            if generation != self.generation:
+                return False
+            self._entries.set(key, entry)
+            for tag in tags:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+        return True
+
+    def invalidate(self, tags):
+        with self._lock:
+            self.generation += 1
+            for tag in tags:
+                for key in self._keys_by_tag.pop(tag, ()):
+                    self._entries.pop(key)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._keys_by_tag.clear()
+
+
+class SQLiteBackend:
+    """
+    Backend in a separate SQLite file shared by all gunicorn workers of the host.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS response_cache (
+            key TEXT PRIMARY KEY, status INTEGER, mimetype TEXT, etag TEXT, body BLOB);
+        CREATE TABLE IF NOT EXISTS response_cache_tag (
+            tag TEXT, key TEXT REFERENCES response_cache(key) ON DELETE CASCADE, PRIMARY KEY (tag, key));
+        CREATE INDEX IF NOT EXISTS ix_response_cache_tag_key ON response_cache_tag(key);
+        CREATE TABLE IF NOT EXISTS response_cache_generation (id INTEGER PRIMARY KEY, generation INTEGER);
+        INSERT OR IGNORE INTO response_cache_generation VALUES (1, 0);
+    """
+
+    def __init__(self, path, maxsize):
+        self.path = str(path)
+        self.maxsize = maxsize
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA foreign_keys=ON")
+            connection.executescript(self.SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def get_generation(self):
+        return self._connection().execute("SELECT generation FROM response_cache_generation").fetchone()[0]
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT status, mimetype, etag, body FROM response_cache WHERE key = ?", (key,)).fetchone()
+        return tuple(row) if row else None
+
+    def set(self, key, entry, tags, generation):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            # ответ мог устареть, если пока он строился, кто-то выполнил invalidate()
+            if generation != self.get_generation():
+                return False
+            connection.execute("INSERT OR REPLACE INTO response_cache VALUES (?, ?, ?, ?, ?)", (key, *entry))
+            connection.executemany("INSERT OR IGNORE INTO response_cache_tag VALUES (?, ?)",
+                                   [(tag, key) for tag in tags])
+            overflow = connection.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0] - self.maxsize
+            if overflow > 0:
+                connection.execute("DELETE FROM response_cache WHERE rowid IN "
+                                   "(SELECT rowid FROM response_cache ORDER BY rowid LIMIT ?)", (overflow,))
+        finally:
+            connection.execute("COMMIT")
+        return True
+
+    def invalidate(self, tags):
+        connection = self._connection()
+        placeholders = ",".join("?" * len(tags))
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute("UPDATE response_cache_generation SET generation = generation + 1")
+            connection.execute(f"DELETE FROM response_cache WHERE key IN "
+                               f"(SELECT key FROM response_cache_tag WHERE tag IN ({placeholders}))", tags)
+        finally:
+            connection.execute("COMMIT")
+
+    def clear(self):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute("UPDATE response_cache_generation SET generation = generation + 1")
+            connection.execute("DELETE FROM response_cache")
+        finally:
+            connection.execute("COMMIT")
+
+
+class ResponseCache:
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.bytes_served = 0
+        self.bytes_stored = 0
+        self._backend = None
+        register(self)
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            if app.config["RESPONSE_CACHE_BACKEND"] == "sqlite":
+                self._backend = SQLiteBackend(app.config["RESPONSE_CACHE_PATH"], app.config["RESPONSE_CACHE_SIZE"])
+            else:
+                self._backend = MemoryBackend(app.config["RESPONSE_CACHE_SIZE"])
+        return self._backend
+
+    def invalidate(self, *tags):
+        if app.config["RESPONSE_CACHE_ENABLED"]:
+            self.backend.invalidate(list(tags))
+
+    def clear(self):
+        if self._backend is not None:
+            self._backend.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses,
+                "bytes_served": self.bytes_served, "bytes_stored": self.bytes_stored}
+
+    def cached(self, *tags):
+        """
+        Caches successful responses of an anonymous GET view.
+        Tags may contain view arguments: @response_cache.cached("user:{user_id}").
+        """
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if not app.config["RESPONSE_CACHE_ENABLED"] or request.method != "GET" \
+                        or request.authorization is not None:
+                    return view(*args, **kwargs)
+                key = f"{request.full_path}|{request.accept_mimetypes.to_header()}"
+                backend = self.backend
+                entry = backend.get(key)
+                if entry is not None:
+                    self.hits += 1
+                    self.bytes_served += len(entry[3])
+                    return self._make_response(entry, "HIT")
+                self.misses += 1
+                generation = backend.get_generation()
+                response = app.make_response(view(*args, **kwargs))
+                if response.status_code == 200 and not response.is_streamed:
+                    body = response.get_data()
+                    entry = (response.status_code, response.mimetype, response.get_etag()[0], body)
+                    if backend.set(key, entry, [tag.format(**kwargs) for tag in tags], generation):
+                        self.bytes_stored += len(body)
+                response.headers["X-Cache"] = "MISS"
+                return response
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def _make_response(entry, status):
+        code, mimetype, etag, body = entry
+        response = Response(body, status=code, mimetype=mimetype)
+        if etag:
+            response.set_etag(etag)
+        response.headers["X-Cache"] = status
+        return response.make_conditional(request)
+
+
+response_cache = ResponseCache()
+metrics.register_cache("responses", response_cache)
+
+
+def _tags_for_object(obj, is_new):
+    table = getattr(obj, "__tablename__", None)
+    if table == "note_model":
+        # частные заметки не попадают в анонимные ответы, пока не станут публичными
+        was_public = False in inspect(obj).attrs.private.history.deleted
+        return {"notes"} if not obj.private or was_public else set()
+    if table == "tag":
+        return {"tags"} if is_new else {"tags", "notes"}
+    if table == "user_model":
+        return {"users"} if is_new else {"users", f"user:{obj.id}", "notes"}
+    return set()
+
+
+# Массовые INSERT/UPDATE/DELETE не сообщают, какие строки изменены
+TABLE_TAGS = {
+    "note_model": {"notes"},
+    "tags": {"notes"},
+    "tag": {"tags", "notes"},
+    "user_model": {"users", "user", "notes"},
+}
+
+
+def _pending(session):
+    return session.info.setdefault("response_cache_tags", set())
+
+
+@db.event.listens_for(db.session, "after_flush")
+def track_changes(session, flush_context):
+    pending = _pending(session)
+    for obj in session.new:
+        pending |= _tags_for_object(obj, True)
+    for obj in session.dirty | session.deleted:
+        pending |= _tags_for_object(obj, False)
+
+
+@db.event.listens_for(db.session, "do_orm_execute")
+def track_bulk_changes(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = orm_execute_state.statement.table
+        _pending(orm_execute_state.session).update(TABLE_TAGS.get(getattr(table, "name", None), ()))
+
+
+def track_mappings(session, model):
+    """
+    Records changes made with session.bulk_insert_mappings()/bulk_update_mappings(): they bypass
+    the flush and execute events, so the cached responses of the model's table are invalidated on commit.
+    """
+    _pending(session).update(TABLE_TAGS.get(model.__tablename__, ()))
+
+
+@db.event.listens_for(db.session, "after_commit")
+def invalidate_committed(session):
+    pending = session.info.pop("response_cache_tags", None)
+    if pending:
+        response_cache.invalidate(*pending)
+
+
+@db.event.listens_for(db.session, "after_soft_rollback")
+def discard_rolled_back(session, previous_transaction):
+    # откат точки сохранения (групповой коммит) не отменяет остальные изменения транзакции
+    if not previous_transaction.nested:
+        session.info.pop("response_cache_tags", None)
@@ -0,0 +1,143 @@
+import functools
+import threading
+import flask
+from marshmallow import Schema, fields, missing
+
+try:
+    import orjson
+except ImportError:  # необязательная зависимость, без нее используется стандартный json
+    orjson = None
+
+# Сериализация ответов без marshmallow: по полям схемы один раз генерируется функция,
+# которая строит dict напрямую (obj -> dict), marshmallow остается только для входных данных.
+
+PRIMITIVE_TYPES = (str, int, float, bool)
+
+_dumpers = {}
+_lock = threading.RLock()  # вложенные схемы компилируются внутри блокировки
+
+
+def compiled_dumper(schema):
+    """
+    Returns function obj -> dict producing the same output as schema.dump(obj, many=False).
+    Dumpers are cached per schema class and its set of dumped fields.
+    """
+    key = (type(schema), tuple(schema.dump_fields))
+    dumper = _dumpers.get(key)
+    if dumper is None:
+        with _lock:
+            dumper = _dumpers.get(key)
+            if dumper is None:
+                dumper = _dumpers[key] = _compile(schema)
+    return dumper
+
+
+def _compilable(schema):
+    hooks = schema._hooks
+    return not any(hooks[name] for name in hooks if "dump" in name[0]) \
+        and type(schema).get_attribute is Schema.get_attribute
+
+
+def _value_expression(field, index, namespace):
+    """
+    Python expression converting attribute value `v` like field._serialize() does,
+    or None if the field has to be serialized by marshmallow.
+    """
+    field_name = f"f{index}"
+    if isinstance(field, fields.Nested):
+        nested = field.schema
+        namespace[f"n{index}"] = compiled_dumper(nested)
+        if field.many or nested.many:
+            return f"None if v is None else [n{index}(item) for item in v]"
+        return f"None if v is None else n{index}(v)"
+    if isinstance(field, fields.Integer) and not field.as_string:
+        return "v if v.__class__ is int else (None if v is None else int(v))"
+    if isinstance(field, fields.Float) and not field.as_string:
+        return "v if v.__class__ is float else (None if v is None else float(v))"
+    if type(field) is fields.String:
+        return "v if v.__class__ is str else (None if v is None else str(v))"
+    if type(field) is fields.Boolean:
+        return f"v if v is True or v is False else {field_name}._serialize(v, None, None)"
+    if isinstance(field, fields.Inferred):
+        return f"v if v is None or v.__class__ in PRIMITIVE_TYPES else {field_name}._serialize(v, None, None)"
+    if type(field) is fields.Raw:
+        return "v"
+    return None
+
+
+def _compile(schema):
+    # Schema.dump, а не schema.dump: у схем с CompiledSchemaMixin он вызывает этот же dumper
+    fallback = functools.partial(Schema.dump, schema, many=False)
+    if not _compilable(schema):
+        return fallback
+
+    namespace = {"MISSING": missing, "PRIMITIVE_TYPES": PRIMITIVE_TYPES, "fallback": fallback}
+    from_object, from_mapping = [], []
+    for index, (name, field) in enumerate(schema.dump_fields.items()):
+        namespace[f"f{index}"] = field
+        key = field.data_key or name
+        attribute = field.attribute or name
+        expression = _value_expression(field, index, namespace)
+        if expression is None or "." in attribute or field.dump_default is not missing:
+            statements = [f"v = f{index}.serialize({attribute!r}, obj)",
+                          f"if v is not MISSING: out[{key!r}] = v"]
+            from_object += statements
+            from_mapping += statements
+            continue
+        from_object += [f"v = getattr(obj, {attribute!r}, MISSING)",
+                        f"if v is not MISSING: out[{key!r}] = {expression}"]
+        from_mapping += [f"v = obj.get({attribute!r}, MISSING)",
+                         f"if v is not MISSING: out[{key!r}] = {expression}"]
+
+    # marshmallow сначала пробует obj[key], поэтому объекты с __getitem__ (кроме dict) отдаем ему
+    source = "\n".join(
+        ["def dump(obj):",
+         "    out = {}",
+         "    if obj.__class__ is dict:"]
+        + ["        " + line for line in from_mapping or ["pass"]]
+        + ["    elif hasattr(obj.__class__, '__getitem__'):",
+           "        return fallback(obj)",
+           "    else:"]
+        + ["        " + line for line in from_object or ["pass"]]
+        + ["    return out"])
+    exec(compile(source, f"<dumper {type(schema).__name__}>", "exec"), namespace)
+    return namespace["dump"]
+
+
+class CompiledSchemaMixin:
+    """
+    Schema mixin serializing through compiled_dumper(); load() and validation are not affected.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        compiled_dumper(self)  # компилируем при создании схемы, а не на первом запросе
+
+    def dump(self, obj, *, many=None):
+        # не храним dumper в экземпляре: Nested копирует схему и меняет набор полей (only/exclude)
+        dump_one = compiled_dumper(self)
+        many = self.many if many is None else bool(many)
+        if many:
+            return [dump_one(item) for item in obj]
+        return dump_one(obj)
+
+
+def dumps(data):
+    if orjson is not None:
+        try:
+            return orjson.dumps(data).decode()
+        except TypeError:
+            pass
+    return flask.json.dumps(data)
+
+
+def jsonify(data):
+    """
+    flask.jsonify() replacement for APISPEC_FORMAT_RESPONSE, uses orjson when it is installed.
+    """
+    if orjson is not None:
+        try:
+            return flask.current_app.response_class(orjson.dumps(data), mimetype="application/json")
+        except TypeError:
+            pass
+    return flask.jsonify(data)
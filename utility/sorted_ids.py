@@ -0,0 +1,63 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import chain
+
+# Множества id в виде отсортированных массивов array('I'): 4 байта на id, память и время операций
+# зависят от числа id, а не от их величины. Массивы не изменяются на месте - операции возвращают новые,
+# поэтому их можно читать без блокировки.
+
+TYPECODE = "I"
+EMPTY = array(TYPECODE)
+
+
+def ids_from(ids):
+    return array(TYPECODE, sorted(set(ids)))
+
+
+def contains(ids, id):
+    index = bisect_left(ids, id)
+    return index < len(ids) and ids[index] == id
+
+
+def intersection(first, second):
+    # проходим по меньшему массиву, в большем ищем двоичным поиском
+    if len(first) > len(second):
+        first, second = second, first
+    return array(TYPECODE, (id for id in first if contains(second, id)))
+
+
+def union(arrays):
+    arrays = [ids for ids in arrays if ids]
+    if len(arrays) == 1:
+        return arrays[0]
+    return ids_from(chain.from_iterable(arrays))
+
+
+def difference(first, second):
+    if not second:
+        return first
+    return array(TYPECODE, (id for id in first if not contains(second, id)))
+
+
+def with_ids(ids, added):
+    added = set(added)
+    if len(added) > 16:
+        return ids_from(chain(ids, added))
+    # несколько id вставляем в копию: сдвиг массива дешевле повторной сортировки
+    result = array(TYPECODE, ids)
+    for id in sorted(added):
+        index = bisect_left(result, id)
+        if index == len(result) or result[index] != id:
+            result.insert(index, id)
+    return result
+
+
+def without_ids(ids, removed):
+    return difference(ids, ids_from(removed))
+
+
+def ids_after(ids, id):
+    """
+    Part of ids greater than id (the rest of a page sequence after the cursor).
+    """
+    return ids[bisect_right(ids, id):]
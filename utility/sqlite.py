@@ -0,0 +1,85 @@
+import flask_sqlalchemy
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+# Профиль SQLite для нескольких процессов gunicorn: WAL (читатели не ждут писателя),
+# busy_timeout (запись ждет освобождения блокировки вместо ошибки "database is locked"),
+# пул соединений вместо нового соединения на каждый запрос. Прагмы выставляются при каждом соединении.
+
+# значения, которые PRAGMA возвращает числом
+PRAGMA_NAMES = {
+    "synchronous": {0: "OFF", 1: "NORMAL", 2: "FULL", 3: "EXTRA"},
+    "temp_store": {0: "DEFAULT", 1: "FILE", 2: "MEMORY"},
+}
+
+
+def is_sqlite_file(sa_url):
+    return sa_url.drivername.startswith("sqlite") and sa_url.database not in (None, "", ":memory:")
+
+
+def set_pragmas(dbapi_connection, pragmas):
+    cursor = dbapi_connection.cursor()
+    try:
+        # busy_timeout первым: переключение в WAL тоже ждет блокировку
+        for name in sorted(pragmas, key=lambda name: name != "busy_timeout"):
+            cursor.execute(f"PRAGMA {name}={pragmas[name]}")
+    finally:
+        cursor.close()
+
+
+def effective_settings(engine):
+    """
+    Values of the configured pragmas as SQLite reports them on a pooled connection, plus pool and version.
+    """
+    settings = {}
+    with engine.connect() as connection:
+        for name in engine.sqlite_pragmas:
+            value = connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+            settings[name] = PRAGMA_NAMES.get(name, {}).get(value, value)
+        settings["sqlite_version"] = connection.exec_driver_sql("SELECT sqlite_version()").scalar()
+    settings["pool"] = engine.pool.status()
+    return settings
+
+
+def check_settings(engine):
+    """
+    Returns (settings, mismatches): mismatches are pragmas whose effective value differs from
+    the configured one, e.g. WAL on a network file system or mmap_size above the compile-time limit.
+    """
+    settings = effective_settings(engine)
+    mismatches = {name: (expected, settings[name]) for name, expected in engine.sqlite_pragmas.items()
+                  if str(settings[name]).lower() != str(expected).lower()}
+    return settings, mismatches
+
+
+def report_settings(app, engine):
+    settings, mismatches = check_settings(engine)
+    app.logger.info("SQLite %s", ", ".join(f"{name}={value}" for name, value in settings.items()))
+    for name, (expected, actual) in mismatches.items():
+        app.logger.warning("SQLite PRAGMA %s is %s, configured %s", name, actual, expected)
+    return settings, mismatches
+
+
+class SQLAlchemy(flask_sqlalchemy.SQLAlchemy):
+    """
+    Applies the SQLITE_* settings of the app config to every SQLite engine.
+    """
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        sa_url, options = super().apply_driver_hacks(app, sa_url, options)
+        # flask-sqlalchemy открывает новое соединение на каждый запрос (NullPool)
+        if is_sqlite_file(sa_url) and app.config["SQLITE_POOL_SIZE"]:
+            options.update(poolclass=QueuePool, pool_size=app.config["SQLITE_POOL_SIZE"],
+                           max_overflow=app.config["SQLITE_POOL_OVERFLOW"],
+                           pool_timeout=app.config["SQLITE_POOL_TIMEOUT"])
+            # соединение из пула используется разными потоками, но не одновременно
+            options.setdefault("connect_args", {})["check_same_thread"] = False
+        return sa_url, options
+
+    def create_engine(self, sa_url, engine_opts):
+        engine = super().create_engine(sa_url, engine_opts)
+        if sa_url.drivername.startswith("sqlite"):
+            pragmas = dict(self.get_app().config["SQLITE_PRAGMAS"])
+            engine.sqlite_pragmas = pragmas
+            event.listen(engine, "connect", lambda dbapi_connection, record: set_pragmas(dbapi_connection, pragmas))
+        return engine
@@ -0,0 +1,103 @@
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from api import app, db
+from api.models.file import StoredFileModel
+from werkzeug.utils import secure_filename
+
+# Хранилище загруженных файлов по содержимому: файл с SHA-256 "ab12..." и расширением .png лежит в
+# UPLOAD_FOLDER/ab/12/ab12....png. Одинаковые файлы хранятся один раз (ref_count в stored_file),
+# загрузки с одинаковым именем не перезаписывают друг друга, URL файла не меняется.
+# Файл копируется частями по UPLOAD_CHUNK_SIZE, память на загрузку не зависит от размера файла.
+
+TMP_DIR_NAME = ".tmp"
+
+
+class BlobStorage:
+
+    @property
+    def root(self):
+        return Path(app.config["UPLOAD_FOLDER"])
+
+    def relative_path(self, name):
+        return Path(name[:2], name[2:4], name)
+
+    def path(self, name):
+        return self.root / self.relative_path(name)
+
+    def url(self, name):
+        return f"{app.config['UPLOAD_FOLDER_NAME']}/{self.relative_path(name).as_posix()}"
+
+    def temp_file(self):
+        """
+        Open binary temp file on the same file system as the storage (so it can be moved into place).
+        """
+        directory = self.root / TMP_DIR_NAME
+        directory.mkdir(parents=True, exist_ok=True)
+        return tempfile.NamedTemporaryFile(dir=directory, delete=False)
+
+    def save(self, stream, filename, user_id=None):
+        """
+        Stores the content of a binary stream as an upload of the user. Returns (name, size).
+        """
+        chunk_size = app.config["UPLOAD_CHUNK_SIZE"]
+        digest = hashlib.sha256()
+        size = 0
+        with self.temp_file() as tmp:
+            try:
+                while True:
+                    chunk = stream.read(chunk_size)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+            except BaseException:
+                tmp.close()
+                os.unlink(tmp.name)
+                raise
+        name = digest.hexdigest() + extension(filename)
+        self.add(tmp.name, name, size, user_id)
+        return name, size
+
+    def add(self, temp_path, name, size, user_id=None):
+        """
+        Moves a complete temp file into the storage under name, or drops it if the content is already stored.
+        """
+        try:
+            # файл переносится при открытой транзакции записи: release() того же файла ждет ее конца
+            StoredFileModel.add_reference(name, size, user_id)
+            target = self.path(name)
+            if target.exists():
+                os.unlink(temp_path)
+            else:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(temp_path, target)
+            db.session.commit()
+        except BaseException:
+            db.session.rollback()
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    def release(self, name, user_id):
+        """
+        Drops one upload of the file by the user, deletes the file with the last upload.
+        Returns False if the user has no upload of this file.
+        """
+        ref_count = StoredFileModel.release_reference(name, user_id)
+        if ref_count == 0:
+            self.path(name).unlink(missing_ok=True)
+            # производные файлы: уменьшенные копии <name>.<variant>, сжатые копии <name>.gz
+            for derived in self.path(name).parent.glob(f"{name}.*"):
+                derived.unlink(missing_ok=True)
+        db.session.commit()
+        return ref_count is not None
+
+
+def extension(filename):
+    return os.path.splitext(secure_filename(filename or ""))[1].lower()[:16]
+
+
+storage = BlobStorage()
@@ -0,0 +1,46 @@
+from api import request
+from flask import Response, stream_with_context
+from utility.serializer import dumps
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+JSON_MIMETYPE = "application/json"
+
+
+def wants_ndjson():
+    return request.accept_mimetypes.best_match([JSON_MIMETYPE, NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
+def stream_rows(rows, schema, make_cursor, limit=None, ndjson=False):
+    """
+    Streams rows serialized one by one with schema.
+
+    JSON mode produces the same envelope as paginate(): {"items": [...], "next_cursor": ...}.
+    NDJSON mode produces one object per line; if the stream was cut by limit,
+    the last line is {"next_cursor": ...}.
+    rows should be fetched lazily (yield_per), so memory does not depend on the result size.
+    """
+    def generate():
+        next_cursor = None
+        last = None
+        count = 0
+        if not ndjson:
+            yield '{"items": ['
+        for row in rows:
+            if count == limit:
+                next_cursor = make_cursor(last)
+                break
+            item = dumps(schema.dump(row))
+            if ndjson:
+                yield item + "\n"
+            else:
+                yield item if count == 0 else "," + item
+            last = row
+            count += 1
+        if ndjson:
+            if next_cursor is not None:
+                yield dumps({"next_cursor": next_cursor}) + "\n"
+        else:
+            yield '], "next_cursor": ' + dumps(next_cursor) + '}'
+
+    mimetype = NDJSON_MIMETYPE if ndjson else JSON_MIMETYPE
+    return Response(stream_with_context(generate()), mimetype=mimetype)
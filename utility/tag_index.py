@@ -0,0 +1,167 @@
+import queue
+import threading
+import time
+from api import app, db
+from config import Config
+from api.models.note import NoteModel, tags
+from utility.cache import register
+from utility.generation import SharedGeneration
+from utility.sorted_ids import EMPTY, ids_from, intersection, union, difference, with_ids, without_ids
+
+
+class TagIndex:
+    """
+    In-memory inverted index author_id -> {tag_id: sorted array of note ids}.
+
+    An author's entries are loaded with one indexed query (the author's notes joined to tags)
+    the first time the author filters by tags, and kept up to date by the tag handlers.
+    With TAG_INDEX_BACKGROUND_LOAD loading runs in a background thread: until it is done match()
+    returns None and the caller falls back to SQL. Entries older than ttl seconds are reloaded
+    the same way (the old ones are served meanwhile). Tag changes bump a per-author generation shared
+    through the db, so other processes drop the author's entries and load them again.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self._authors = {}  # author_id -> (loaded_at, {tag_id: array})
+        self._changes = {}  # author_id -> number of add/remove calls, detects changes during a load
+        self._generations = {}  # author_id -> SharedGeneration of the author's entries
+        self._pending = set()
+        self._queue = queue.Queue()
+        self._loader = None
+        self._lock = threading.Lock()
+        # удаление тега (фоновая задача в другом процессе) очищает индекс во всех процессах
+        self.generation = SharedGeneration("tag_index", [self])
+        register(self)
+
+    def clear(self):
+        with self._lock:
+            self._authors = {}
+            self._changes = {}
+            self._generations = {}
+
+    def _generation(self, author_id):
+        with self._lock:
+            generation = self._generations.get(author_id)
+            if generation is None:
+                generation = self._generations[author_id] = SharedGeneration(f"tag_index:{author_id}")
+            return generation
+
+    def _forget(self, author_id):
+        with self._lock:
+            # загрузка, начатая до изменения в другом процессе, тоже устарела
+            self._changes[author_id] = self._changes.get(author_id, 0) + 1
+            self._authors.pop(author_id, None)
+
+    def load(self, author_id):
+        """
+        Loads the author's entries from the db. Returns False if they were changed meanwhile
+        (the loaded rows may miss the change, the next match() schedules a new load).
+        """
+        with self._lock:
+            changes = self._changes.get(author_id, 0)
+        try:
+            # счетчик читается до строк: изменения, сделанные после него, check() заметит
+            self._generation(author_id).check()
+            rows = db.session.query(tags.c.tag_id, tags.c.note_model_id) \
+                .join(NoteModel, NoteModel.id == tags.c.note_model_id) \
+                .filter(NoteModel.author_id == author_id)
+            note_ids = {}
+            for tag_id, note_id in rows.yield_per(Config.NOTES_STREAM_CHUNK_SIZE):
+                note_ids.setdefault(tag_id, []).append(note_id)
+            entries = {tag_id: ids_from(ids) for tag_id, ids in note_ids.items()}
+        finally:
+            with self._lock:
+                self._pending.discard(author_id)
+        with self._lock:
+            if self._changes.get(author_id, 0) != changes:
+                return False
+            self._authors[author_id] = (time.monotonic(), entries)
+        return True
+
+    def wait(self):
+        """
+        Blocks until scheduled loads are done.
+        """
+        self._queue.join()
+
+    def _schedule(self, author_id):
+        with self._lock:
+            if author_id in self._pending:
+                return
+            self._pending.add(author_id)
+            if self._loader is None or not self._loader.is_alive():
+                self._loader = threading.Thread(target=self._load_scheduled, name="tag-index-loader", daemon=True)
+                self._loader.start()
+        self._queue.put(author_id)
+
+    def _load_scheduled(self):
+        while True:
+            author_id = self._queue.get()
+            try:
+                # сессия потока закрывается вместе с контекстом
+                with app.app_context():
+                    self.load(author_id)
+            except Exception:
+                app.logger.exception("Tag index load for author %s failed", author_id)
+            finally:
+                self._queue.task_done()
+
+    def _change(self, author_id, tag_ids, change):
+        with self._lock:
+            self._changes[author_id] = self._changes.get(author_id, 0) + 1
+            entry = self._authors.get(author_id)
+            if entry is None:
+                return
+            entries = entry[1]
+            for tag_id in tag_ids:
+                entries[tag_id] = change(entries.get(tag_id, EMPTY))
+
+    def add(self, author_id, tag_ids, note_ids):
+        """
+        Adds the committed links to the author's entries and tells other processes about them. Commits.
+        """
+        self._change(author_id, tag_ids, lambda ids: with_ids(ids, note_ids))
+        self._generation(author_id).bump()
+
+    def remove(self, author_id, tag_ids, note_ids):
+        """
+        Removes the committed links from the author's entries and tells other processes about them. Commits.
+        """
+        self._change(author_id, tag_ids, lambda ids: without_ids(ids, note_ids))
+        self._generation(author_id).bump()
+
+    def match(self, author_id, all_tags=(), any_tags=(), exclude_tags=()):
+        """
+        Sorted array of ids of author's notes having all of all_tags, at least one of any_tags
+        and none of exclude_tags, or None if the author's entries are not loaded yet.
+        At least one of all_tags/any_tags is required.
+        """
+        self.generation.check()
+        if self._generation(author_id).check():
+            self._forget(author_id)
+        with self._lock:
+            entry = self._authors.get(author_id)
+        if entry is None or (self.ttl and time.monotonic() - entry[0] > self.ttl):
+            if not app.config["TAG_INDEX_BACKGROUND_LOAD"]:
+                self.load(author_id)
+                with self._lock:
+                    entry = self._authors.get(author_id)
+            else:
+                self._schedule(author_id)
+        if entry is None:
+            return None
+        with self._lock:
+            entries = {tag_id: entry[1].get(tag_id, EMPTY) for tag_id in (*all_tags, *any_tags, *exclude_tags)}
+        result = None
+        for tag_id in sorted(all_tags, key=lambda tag_id: len(entries[tag_id])):
+            result = entries[tag_id] if result is None else intersection(result, entries[tag_id])
+        if any_tags:
+            matched = union(entries[tag_id] for tag_id in any_tags)
+            result = matched if result is None else intersection(result, matched)
+        for tag_id in exclude_tags:
+            result = difference(result, entries[tag_id])
+        return result
+
+
+tag_index = TagIndex(ttl=Config.TAG_INDEX_TTL)
@@ -0,0 +1,206 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import secrets
+import threading
+import time
+from pathlib import Path
+from api import app
+from utility.storage import storage, extension
+
+# Возобновляемая загрузка больших файлов: клиент создает сессию, отправляет части файла
+# (PATCH с заголовком Upload-Offset), при обрыве узнает, сколько байт уже получено, и продолжает с этого места.
+# Сессия - два файла в UPLOAD_FOLDER/.uploads: <id>.part (полученные байты) и <id>.json (имя и размер),
+# поэтому части одной загрузки могут приходить в разные процессы gunicorn.
+# После завершения файл переносится в хранилище (utility/storage.py) как обычная загрузка.
+
+SESSIONS_DIR_NAME = ".uploads"
+SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{32}$")
+
+
+class UploadOffsetMismatch(Exception):
+    """
+    The client sent a chunk for an offset other than the number of received bytes.
+    """
+
+    def __init__(self, offset):
+        super().__init__(f"Upload offset is {offset}")
+        self.offset = offset
+
+
+class UploadSizeExceeded(Exception):
+    pass
+
+
+class UploadIncomplete(Exception):
+    pass
+
+
+class UploadSessions:
+
+    def __init__(self):
+        self._collector = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self):
+        return Path(app.config["UPLOAD_FOLDER"]) / SESSIONS_DIR_NAME
+
+    def _paths(self, upload_id):
+        if not SESSION_ID.match(upload_id):
+            return None
+        part = self.directory / f"{upload_id}.part"
+        meta = self.directory / f"{upload_id}.json"
+        return (part, meta) if meta.exists() else None
+
+    def create(self, filename, size=None, user_id=None):
+        self._start_collector()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        upload_id = secrets.token_urlsafe(24)
+        (self.directory / f"{upload_id}.part").touch()
+        with open(self.directory / f"{upload_id}.json", "w", encoding="UTF-8") as f:
+            json.dump({"filename": filename, "size": size, "user_id": user_id}, f)
+        return self.status(upload_id)
+
+    def status(self, upload_id):
+        """
+        {"id", "filename", "size", "offset"} of the session, None if there is no such session.
+        """
+        paths = self._paths(upload_id)
+        if paths is None:
+            return None
+        part, meta = paths
+        try:
+            with open(meta, encoding="UTF-8") as f:
+                info = json.load(f)
+            return dict(info, id=upload_id, offset=part.stat().st_size)
+        except FileNotFoundError:
+            return None  # загрузка только что завершена или отменена
+
+    def _open_locked(self, upload_id, mode):
+        """
+        Opens the part file of the session and locks it. Returns None if there is no such session,
+        also when it was completed or cancelled while this process waited for the lock.
+        """
+        paths = self._paths(upload_id)
+        if paths is None:
+            return None
+        part, meta = paths
+        try:
+            f = open(part, mode)
+        except FileNotFoundError:
+            return None
+        fcntl.flock(f, fcntl.LOCK_EX)
+        # завершенная загрузка перенесена в хранилище: открытый файл - уже сохраненный, писать в него нельзя
+        try:
+            current = meta.exists() and os.path.samestat(os.fstat(f.fileno()), part.stat())
+        except FileNotFoundError:
+            current = False
+        if not current:
+            f.close()
+            return None
+        return f
+
+    def append(self, upload_id, offset, stream):
+        """
+        Appends the stream at offset, chunk by chunk. Returns the new offset, None if there is no such session.
+        """
+        info = self.status(upload_id)
+        if info is None:
+            return None
+        chunk_size = app.config["UPLOAD_CHUNK_SIZE"]
+        # части одной загрузки, пришедшие одновременно, пишутся по очереди
+        f = self._open_locked(upload_id, "r+b")
+        if f is None:
+            return None
+        with f:
+            current = f.seek(0, os.SEEK_END)
+            if offset != current:
+                raise UploadOffsetMismatch(current)
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                if info["size"] is not None and current + len(chunk) > info["size"]:
+                    # принятые байты остаются, клиент узнает offset из статуса
+                    raise UploadSizeExceeded(f"Upload is larger than {info['size']} bytes")
+                f.write(chunk)
+                current += len(chunk)
+            return current
+
+    def complete(self, upload_id):
+        """
+        Moves the received file into the storage. Returns (name, size), None if there is no such session.
+        """
+        info = self.status(upload_id)
+        if info is None:
+            return None
+        part = self.directory / f"{upload_id}.part"
+        meta = self.directory / f"{upload_id}.json"
+        # одновременные complete: загрузку сохраняет первый, остальные получают None
+        f = self._open_locked(upload_id, "rb")
+        if f is None:
+            return None
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            if info["size"] is not None and size != info["size"]:
+                raise UploadIncomplete(f"Received {size} of {info['size']} bytes")
+            digest = hashlib.sha256()
+            for chunk in iter(lambda: f.read(app.config["UPLOAD_CHUNK_SIZE"]), b""):
+                digest.update(chunk)
+            name = digest.hexdigest() + extension(info["filename"])
+            meta.unlink(missing_ok=True)
+            storage.add(part, name, size, info.get("user_id"))
+        return name, size
+
+    def abort(self, upload_id):
+        f = self._open_locked(upload_id, "rb")
+        if f is None:
+            return False
+        with f:
+            for path in self._paths(upload_id) or ():
+                path.unlink(missing_ok=True)
+        return True
+
+    def collect_garbage(self, now=None):
+        """
+        Deletes sessions that received nothing for UPLOAD_SESSION_TTL seconds. Returns their number.
+        """
+        if not self.directory.exists():
+            return 0
+        now = time.time() if now is None else now
+        deleted = 0
+        for meta in self.directory.glob("*.json"):
+            part = meta.with_suffix(".part")
+            try:
+                last_change = max(meta.stat().st_mtime, part.stat().st_mtime if part.exists() else 0)
+            except FileNotFoundError:
+                continue  # сессия завершена другим процессом
+            if now - last_change > app.config["UPLOAD_SESSION_TTL"]:
+                meta.unlink(missing_ok=True)
+                part.unlink(missing_ok=True)
+                deleted += 1
+        return deleted
+
+    def _start_collector(self):
+        if self._collector is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._collector is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._collector = threading.Thread(target=self._collect_periodically, name="upload-gc", daemon=True)
+                self._collector.start()
+
+    def _collect_periodically(self):
+        while True:
+            time.sleep(app.config["UPLOAD_SESSION_GC_INTERVAL"])
+            try:
+                self.collect_garbage()
+            except OSError:
+                app.logger.exception("Upload sessions garbage collection failed")
+
+
+upload_sessions = UploadSessions()
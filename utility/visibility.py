@@ -0,0 +1,95 @@
+from api import abort, db
+from api.models.note import NoteModel
+from utility.helpers import get_object_or_404
+
+# Правила доступа к заметкам:
+#  - читать можно свои заметки и публичные заметки других пользователей;
+#  - изменять (редактировать, архивировать, менять теги) - только свои;
+#  - архивные заметки в обычных списках не показываются.
+
+
+def readable_by(user):
+    """
+    SQL predicate: notes the user may read.
+    """
+    return (NoteModel.author_id == user.id) | (NoteModel.private == False)
+
+
+def writable_by(user):
+    """
+    SQL predicate: notes the user may modify.
+    """
+    return NoteModel.author_id == user.id
+
+
+def public():
+    """
+    SQL predicate: notes anybody (including anonymous users) may read.
+    """
+    return NoteModel.private == False
+
+
+def readable_notes(user, deleted=False):
+    """
+    Notes the user may read (archived or not) as two queries with disjoint results: the user's own notes
+    and public notes of other users. Unlike readable_by(), whose OR SQLite answers with a MULTI-INDEX OR
+    and a sort of the whole set, each of them is read in index order, so paginate() stops after a page.
+    """
+    return [NoteModel.query.filter(writable_by(user) & (NoteModel.deleted == deleted)),
+            NoteModel.query.filter(public() & (NoteModel.author_id != user.id) & (NoteModel.deleted == deleted))]
+
+
+def public_notes():
+    return NoteModel.query.filter(public() & (NoteModel.deleted == False))
+
+
+def can_read(user, note):
+    return note.author_id == user.id or not note.private
+
+
+def can_write(user, note):
+    return note.author_id == user.id
+
+
+def get_note_for_read(note_id, user):
+    """
+    Loads a note by primary key: 404 if it does not exist or is archived, 403 if the user may not read it.
+    """
+    note = get_object_or_404(NoteModel, note_id)
+    if not can_read(user, note):
+        abort(403, description="Forbidden")
+    return note
+
+
+def get_note_for_write(note_id, user, include_archived=False):
+    """
+    Loads a note by primary key: 404 if it does not exist (or is archived and include_archived is False),
+    403 if the user may not modify it.
+    """
+    if include_archived:
+        note = NoteModel.query.get(note_id)
+        if note is None:
+            abort(404, description=f"Object with id={note_id} not found")
+    else:
+        note = get_object_or_404(NoteModel, note_id)
+    if not can_write(user, note):
+        abort(403, description="Forbidden")
+    return note
+
+
+def check_notes_for_write(user, note_ids):
+    """
+    Checks write access to many notes with one query.
+    Returns {note_id: (status, error)} for the notes that can not be changed.
+    """
+    notes = db.session.query(NoteModel.id, NoteModel.author_id, NoteModel.deleted) \
+        .filter(NoteModel.id.in_(set(note_ids)))
+    found = {note.id: note for note in notes}
+    errors = {}
+    for note_id in note_ids:
+        note = found.get(note_id)
+        if note is None or note.deleted:
+            errors[note_id] = (404, f"Object with id={note_id} not found")
+        elif not can_write(user, note):
+            errors[note_id] = (403, "Forbidden")
+    return errors
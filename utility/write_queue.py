@@ -0,0 +1,141 @@
+import os
+import queue
+import threading
+import time
+from api import app, db
+from sqlalchemy import inspect
+from utility.metrics import metrics
+
+# Групповой коммит (WRITE_QUEUE_ENABLED): save()/delete() моделей не коммитят сами, а передают объект
+# потоку-писателю процесса. Писатель собирает изменения, накопившиеся за WRITE_QUEUE_MAX_DELAY
+# (не больше WRITE_QUEUE_MAX_BATCH), применяет каждое в своей точке сохранения (SAVEPOINT) и коммитит
+# все одной транзакцией: одна блокировка записи SQLite и один fsync на пачку вместо одного на запрос.
+# Ошибка одного изменения (например IntegrityError) откатывает только его точку сохранения.
+
+
+class WriteUnit:
+    """
+    One queued change: the object to add or delete, and the outcome for the waiting request thread.
+    """
+
+    def __init__(self, obj, delete):
+        self.obj = obj
+        self.delete = delete
+        self.error = None
+        self.done = threading.Event()
+
+    def apply(self, session):
+        session.add(self.obj)
+        if self.delete:
+            session.delete(self.obj)
+
+
+class WriteQueue:
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._writer = None
+        self._pid = None
+
+    @property
+    def enabled(self):
+        return app.config["WRITE_QUEUE_ENABLED"]
+
+    def commit(self, obj, delete=False):
+        """
+        Adds (or deletes) obj and commits, directly or through the writer thread. Raises the error of the commit.
+        """
+        session = db.session()
+        graph = _object_graph(obj)
+        other_changes = (set(session.new) | set(session.dirty) | set(session.deleted)) - set(graph)
+        if not self.enabled or other_changes or _has_flushed_changes(session):
+            # в сессии запроса есть другие изменения - они должны попасть в тот же коммит
+            session.delete(obj) if delete else session.add(obj)
+            session.commit()
+            return
+        for item in graph:
+            if item in session:
+                session.expunge(item)
+        unit = WriteUnit(obj, delete)
+        self._ensure_writer()
+        self._queue.put(unit)
+        if not unit.done.wait(app.config["WRITE_QUEUE_TIMEOUT"]):
+            raise TimeoutError("Write queue did not commit in time")
+        # объекты снова принадлежат сессии запроса, атрибуты загрузятся из БД при обращении
+        for item in graph:
+            if inspect(item).detached and not (delete and item is obj):
+                session.add(item)
+        if unit.error is not None:
+            raise unit.error
+
+    def _ensure_writer(self):
+        # после fork (gunicorn --preload) поток писателя нужно запустить заново
+        if self._writer is not None and self._pid == os.getpid() and self._writer.is_alive():
+            return
+        with self._lock:
+            if self._writer is None or self._pid != os.getpid() or not self._writer.is_alive():
+                self._pid = os.getpid()
+                self._writer = threading.Thread(target=self._run, name="write-queue", daemon=True)
+                self._writer.start()
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            with app.app_context():
+                self._commit_batch(batch)
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + app.config["WRITE_QUEUE_MAX_DELAY"]
+        while len(batch) < app.config["WRITE_QUEUE_MAX_BATCH"]:
+            try:
+                timeout = deadline - time.monotonic()
+                batch.append(self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _commit_batch(self, batch):
+        started = time.perf_counter()
+        session = db.session.session_factory()
+        try:
+            # блокировка записи берется сразу, а не при первом INSERT внутри транзакции
+            if db.engine.dialect.name == "sqlite":
+                session.connection().exec_driver_sql("BEGIN IMMEDIATE")
+            for unit in batch:
+                try:
+                    with session.begin_nested():
+                        unit.apply(session)
+                except Exception as error:
+                    unit.error = error
+            session.commit()
+        except Exception as error:
+            session.rollback()
+            for unit in batch:
+                unit.error = unit.error or error
+        finally:
+            session.close()
+            metrics.observe("write_queue_batch_size", len(batch))
+            metrics.observe("write_queue_commit_seconds", time.perf_counter() - started)
+            for unit in batch:
+                unit.done.set()
+
+
+def _object_graph(obj):
+    """
+    obj and the objects that session.add(obj) would cascade to.
+    """
+    state = inspect(obj)
+    return [obj] + [item for item, _, _, _ in state.mapper.cascade_iterator("save-update", state)]
+
+
+def _has_flushed_changes(session):
+    # изменения уже отправлены в БД (flush) в транзакции сессии запроса
+    if not session.in_transaction():
+        return False
+    dbapi_connection = session.connection().connection.dbapi_connection
+    return getattr(dbapi_connection, "in_transaction", True)
+
+
+write_queue = WriteQueue()